@@ -125,3 +125,9 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Upload em lote (POST /api/lote/): o padrão do Django (100 arquivos por
+# requisição) recusaria o pedido antes da view conferir LOTE_MAX_IMAGENS
+from detector.utils.config import LOTE_MAX_IMAGENS  # noqa: E402
+
+DATA_UPLOAD_MAX_NUMBER_FILES = LOTE_MAX_IMAGENS + 10
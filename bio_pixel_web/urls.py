@@ -1,10 +1,17 @@
 from django.contrib import admin
 from django.urls import path
-from detector.views import detect_height  # <-- CORRIGIDO
+from detector.views import detect_height, api_submeter, api_submeter_video, api_status, api_stream, api_lote, api_medicoes, metricas, servir_media  # <-- CORRIGIDO
 from django.conf import settings
 from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', detect_height, name='detect_height'), # <-- CORRIGIDO
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    path('api/jobs/', api_submeter, name='api_submeter'),
+    path('api/jobs/<str:job_id>/', api_status, name='api_status'),
+    path('api/lote/', api_lote, name='api_lote'),
+    path('api/stream/', api_stream, name='api_stream'),
+    path('api/videos/', api_submeter_video, name='api_submeter_video'),
+    path('api/medicoes/', api_medicoes, name='api_medicoes'),
+    path('metrics', metricas, name='metricas'),
+] + static(settings.MEDIA_URL, view=servir_media, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Upload
+
+
+@admin.register(Upload)
+class UploadAdmin(admin.ModelAdmin):
+    list_display = ("nome", "sha256", "origem", "criado_em", "cache", "total_ms")
+    list_filter = ("origem", "cache", "backend_pose", "backend_idade")
+    search_fields = ("sha256", "nome")
+    date_hierarchy = "criado_em"
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class DetectorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'detector'
+
+    def ready(self):
+        # Os modelos são carregados sob demanda; BIOPIXEL_PRECARREGAR=1 aquece na inicialização
+        from .utils.config import MODELOS_PRECARREGAR
+        if MODELOS_PRECARREGAR:
+            from .pipeline import aquecer_modelos
+            aquecer_modelos()
@@ -0,0 +1,279 @@
+# detector/jobs.py
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .utils import metrics_utils, shm_utils
+from .utils.config import JOBS_WORKERS, JOBS_MAX_PENDENTES, JOBS_TTL_SEGUNDOS
+
+# Fila de jobs: a view só enfileira os bytes do upload e devolve um id.
+# O processamento roda em um pool de processos; cada processo importa o
+# pipeline (e portanto carrega YOLO, FaceMesh e a sessão ONNX) UMA vez,
+# no initializer, antes de receber o primeiro job.
+
+PENDENTE = "pendente"
+PROCESSANDO = "processando"
+CONCLUIDO = "concluido"
+ERRO = "erro"
+
+
+class FilaCheia(Exception):
+    """Levantada quando a fila atingiu JOBS_MAX_PENDENTES (backpressure)."""
+
+
+class PoolIndisponivel(Exception):
+    """Levantada quando o pool de workers quebrou e nem um pool novo aceitou o job."""
+
+
+_executor = None
+_lock = threading.Lock()
+_vagas = threading.BoundedSemaphore(JOBS_MAX_PENDENTES)
+_jobs = {}
+_futures = {}
+# Gravação no banco dos resultados concluídos (fora da thread de resultados do pool)
+_persistencia = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistir")
+
+
+def _init_worker():
+    # Import tardio: só os processos do pool carregam os modelos
+    from . import pipeline
+    pipeline.aquecer_modelos()
+
+
+def _executar(dados, image_name, camera=None):
+    from . import pipeline
+    from .utils import artifact_utils
+    resultado = pipeline.processar_bytes(dados, image_name, camera=camera)
+    # O job só é marcado como concluído quando as URLs já podem ser servidas
+    artifact_utils.aguardar()
+    return resultado
+
+
+def _executar_compartilhado(descritor, image_name):
+    from . import pipeline
+    from .utils import artifact_utils
+    # A imagem é uma view do bloco criado pelo processo web: os recortes
+    # gravados em segundo plano também apontam para ele, então a espera
+    # pelas gravações fica dentro do `with`.
+    with shm_utils.abrir(descritor) as image:
+        resultado = pipeline.processar_decodificada(image, descritor["sha256"], image_name,
+                                                    perfil=descritor.get("perfil"))
+        artifact_utils.aguardar()
+    return resultado
+
+
+def _executar_video(dados, nome):
+    from . import video
+    return video.processar_video_bytes(dados, nome)
+
+
+def _executar_sequencia(lista_dados, nome):
+    from . import video
+    return video.processar_frames(video.frames_sequencia(lista_dados))
+
+
+def processar_arquivo(path):
+    """
+    Processa uma imagem do disco dentro de um worker (usado pelo
+    `manage.py processar_lote`). Retorna o resultado com nome e SHA-256.
+    """
+    from .utils import cache_utils
+    with open(path, 'rb') as f:
+        dados = f.read()
+    resultado = _executar(dados, os.path.basename(path))
+    return {"arquivo": path, "sha256": cache_utils.hash_conteudo(dados), **resultado}
+
+
+def novo_pool(max_workers=JOBS_WORKERS):
+    """Pool de processos com os modelos já carregados em cada worker."""
+    # 'spawn' evita herdar threads/estado do processo web (fork + threads)
+    ctx = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx, initializer=_init_worker)
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = novo_pool()
+        return _executor
+
+
+def _recriar_executor(quebrado):
+    """
+    Descarta o pool quebrado (um worker morreu: OOM, segfault no código nativo
+    dos modelos) para que o próximo `_get_executor` crie outro. Os jobs que
+    estavam nele terminam com erro.
+    """
+    global _executor
+    with _lock:
+        if _executor is quebrado:
+            _executor = None
+    print("Pool de workers quebrado; criando um novo.")
+    quebrado.shutdown(wait=False, cancel_futures=True)
+
+
+def _enviar(funcao, *args, **kwargs):
+    """submit() no pool atual; se ele estiver quebrado, tenta UMA vez em um pool novo."""
+    executor = _get_executor()
+    try:
+        return executor.submit(funcao, *args, **kwargs)
+    except BrokenProcessPool:
+        _recriar_executor(executor)
+    try:
+        return _get_executor().submit(funcao, *args, **kwargs)
+    except BrokenProcessPool as e:
+        raise PoolIndisponivel() from e
+
+
+def _limpar_expirados():
+    limite = time.time() - JOBS_TTL_SEGUNDOS
+    with _lock:
+        for job_id in [j for j, job in _jobs.items() if job["finalizado_em"] and job["finalizado_em"] < limite]:
+            del _jobs[job_id]
+
+
+def _persistir(resultado, nome):
+    from .models import Upload, persistir
+    try:
+        persistir(resultado, nome, Upload.ORIGEM_API)
+    except Exception as e:
+        print(f"Erro ao gravar o resultado de '{nome}' no banco: {e}")
+
+
+def _finalizar(job_id, future):
+    resultado = None
+    try:
+        with _lock:
+            _futures.pop(job_id, None)
+            job = _jobs.get(job_id)
+            if job is None:
+                return
+            job["finalizado_em"] = time.time()
+            try:
+                job["resultado"] = future.result()
+                job["status"] = CONCLUIDO
+                # Os workers medem; o agregado do /metrics fica no processo web
+                metrics_utils.registrar(job["resultado"].get("tempos"))
+                resultado, nome = job["resultado"], job["imagem"]
+            except Exception as e:
+                print(f"Erro no job {job_id}: {e}")
+                job["erro"] = str(e)
+                job["status"] = ERRO
+                return
+    finally:
+        # Só depois do status: uma vaga livre nunca convive com o job ainda "pendente"
+        _vagas.release()
+    # Esta é a thread do executor que entrega os resultados de TODOS os jobs:
+    # a gravação no banco vai para outra thread, para não atrasar os demais
+    if "tracks" not in resultado:
+        _persistencia.submit(_persistir, resultado, nome)
+
+
+def _novo_job(image_name):
+    job_id = uuid.uuid4().hex
+    _jobs[job_id] = {
+        "id": job_id,
+        "status": PENDENTE,
+        "imagem": image_name,
+        "criado_em": time.time(),
+        "finalizado_em": None,
+        "resultado": None,
+        "erro": None,
+    }
+    return job_id
+
+
+def registrar_concluido(image_name, resultado):
+    """Registra um job já concluído (ex.: resultado vindo do cache) e retorna o id."""
+    _limpar_expirados()
+    with _lock:
+        job_id = _novo_job(image_name)
+        _jobs[job_id].update(status=CONCLUIDO, resultado=resultado, finalizado_em=time.time())
+    return job_id
+
+
+def submeter(dados, image_name, funcao=_executar, ao_terminar=None, opcoes=None):
+    """
+    Enfileira uma imagem (bytes do upload) e retorna o id do job.
+    `funcao` é o que o worker executa com (dados, image_name, **opcoes); ver
+    `submeter_video` / `submeter_sequencia` / `submeter_imagem`.
+    `ao_terminar()` roda quando o job termina (ou não chega a ser enfileirado).
+    Não bloqueia: se a fila estiver cheia, levanta FilaCheia; se o pool de
+    workers quebrou e não pôde ser recriado, PoolIndisponivel.
+    """
+    _limpar_expirados()
+    if not _vagas.acquire(blocking=False):
+        if ao_terminar:
+            ao_terminar()
+        raise FilaCheia()
+
+    with _lock:
+        job_id = _novo_job(image_name)
+
+    try:
+        future = _enviar(funcao, dados, image_name, **(opcoes or {}))
+    except Exception:
+        _vagas.release()
+        with _lock:
+            del _jobs[job_id]
+        if ao_terminar:
+            ao_terminar()
+        raise
+
+    with _lock:
+        _futures[job_id] = future
+
+    def _concluir(f):
+        try:
+            _finalizar(job_id, f)
+        finally:
+            if ao_terminar:
+                ao_terminar()
+    future.add_done_callback(_concluir)
+    return job_id
+
+
+def submeter_imagem(image, sha256, image_name, chave_perfil=None):
+    """
+    Enfileira uma imagem já decodificada no processo web. Os pixels vão por
+    memória compartilhada; o bloco é removido quando o job termina.
+    `chave_perfil`: perfil de calibração da câmera (o worker o carrega do disco).
+    """
+    if not _vagas.acquire(blocking=False):
+        # Fila cheia: nem aloca o bloco (`submeter` confere de novo)
+        raise FilaCheia()
+    _vagas.release()
+    bloco, descritor = shm_utils.publicar(image, sha256=sha256, perfil=chave_perfil)
+    return submeter(descritor, image_name, _executar_compartilhado, ao_terminar=lambda: shm_utils.liberar(bloco))
+
+
+def submeter_video(dados, nome):
+    """Enfileira um vídeo (bytes do upload) para análise com rastreamento."""
+    return submeter(dados, nome, _executar_video)
+
+
+def submeter_sequencia(lista_dados, nome):
+    """Enfileira uma sequência de frames (lista de bytes de imagens)."""
+    return submeter(lista_dados, nome, _executar_sequencia)
+
+
+def consultar(job_id):
+    """Retorna uma cópia do estado do job, ou None se não existir/expirou."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        future = _futures.get(job_id)
+        if job["status"] == PENDENTE and future is not None and future.running():
+            job["status"] = PROCESSANDO
+        return dict(job)
+
+
+def pendentes():
+    with _lock:
+        return sum(1 for job in _jobs.values() if job["status"] in (PENDENTE, PROCESSANDO))
@@ -0,0 +1,195 @@
+# detector/lote.py
+import os
+import queue
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from . import pipeline
+from .utils import artifact_utils, cache_utils, storage_utils, calibration_utils
+from .utils.config import LOTE_YOLO, LOTE_FILA, LOTE_ROSTO_WORKERS, LOTE_MAX_IMAGENS, LOTE_MAX_BYTES_ARQUIVO, MEDIA_DIR
+from .utils.metrics_utils import Cronometro
+
+# Processamento de muitas imagens em uma requisição, em três estágios
+# sobrepostos:
+#   1. thread produtora: hash, cache e decodificação (fila limitada);
+#   2. thread principal: junta até LOTE_YOLO imagens e roda o YOLO UMA vez;
+#   3. pool de rosto: FaceMesh, idade, cores e recortes da imagem k enquanto
+#      o YOLO já processa as próximas.
+# No máximo 2 x LOTE_YOLO imagens decodificadas esperam pelas etapas de rosto.
+
+EXTENSOES = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+_FIM = object()
+
+
+def itens_zip(arquivo, max_bytes=LOTE_MAX_BYTES_ARQUIVO):
+    """
+    Gera (nome, bytes) de cada imagem de um .zip (caminho ou file-like), sem extrair para o disco.
+    Entradas com tamanho descompactado acima de `max_bytes` saem como (nome, None), sem serem lidas
+    (o zipfile não lê além do tamanho declarado).
+    """
+    with zipfile.ZipFile(arquivo) as z:
+        for info in z.infolist():
+            if info.is_dir() or os.path.splitext(info.filename)[1].lower() not in EXTENSOES:
+                continue
+            nome = os.path.basename(info.filename)
+            yield nome, (z.read(info) if info.file_size <= max_bytes else None)
+
+
+def _colocar(fila, item, parar):
+    """put() que desiste quando o consumidor pede para parar (não fica bloqueado para sempre)."""
+    while not parar.is_set():
+        try:
+            fila.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _produzir(itens, fila, media_dir, max_imagens, estado, camera, parar):
+    try:
+        for indice, (nome, dados) in enumerate(itens):
+            if parar.is_set():
+                break
+            if indice >= max_imagens:
+                estado["truncado"] = True
+                break
+            if dados is None:
+                erro = f"Arquivo maior que {LOTE_MAX_BYTES_ARQUIVO // (1024 * 1024)} MB."
+                if not _colocar(fila, {"nome": nome, "sha256": None,
+                                       "resultado": {"pessoas": [], "erro": erro, "sha256": None}}, parar):
+                    break
+                continue
+            cron = Cronometro()
+            with cron.etapa("hash"):
+                sha256 = cache_utils.hash_conteudo(dados)
+            with cron.etapa("calibracao"):
+                perfil = calibration_utils.obter(calibration_utils.chave_perfil(dados, camera))
+            with cron.etapa("cache"):
+                resultado = cache_utils.obter(cache_utils.chave_cache(sha256, perfil), media_dir)
+            item = {"nome": nome, "sha256": sha256, "cron": cron, "perfil": perfil}
+            if resultado is not None:
+                storage_utils.tocar(storage_utils.diretorio_conteudo(sha256, media_dir))
+                item["resultado"] = {**resultado, "sha256": sha256, "cache": True, "tempos": cron.resumo()}
+            else:
+                item["image"] = pipeline.preparar_upload(dados, sha256, nome, media_dir, cron)
+                if item["image"] is None:
+                    item["resultado"] = {"pessoas": [], "erro": "Não foi possível decodificar a imagem enviada.",
+                                         "sha256": sha256, "tempos": cron.resumo()}
+            if not _colocar(fila, item, parar):
+                break
+    except Exception as e:
+        print(f"Erro ao ler as imagens do lote: {e}")
+        estado["erro"] = str(e)
+    finally:
+        _colocar(fila, _FIM, parar)
+
+
+def _proximo_lote(fila):
+    """Bloqueia pelo primeiro item e junta os que já estão prontos, até LOTE_YOLO imagens."""
+    itens, imagens = [], 0
+    item = fila.get()
+    while True:
+        if item is _FIM:
+            return itens, True
+        itens.append(item)
+        imagens += "resultado" not in item
+        if imagens >= LOTE_YOLO:
+            return itens, False
+        try:
+            item = fila.get_nowait()
+        except queue.Empty:
+            return itens, False
+
+
+def processar_lote(itens, media_dir=MEDIA_DIR, max_imagens=LOTE_MAX_IMAGENS, camera=None):
+    """
+    Processa um iterável de (nome, bytes). `camera` identifica o perfil de
+    calibração de todas as imagens (sem ele, o EXIF de cada uma).
+    Retorna {"itens": [...], "truncado",
+    "erro", "segundos"}, onde cada item tem "nome", "sha256" e o "resultado"
+    (o mesmo de `pipeline.processar_bytes`), na ordem de entrada.
+    """
+    fila = queue.Queue(maxsize=LOTE_FILA)
+    estado = {"truncado": False, "erro": None}
+    parar = threading.Event()
+    inicio = time.perf_counter()
+    threading.Thread(target=_produzir, args=(itens, fila, media_dir, max_imagens, estado, camera, parar),
+                     name="lote-decodificacao", daemon=True).start()
+
+    itens_lidos, em_andamento = [], set()
+    try:
+        pipe = pipeline.Pipeline()
+        with ThreadPoolExecutor(LOTE_ROSTO_WORKERS, thread_name_prefix="lote-rosto") as rostos:
+            fim = False
+            while not fim:
+                lote, fim = _proximo_lote(fila)
+                itens_lidos += lote
+                lote = [item for item in lote if "resultado" not in item]
+                if not lote:
+                    continue
+
+                # Limita as imagens decodificadas na memória esperando pelas etapas de rosto
+                while len(em_andamento) >= 2 * LOTE_YOLO:
+                    _, em_andamento = wait(em_andamento, return_when=FIRST_COMPLETED)
+
+                # Uma falha no YOLO vira erro das imagens deste lote; as demais seguem
+                wall, cpu = time.perf_counter(), time.process_time()
+                try:
+                    poses = pipe.detectar_corpos_lote([item["image"] for item in lote])
+                except Exception as e:
+                    print(f"Erro na pose de um lote de {len(lote)} imagens: {e}")
+                    for item in lote:
+                        item.pop("image", None)
+                        item["resultado"] = {"pessoas": [], "erro": str(e), "sha256": item["sha256"]}
+                    continue
+                # Cada imagem fica com a sua fração do tempo do lote
+                wall_ms = (time.perf_counter() - wall) * 1000 / len(lote)
+                cpu_ms = (time.process_time() - cpu) * 1000 / len(lote)
+                for item, pose in zip(lote, poses):
+                    item["cron"].registrar("pose", wall_ms, cpu_ms)
+                    try:
+                        item["futuro"] = rostos.submit(pipeline.processar_decodificada, item.pop("image"),
+                                                       item["sha256"], item["nome"], media_dir, item["cron"], pose,
+                                                       item["perfil"])
+                    except Exception as e:
+                        print(f"Erro ao agendar '{item['nome']}' no lote: {e}")
+                        item["resultado"] = {"pessoas": [], "erro": str(e), "sha256": item["sha256"]}
+                        continue
+                    em_andamento.add(item["futuro"])
+    except Exception as e:
+        # Falha fora das etapas por imagem: devolve o que já foi processado
+        print(f"Erro no processamento do lote: {e}")
+        estado["erro"] = str(e)
+    finally:
+        # Libera a thread produtora (e as imagens decodificadas que estão na fila)
+        parar.set()
+        while True:
+            try:
+                fila.get_nowait()
+            except queue.Empty:
+                break
+
+    for item in itens_lidos:
+        if "futuro" in item:
+            try:
+                item["resultado"] = item.pop("futuro").result()
+            except Exception as e:
+                print(f"Erro ao processar '{item['nome']}' no lote: {e}")
+                item["resultado"] = {"pessoas": [], "erro": str(e), "sha256": item["sha256"]}
+        elif "resultado" not in item:
+            item.pop("image", None)
+            item["resultado"] = {"pessoas": [], "erro": "Imagem não processada: o lote foi interrompido.",
+                                 "sha256": item["sha256"]}
+    # As URLs do relatório só são válidas depois que os recortes foram gravados
+    artifact_utils.aguardar()
+
+    return {
+        "itens": [{"nome": i["nome"], "sha256": i["sha256"], "resultado": i["resultado"]} for i in itens_lidos],
+        "truncado": estado["truncado"],
+        "erro": estado["erro"],
+        "segundos": time.perf_counter() - inicio,
+    }
@@ -0,0 +1,182 @@
+# detector/management/commands/benchmark_pipeline.py
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.utils.config import MEDIA_DIR
+
+# Imagens de referência em media/: uma pessoa (estúdio, celular, câmera) e o caso multi-pessoa
+IMAGENS_PADRAO = [
+    "165.jpg",
+    "175.jpg",
+    "IMG_20250301_153437453_HDR.jpg",
+    "stock-photo-full-length-portrait-of-a-girl-wearing-simple-black-shirt-and-jeans-standing-pose-on-white-studio-1017349834.jpg",
+    "woman-full-body-1611151931AQt.jpg",
+    "generacion-trabajo.jpg",
+]
+
+BASELINE_PADRAO = os.path.join("benchmarks", "baseline.json")
+
+
+def _pico_rss_mb():
+    """Pico de memória residente do processo (MB)."""
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux informa em KB, macOS em bytes
+        return pico / 1024 / 1024 if platform.system() == "Darwin" else pico / 1024
+    except ImportError:
+        import psutil
+        mem = psutil.Process().memory_info()
+        return getattr(mem, "peak_wset", mem.rss) / 1024 / 1024
+
+
+def _estatisticas(latencias_ms):
+    arr = np.asarray(latencias_ms, dtype=np.float64)
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "media_ms": round(float(arr.mean()), 2),
+        "execucoes": int(arr.size),
+    }
+
+
+class Command(BaseCommand):
+    help = ("Mede o pipeline nas imagens de exemplo de media/: latência p50/p95, throughput, "
+            "pico de RSS e tempo por etapa. Pode salvar um baseline e comparar execuções com ele.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("imagens", nargs="*", help="Imagens a medir (padrão: conjunto de referência em media/).")
+        parser.add_argument("--repeticoes", type=int, default=5, help="Execuções medidas por imagem.")
+        parser.add_argument("--aquecimento", type=int, default=1, help="Execuções descartadas por imagem.")
+        parser.add_argument("--salvar-baseline", nargs="?", const=BASELINE_PADRAO, default=None,
+                            help=f"Grava o resultado como baseline (padrão: {BASELINE_PADRAO}).")
+        parser.add_argument("--comparar", nargs="?", const=BASELINE_PADRAO, default=None,
+                            help="Compara com um baseline salvo e falha se houver regressão.")
+        parser.add_argument("--tolerancia", type=float, default=0.10,
+                            help="Piora relativa aceita no p50/p95 antes de acusar regressão (0.10 = 10%%).")
+        parser.add_argument("--saida", default=None, help="Grava o relatório completo em JSON.")
+
+    def handle(self, *args, **options):
+        # Import tardio: só carrega os modelos quando o comando roda
+        from detector import pipeline
+        from detector.utils import artifact_utils
+
+        if not pipeline.modelos_carregados():
+            raise CommandError("Modelos de IA não foram carregados corretamente.")
+
+        caminhos = options["imagens"] or [os.path.join(MEDIA_DIR, nome) for nome in IMAGENS_PADRAO]
+        imagens = []
+        for path in caminhos:
+            if not os.path.exists(path):
+                self.stderr.write(f"Imagem não encontrada, ignorada: {path}")
+                continue
+            with open(path, "rb") as f:
+                image = pipeline.decodificar_imagem(f.read())
+            if image is None:
+                self.stderr.write(f"Não foi possível decodificar, ignorada: {path}")
+                continue
+            imagens.append((os.path.basename(path), image))
+        if not imagens:
+            raise CommandError("Nenhuma imagem para medir.")
+
+        tempos_carga = pipeline.aquecer_modelos()
+        saida_tmp = tempfile.mkdtemp(prefix="benchmark_")
+        por_imagem, todas, etapas = {}, [], {}
+        try:
+            inicio = time.perf_counter()
+            for nome, image in imagens:
+                latencias, n_pessoas = [], 0
+                for i in range(options["aquecimento"] + options["repeticoes"]):
+                    t0 = time.perf_counter()
+                    resultado = pipeline.processar_imagem(image, nome, saida_tmp)
+                    dt = (time.perf_counter() - t0) * 1000
+                    # A gravação dos recortes fica fora da latência medida, mas não acumula entre execuções
+                    artifact_utils.aguardar()
+                    if i < options["aquecimento"]:
+                        continue
+                    latencias.append(dt)
+                    n_pessoas = len(resultado["pessoas"])
+                    for etapa, e in resultado["tempos"]["etapas"].items():
+                        etapas.setdefault(etapa, []).append(e["wall_ms"])
+                por_imagem[nome] = {**_estatisticas(latencias), "pessoas": n_pessoas,
+                                    "resolucao": f"{image.shape[1]}x{image.shape[0]}"}
+                todas.extend(latencias)
+                self.stdout.write(f"{nome}: p50 {por_imagem[nome]['p50_ms']} ms, "
+                                  f"p95 {por_imagem[nome]['p95_ms']} ms, {n_pessoas} pessoa(s)")
+            duracao = time.perf_counter() - inicio
+        finally:
+            shutil.rmtree(saida_tmp, ignore_errors=True)
+
+        medidas = len(todas)
+        relatorio = {
+            "maquina": {"python": platform.python_version(), "sistema": platform.platform(),
+                        "processador": platform.processor(), "cpus": os.cpu_count()},
+            "geral": {
+                **_estatisticas(todas),
+                # inclui o aquecimento e a espera pelas gravações: é o ritmo sustentado do processo
+                "imagens_por_segundo": round(medidas / duracao, 3) if duracao else None,
+                "pico_rss_mb": round(_pico_rss_mb(), 1),
+            },
+            # Segundos de carga de cada modelo (cold start)
+            "carga_modelos_s": {nome: round(sum(v), 3) for nome, v in tempos_carga.items()},
+            "imagens": por_imagem,
+            # Tempo médio por imagem de cada etapa (ms)
+            "etapas": {etapa: round(sum(v) / medidas, 3) for etapa, v in sorted(etapas.items())},
+        }
+        self._imprimir(relatorio)
+
+        if options["saida"]:
+            self._gravar(relatorio, options["saida"])
+        if options["salvar_baseline"]:
+            self._gravar(relatorio, options["salvar_baseline"])
+            self.stdout.write(self.style.SUCCESS(f"Baseline salvo em {options['salvar_baseline']}"))
+        if options["comparar"]:
+            self._comparar(relatorio, options["comparar"], options["tolerancia"])
+
+    def _imprimir(self, relatorio):
+        g = relatorio["geral"]
+        self.stdout.write(f"\nGeral: p50 {g['p50_ms']} ms | p95 {g['p95_ms']} ms | "
+                          f"{g['imagens_por_segundo']} img/s | pico RSS {g['pico_rss_mb']} MB")
+        cargas = ", ".join(f"{nome} {seg:.2f}s" for nome, seg in relatorio["carga_modelos_s"].items())
+        self.stdout.write(f"Carga dos modelos: {cargas}")
+        self.stdout.write("Tempo médio por etapa (ms/imagem):")
+        for etapa, ms in sorted(relatorio["etapas"].items(), key=lambda kv: -kv[1]):
+            self.stdout.write(f"  {etapa:<16} {ms:>10.2f}")
+
+    def _gravar(self, relatorio, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+    def _comparar(self, relatorio, path, tolerancia):
+        if not os.path.exists(path):
+            raise CommandError(f"Baseline não encontrado: {path}")
+        with open(path, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        linhas = [("geral", relatorio["geral"], baseline.get("geral", {}))]
+        linhas += [(nome, r, baseline.get("imagens", {}).get(nome, {})) for nome, r in relatorio["imagens"].items()]
+
+        regressoes = []
+        self.stdout.write(f"\nComparação com {path} (tolerância {tolerancia:.0%}):")
+        for nome, atual, base in linhas:
+            for metrica in ("p50_ms", "p95_ms"):
+                if not base.get(metrica):
+                    continue
+                variacao = atual[metrica] / base[metrica] - 1
+                marca = "REGRESSÃO" if variacao > tolerancia else ("melhora" if variacao < -tolerancia else "ok")
+                self.stdout.write(f"  {nome[:40]:<40} {metrica}: {base[metrica]:>9.1f} -> {atual[metrica]:>9.1f} "
+                                  f"({variacao:+.1%}) {marca}")
+                if variacao > tolerancia:
+                    regressoes.append(f"{nome} {metrica}")
+
+        if regressoes:
+            raise CommandError(f"Regressão de desempenho em: {', '.join(regressoes)}")
+        self.stdout.write(self.style.SUCCESS("Sem regressões."))
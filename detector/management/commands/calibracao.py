@@ -0,0 +1,39 @@
+# detector/management/commands/calibracao.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.utils import calibration_utils
+
+
+class Command(BaseCommand):
+    help = ("Lista e ajusta os perfis de calibração por câmera "
+            "(IRIS_MM / CALIBRACAO_ESCALA por perfil e o ajuste aprendido do plano do chão).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("chave", nargs="?",
+                            help="Chave do perfil (ex.: 'camera-entrada'). Sem ela, lista os perfis.")
+        parser.add_argument("--iris-mm", type=float, default=None, help="Diâmetro da íris (mm) deste perfil.")
+        parser.add_argument("--calibracao", type=float, default=None, help="Fator de calibração deste perfil.")
+        parser.add_argument("--reiniciar", action="store_true",
+                            help="Descarta as amostras aprendidas (ex.: a câmera mudou de posição).")
+
+    def handle(self, *args, **options):
+        chave = options["chave"]
+        if not chave:
+            for chave in calibration_utils.listar():
+                perfil = calibration_utils.obter(chave)
+                estado = "confiável" if perfil.confiavel else "aprendendo"
+                self.stdout.write(f"{chave}: {perfil.n} amostras, {estado}")
+            return
+
+        ajustes = {k: options[k] for k in ("iris_mm", "calibracao") if options[k] is not None}
+        if any(v <= 0 for v in ajustes.values()):
+            raise CommandError("--iris-mm e --calibracao devem ser positivos.")
+        if ajustes:
+            calibration_utils.configurar(chave, **ajustes)
+        if options["reiniciar"]:
+            calibration_utils.reiniciar(chave)
+
+        perfil = calibration_utils.obter(chave)
+        self.stdout.write(json.dumps(perfil.como_dict(), ensure_ascii=False, indent=2))
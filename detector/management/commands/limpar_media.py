@@ -0,0 +1,32 @@
+# detector/management/commands/limpar_media.py
+from django.core.management.base import BaseCommand
+
+from detector.utils import storage_utils
+from detector.utils.config import MEDIA_DIR, MEDIA_MAX_BYTES
+
+
+class Command(BaseCommand):
+    help = "Remove arquivos expirados de media/ (TTL por tipo) e aplica a cota de tamanho (LRU)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Só mostra o que seria removido.")
+        parser.add_argument("--incluir-legado", action="store_true",
+                            help="Também trata os recortes e imagens anotadas soltos na raiz de media/ "
+                                 "(layout antigo por nome); as demais imagens ficam intactas.")
+        parser.add_argument("--max-mb", type=float, default=None,
+                            help="Cota em MB (padrão: MEDIA_MAX_BYTES do config).")
+
+    def handle(self, *args, **options):
+        max_bytes = MEDIA_MAX_BYTES if options["max_mb"] is None else int(options["max_mb"] * 1024 * 1024)
+        stats = storage_utils.coletar_lixo(
+            MEDIA_DIR,
+            max_bytes=max_bytes,
+            incluir_legado=options["incluir_legado"],
+            dry_run=options["dry_run"],
+        )
+        prefixo = "[dry-run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefixo}{stats['removidos']} itens removidos, "
+            f"{stats['bytes_liberados'] / 1024 / 1024:.1f} MB liberados, "
+            f"{stats['bytes_total'] / 1024 / 1024:.1f} MB restantes."
+        ))
@@ -0,0 +1,129 @@
+# detector/management/commands/otimizar_modelos.py
+import glob
+import os
+import shutil
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from detector.utils.config import (
+    MEDIA_DIR, YOLO_POSE_MODEL, YOLO_POSE_ONNX,
+    AGE_MODEL_PATH, AGE_MODEL_OTIMIZADO_PATH, AGE_MODEL_INT8_PATH,
+)
+from .benchmark_pipeline import IMAGENS_PADRAO
+
+
+class Command(BaseCommand):
+    help = ("Gera as variantes otimizadas dos modelos (idade com grafo otimizado ou quantizada em int8, "
+            "pose exportada para ONNX) e compara a precisão delas com os modelos originais.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--idade-otimizado", action="store_true",
+                            help=f"Salva o grafo otimizado do modelo de idade em {AGE_MODEL_OTIMIZADO_PATH}.")
+        parser.add_argument("--idade-int8", action="store_true",
+                            help=f"Quantiza (dinâmico, pesos int8) o modelo de idade em {AGE_MODEL_INT8_PATH}.")
+        parser.add_argument("--pose-onnx", action="store_true",
+                            help=f"Exporta {YOLO_POSE_MODEL} para ONNX em {YOLO_POSE_ONNX}.")
+        parser.add_argument("--comparar", action="store_true",
+                            help="Compara as variantes existentes com os modelos originais nas imagens de media/.")
+
+    def handle(self, *args, **options):
+        if not any(options[k] for k in ("idade_otimizado", "idade_int8", "pose_onnx", "comparar")):
+            raise CommandError("Escolha ao menos uma opção (--idade-otimizado, --idade-int8, --pose-onnx, --comparar).")
+
+        if options["idade_otimizado"]:
+            self._idade_otimizado()
+        if options["idade_int8"]:
+            self._idade_int8()
+        if options["pose_onnx"]:
+            self._pose_onnx()
+        if options["comparar"]:
+            self._comparar_idade()
+            self._comparar_pose()
+
+    # ---------- geração ----------
+
+    def _idade_otimizado(self):
+        import onnxruntime as ort
+        from detector.utils.onnx_utils import opcoes_sessao
+
+        os.makedirs(os.path.dirname(AGE_MODEL_OTIMIZADO_PATH), exist_ok=True)
+        # Criar a sessão com optimized_model_filepath grava o grafo já otimizado
+        ort.InferenceSession(AGE_MODEL_PATH, sess_options=opcoes_sessao("extended", salvar_em=AGE_MODEL_OTIMIZADO_PATH),
+                             providers=["CPUExecutionProvider"])
+        self.stdout.write(self.style.SUCCESS(f"Modelo de idade otimizado salvo em {AGE_MODEL_OTIMIZADO_PATH}"))
+
+    def _idade_int8(self):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        os.makedirs(os.path.dirname(AGE_MODEL_INT8_PATH), exist_ok=True)
+        quantize_dynamic(AGE_MODEL_PATH, AGE_MODEL_INT8_PATH, weight_type=QuantType.QInt8)
+        antes, depois = os.path.getsize(AGE_MODEL_PATH), os.path.getsize(AGE_MODEL_INT8_PATH)
+        self.stdout.write(self.style.SUCCESS(
+            f"Modelo de idade int8 salvo em {AGE_MODEL_INT8_PATH} ({antes / 1e6:.1f} MB -> {depois / 1e6:.1f} MB)"))
+
+    def _pose_onnx(self):
+        from ultralytics import YOLO
+
+        gerado = YOLO(YOLO_POSE_MODEL).export(format="onnx", dynamic=True, simplify=True)
+        os.makedirs(os.path.dirname(YOLO_POSE_ONNX), exist_ok=True)
+        if os.path.abspath(gerado) != os.path.abspath(YOLO_POSE_ONNX):
+            shutil.move(gerado, YOLO_POSE_ONNX)
+        self.stdout.write(self.style.SUCCESS(f"Modelo de pose ONNX salvo em {YOLO_POSE_ONNX}"))
+
+    # ---------- comparação ----------
+
+    def _comparar_idade(self):
+        from detector.utils.age_utils import _preprocess_face
+        from detector.utils.onnx_utils import SessaoOnnx
+
+        rostos = [cv2.imread(p) for p in sorted(glob.glob(os.path.join(MEDIA_DIR, "**", "face_*"), recursive=True))]
+        rostos = [r for r in rostos if r is not None and r.size > 0]
+        if not rostos:
+            self.stderr.write("Nenhum recorte de rosto (face_*) em media/ para comparar a idade.")
+            return
+
+        referencia = self._probabilidades(SessaoOnnx(AGE_MODEL_PATH), rostos, _preprocess_face)
+        for nome, path in (("otimizado", AGE_MODEL_OTIMIZADO_PATH), ("int8", AGE_MODEL_INT8_PATH)):
+            if not os.path.exists(path):
+                continue
+            probs = self._probabilidades(SessaoOnnx(path), rostos, _preprocess_face)
+            concordancia = float(np.mean(probs.argmax(1) == referencia.argmax(1)))
+            delta = float(np.abs(probs - referencia).mean())
+            self.stdout.write(f"Idade {nome}: {len(rostos)} rostos | mesma faixa em {concordancia:.1%} | "
+                              f"diferença média das probabilidades {delta:.4f}")
+
+    @staticmethod
+    def _probabilidades(sessao, rostos, preprocess):
+        saidas = []
+        buf = sessao.buffer(1)
+        for rosto in rostos:
+            preprocess(rosto, out=buf[0])
+            saidas.append(sessao.run(buf)[0].copy())
+        return np.stack(saidas)
+
+    def _comparar_pose(self):
+        if not os.path.exists(YOLO_POSE_ONNX):
+            return
+        from ultralytics import YOLO
+        from detector.utils.geometry_utils import alturas_pixels
+
+        modelos = {"pytorch": YOLO(YOLO_POSE_MODEL), "onnx": YOLO(YOLO_POSE_ONNX, task="pose")}
+        for nome in IMAGENS_PADRAO:
+            image = cv2.imread(os.path.join(MEDIA_DIR, nome))
+            if image is None:
+                continue
+            kpts = {}
+            for backend, modelo in modelos.items():
+                r = modelo(image, verbose=False)[0]
+                kpts[backend] = r.keypoints.data.cpu().numpy() if r.keypoints is not None else np.zeros((0, 17, 3))
+            a, b = kpts["pytorch"], kpts["onnx"]
+            linha = f"Pose {nome[:40]:<40} pessoas {len(a)} -> {len(b)}"
+            if len(a) and len(a) == len(b):
+                # Mesma ordenação por confiança nas duas saídas: compara pessoa a pessoa
+                erro_kpt = float(np.abs(a[..., :2] - b[..., :2]).mean())
+                alt_a, alt_b = alturas_pixels(a)[0], alturas_pixels(b)[0]
+                erro_alt = float(np.nanmean(np.abs(alt_a - alt_b) / np.maximum(alt_a, 1)))
+                linha += f" | erro médio keypoints {erro_kpt:.2f}px | altura em pixels {erro_alt:.2%}"
+            self.stdout.write(linha)
@@ -0,0 +1,137 @@
+# detector/management/commands/processar_lote.py
+import csv
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.core.management.base import BaseCommand, CommandError
+
+from detector import jobs
+from detector.utils import cache_utils
+from detector.utils.config import JOBS_WORKERS
+
+EXTENSOES = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+# Colunas do CSV: uma linha por pessoa (ou uma linha vazia se a imagem não tiver pessoas)
+CAMPOS_CSV = [
+    "arquivo", "sha256", "erro", "id", "altura", "escala", "iris_direita", "iris_esquerda",
+    "media_iris", "diff_iris", "idade_estimativa", "faixa_etaria", "cor_olhos", "cor_cabelo",
+]
+
+
+def _listar_imagens(entrada, recursivo):
+    """Arquivos de imagem de um diretório, ou as linhas de um manifesto (.txt)."""
+    if os.path.isfile(entrada):
+        base = os.path.dirname(os.path.abspath(entrada))
+        with open(entrada, encoding='utf-8') as f:
+            for linha in f:
+                linha = linha.strip()
+                if linha and not linha.startswith('#'):
+                    yield linha if os.path.isabs(linha) else os.path.join(base, linha)
+        return
+
+    for raiz, dirs, arquivos in os.walk(entrada):
+        dirs.sort()
+        for nome in sorted(arquivos):
+            if nome.lower().endswith(EXTENSOES):
+                yield os.path.join(raiz, nome)
+        if not recursivo:
+            break
+
+
+def _ja_processados(saida, formato):
+    """SHA-256 das imagens que já estão no arquivo de saída (para retomar)."""
+    if not os.path.exists(saida):
+        return set()
+    vistos = set()
+    with open(saida, encoding='utf-8', newline='') as f:
+        if formato == 'csv':
+            for linha in csv.DictReader(f):
+                if linha.get("sha256"):
+                    vistos.add(linha["sha256"])
+        else:
+            for linha in f:
+                try:
+                    vistos.add(json.loads(linha)["sha256"])
+                except (ValueError, KeyError):
+                    continue  # linha truncada por uma interrupção
+    return vistos
+
+
+class Command(BaseCommand):
+    help = ("Processa um diretório (ou manifesto) de imagens em paralelo e grava os resultados em JSONL/CSV. "
+            "Pode ser interrompido e retomado: imagens cujo SHA-256 já está na saída são puladas.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("entrada", help="Diretório de imagens ou arquivo .txt com um caminho por linha.")
+        parser.add_argument("--saida", default="resultados.jsonl", help="Arquivo de saída (.jsonl ou .csv).")
+        parser.add_argument("--formato", choices=["jsonl", "csv"], default=None,
+                            help="Formato da saída (padrão: pela extensão de --saida).")
+        parser.add_argument("--processos", type=int, default=JOBS_WORKERS, help="Número de processos.")
+        parser.add_argument("--recursivo", action="store_true", help="Percorre subdiretórios.")
+
+    def handle(self, *args, **options):
+        entrada, saida = options["entrada"], options["saida"]
+        if not os.path.exists(entrada):
+            raise CommandError(f"Entrada não encontrada: {entrada}")
+        formato = options["formato"] or ('csv' if saida.lower().endswith('.csv') else 'jsonl')
+        processos = max(1, options["processos"])
+
+        vistos = _ja_processados(saida, formato)
+        if vistos:
+            self.stdout.write(f"Retomando: {len(vistos)} imagens já processadas em {saida}.")
+
+        novo_csv = formato == 'csv' and not os.path.exists(saida)
+        processadas = puladas = erros = 0
+
+        with open(saida, 'a', encoding='utf-8', newline='') as out, jobs.novo_pool(processos) as pool:
+            writer = csv.DictWriter(out, fieldnames=CAMPOS_CSV, extrasaction='ignore') if formato == 'csv' else None
+            if novo_csv:
+                writer.writeheader()
+
+            def escrever(registro):
+                if writer is None:
+                    out.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                else:
+                    base = {"arquivo": registro["arquivo"], "sha256": registro["sha256"], "erro": registro.get("erro") or ""}
+                    for pessoa in registro.get("pessoas") or [{}]:
+                        writer.writerow({**base, **pessoa})
+                out.flush()  # cada imagem concluída já fica salva (permite retomar)
+
+            # Mantém no máximo 2 imagens por processo em voo (memória limitada)
+            em_voo = set()
+            for path in _listar_imagens(entrada, options["recursivo"]):
+                try:
+                    with open(path, 'rb') as f:
+                        sha256 = cache_utils.hash_conteudo(iter(lambda: f.read(1 << 20), b""))
+                except OSError as e:
+                    self.stderr.write(f"Erro ao ler {path}: {e}")
+                    erros += 1
+                    continue
+                if sha256 in vistos:
+                    puladas += 1
+                    continue
+                vistos.add(sha256)
+
+                if len(em_voo) >= processos * 2:
+                    feitos, em_voo = wait(em_voo, return_when=FIRST_COMPLETED)
+                    for futuro in feitos:
+                        processadas, erros = self._coletar(futuro, escrever, processadas, erros)
+                em_voo.add(pool.submit(jobs.processar_arquivo, path))
+
+            for futuro in wait(em_voo).done:
+                processadas, erros = self._coletar(futuro, escrever, processadas, erros)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{processadas} imagens processadas, {puladas} puladas (já processadas), {erros} erros. Saída: {saida}"
+        ))
+
+    def _coletar(self, futuro, escrever, processadas, erros):
+        try:
+            registro = futuro.result()
+        except Exception as e:
+            self.stderr.write(f"Erro no processamento: {e}")
+            return processadas, erros + 1
+        escrever(registro)
+        self.stdout.write(f"{registro['arquivo']}: {len(registro['pessoas'])} pessoa(s)")
+        return processadas + 1, erros
@@ -0,0 +1,69 @@
+# detector/management/commands/recalcular.py
+import csv
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from detector.utils import intermediate_utils
+from detector.utils.config import INTERMEDIARIOS_DIR
+
+
+class Command(BaseCommand):
+    help = ("Recalcula alturas, escalas, idades e cores a partir das saídas brutas guardadas "
+            "(sem rodar YOLO, FaceMesh nem ONNX) e compara com os valores originais.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=INTERMEDIARIOS_DIR, help="Diretório dos registros .npz.")
+        parser.add_argument("--iris-mm", type=float, default=None,
+                            help="Diâmetro da íris (mm) para todos os registros (padrão: o gravado em cada um, "
+                                 "que inclui o perfil de calibração da câmera).")
+        parser.add_argument("--calibracao", type=float, default=None,
+                            help="Fator de calibração para todos os registros (padrão: o gravado em cada um).")
+        parser.add_argument("--limite", type=int, default=0, help="Processa no máximo N imagens (0 = todas).")
+        parser.add_argument("--csv", default=None, help="Grava uma linha por pessoa (antes e depois) neste arquivo.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        paths, registros = [], []
+        for path in intermediate_utils.listar(options["dir"]):
+            if options["limite"] and len(paths) >= options["limite"]:
+                break
+            try:
+                registros.append(intermediate_utils.carregar(path))
+                paths.append(path)
+            except Exception as e:
+                self.stderr.write(f"Erro ao ler {path}: {e}")
+        leitura = time.perf_counter() - inicio
+
+        colunas = intermediate_utils.recalcular(registros, options["iris_mm"], options["calibracao"])
+        segundos = time.perf_counter() - inicio
+        if not colunas or not len(colunas["id"]):
+            self.stdout.write("Nenhuma pessoa nos registros.")
+            return
+
+        antes, depois = colunas["altura_cm_antes"], colunas["altura_cm"]
+        ambos = ~np.isnan(antes) & ~np.isnan(depois)
+        delta = np.abs(depois[ambos] - antes[ambos])
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(registros)} imagens, {len(colunas['id'])} pessoas em {segundos:.2f}s "
+            f"(leitura {leitura:.2f}s)"
+        ))
+        if len(delta):
+            self.stdout.write(f"altura: |Δ| médio {delta.mean():.2f} cm, máximo {delta.max():.2f} cm, "
+                              f"{int((delta >= 0.5).sum())} pessoas com |Δ| >= 0.5 cm")
+        self.stdout.write(f"altura: {int((np.isnan(antes) != np.isnan(depois)).sum())} pessoas ganharam/perderam medida")
+        for campo in ("idade", "cor_olhos", "cor_cabelo"):
+            mudou = int((colunas[campo] != colunas[f"{campo}_antes"]).sum())
+            self.stdout.write(f"{campo}: {mudou} pessoas mudaram")
+
+        if options["csv"]:
+            campos = ["arquivo", "id", "perfil", "iris_mm", "calibracao", "altura_pixels", "iris_direita_px", "iris_esquerda_px", "escala_mm_px",
+                      "diff_iris_pct", "altura_cm_antes", "altura_cm", "idade_antes", "idade",
+                      "cor_olhos_antes", "cor_olhos", "cor_cabelo_antes", "cor_cabelo"]
+            with open(options["csv"], "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(campos)
+                for j, k in enumerate(colunas["registro"]):
+                    writer.writerow([paths[k]] + [colunas[c][j] for c in campos[1:]])
+            self.stdout.write(f"CSV gravado em {options['csv']}")
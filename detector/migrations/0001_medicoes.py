@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Pessoa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('indice', models.PositiveIntegerField()),
+                ('faixa_etaria', models.CharField(blank=True, max_length=32)),
+                ('cor_olhos', models.CharField(blank=True, max_length=32)),
+                ('cor_cabelo', models.CharField(blank=True, max_length=32)),
+                ('face_url', models.CharField(blank=True, max_length=500)),
+            ],
+            options={
+                'ordering': ['indice'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Medicao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('altura_pixels', models.FloatField(null=True)),
+                ('iris_direita_px', models.FloatField(null=True)),
+                ('iris_esquerda_px', models.FloatField(null=True)),
+                ('escala_mm_px', models.FloatField(null=True)),
+                ('diff_iris_pct', models.FloatField(null=True)),
+                ('altura_cm', models.FloatField(null=True)),
+                ('idade', models.PositiveSmallIntegerField(null=True)),
+                ('pessoa', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='medicao', to='detector.pessoa')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Upload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('nome', models.CharField(max_length=255)),
+                ('origem', models.CharField(choices=[('web', 'Formulário'), ('api', 'API de jobs')], default='web', max_length=8)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('cache', models.BooleanField(default=False)),
+                ('erro', models.TextField(blank=True, null=True)),
+                ('versao_modelos', models.CharField(max_length=16)),
+                ('backend_pose', models.CharField(max_length=16)),
+                ('backend_idade', models.CharField(max_length=16)),
+                ('total_ms', models.FloatField(null=True)),
+                ('tempos', models.JSONField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['sha256'], name='upload_sha256_idx'), models.Index(fields=['criado_em'], name='upload_criado_em_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='pessoa',
+            name='upload',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pessoas', to='detector.upload'),
+        ),
+    ]
@@ -1,3 +1,150 @@
-from django.db import models
+from django.db import models, transaction
 
-# Create your models here.
+
+# Histórico das análises: um Upload por imagem processada, uma Pessoa por
+# pessoa detectada e a Medicao numérica dela. Permite analisar os dados de
+# produção (distribuição de escalas, idades, tempos) sem reprocessar imagens.
+
+
+class Upload(models.Model):
+    ORIGEM_WEB = "web"
+    ORIGEM_API = "api"
+    ORIGENS = [(ORIGEM_WEB, "Formulário"), (ORIGEM_API, "API de jobs")]
+
+    sha256 = models.CharField(max_length=64)
+    nome = models.CharField(max_length=255)
+    origem = models.CharField(max_length=8, choices=ORIGENS, default=ORIGEM_WEB)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    cache = models.BooleanField(default=False)
+    erro = models.TextField(null=True, blank=True)
+    # Identificação dos modelos/parâmetros que geraram o resultado
+    versao_modelos = models.CharField(max_length=16)
+    backend_pose = models.CharField(max_length=16)
+    backend_idade = models.CharField(max_length=16)
+    # Cronometro.resumo(): total e tempo por etapa
+    total_ms = models.FloatField(null=True)
+    tempos = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-criado_em"]
+        indexes = [
+            models.Index(fields=["sha256"], name="upload_sha256_idx"),
+            models.Index(fields=["criado_em"], name="upload_criado_em_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.nome} ({self.sha256[:12]})"
+
+    @classmethod
+    def registrar(cls, resultado, nome, origem=ORIGEM_WEB):
+        """
+        Grava o resultado de `pipeline.processar_bytes` (upload, pessoas e
+        medições) em uma transação, com um INSERT em lote por tabela.
+        """
+        from .utils import cache_utils
+        from .utils.config import POSE_BACKEND, IDADE_BACKEND
+
+        tempos = resultado.get("tempos") or {}
+        pessoas = resultado.get("pessoas", [])
+        with transaction.atomic():
+            upload = cls.objects.create(
+                sha256=resultado.get("sha256", ""),
+                nome=nome[:255],
+                origem=origem,
+                cache=resultado.get("cache", False),
+                erro=resultado.get("erro"),
+                versao_modelos=cache_utils.versao_modelos(),
+                backend_pose=POSE_BACKEND,
+                backend_idade=IDADE_BACKEND,
+                total_ms=tempos.get("total_ms"),
+                tempos=tempos or None,
+            )
+            registros = Pessoa.objects.bulk_create([
+                Pessoa(
+                    upload=upload,
+                    indice=p["id"],
+                    faixa_etaria=p.get("faixa_etaria", ""),
+                    cor_olhos=p.get("cor_olhos", ""),
+                    cor_cabelo=p.get("cor_cabelo", ""),
+                    face_url=p.get("face_url") or "",
+                )
+                for p in pessoas
+            ])
+            # bulk_create preenche as PKs (SQLite >= 3.35 / PostgreSQL)
+            Medicao.objects.bulk_create([
+                Medicao(pessoa=registro, **p["medidas"])
+                for registro, p in zip(registros, pessoas)
+                if p.get("medidas")  # resultados antigos do cache não têm os valores numéricos
+            ])
+        return upload
+
+    def como_dict(self):
+        return {
+            "id": self.id,
+            "sha256": self.sha256,
+            "nome": self.nome,
+            "origem": self.origem,
+            "criado_em": self.criado_em.isoformat(),
+            "cache": self.cache,
+            "erro": self.erro,
+            "versao_modelos": self.versao_modelos,
+            "backend_pose": self.backend_pose,
+            "backend_idade": self.backend_idade,
+            "total_ms": self.total_ms,
+            "pessoas": [p.como_dict() for p in self.pessoas.all()],
+        }
+
+
+class Pessoa(models.Model):
+    upload = models.ForeignKey(Upload, on_delete=models.CASCADE, related_name="pessoas")
+    indice = models.PositiveIntegerField()  # "id" da pessoa no resultado (ordem do YOLO)
+    faixa_etaria = models.CharField(max_length=32, blank=True)
+    cor_olhos = models.CharField(max_length=32, blank=True)
+    cor_cabelo = models.CharField(max_length=32, blank=True)
+    face_url = models.CharField(max_length=500, blank=True)
+
+    class Meta:
+        ordering = ["indice"]
+
+    def como_dict(self):
+        medicao = getattr(self, "medicao", None)
+        return {
+            "id": self.indice,
+            "faixa_etaria": self.faixa_etaria,
+            "cor_olhos": self.cor_olhos,
+            "cor_cabelo": self.cor_cabelo,
+            "face_url": self.face_url,
+            "medidas": medicao.como_dict() if medicao else None,
+        }
+
+
+class Medicao(models.Model):
+    pessoa = models.OneToOneField(Pessoa, on_delete=models.CASCADE, related_name="medicao")
+    altura_pixels = models.FloatField(null=True)
+    iris_direita_px = models.FloatField(null=True)
+    iris_esquerda_px = models.FloatField(null=True)
+    escala_mm_px = models.FloatField(null=True)
+    diff_iris_pct = models.FloatField(null=True)
+    altura_cm = models.FloatField(null=True)
+    idade = models.PositiveSmallIntegerField(null=True)
+
+    def como_dict(self):
+        campos = ["altura_pixels", "iris_direita_px", "iris_esquerda_px", "escala_mm_px",
+                  "diff_iris_pct", "altura_cm", "idade"]
+        return {campo: getattr(self, campo) for campo in campos}
+
+
+def persistir(resultado, nome, origem=Upload.ORIGEM_WEB):
+    """
+    Grava o resultado no banco (se PERSISTIR_RESULTADOS). Uma falha no banco
+    não derruba a requisição nem o job: só é registrada no log.
+    """
+    from .utils.config import PERSISTIR_RESULTADOS
+
+    if not PERSISTIR_RESULTADOS or resultado is None or "pessoas" not in resultado:
+        return None
+    try:
+        return Upload.registrar(resultado, nome, origem)
+    except Exception as e:
+        print(f"Erro ao gravar o resultado de '{nome}' no banco: {e}")
+        return None
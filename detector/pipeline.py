@@ -0,0 +1,626 @@
+# detector/pipeline.py
+import cv2, os
+import numpy as np
+
+# Nossos utils de análise
+from .utils.geometry_utils import alturas_pixels, caixas_rosto, diametros_iris, escalas, MARGEM_ROSTO
+from .utils.color_utils import analisar_cores
+from .utils.image_utils import recortar_olho, decodificar_upload, salvar_original
+from .utils import face_utils
+from .utils.face_utils import pontos_iris_lote
+from .utils.config import (
+    IRIS_MM, CALIBRACAO_ESCALA, CALIBRACAO_PULAR_FACEMESH, POSE_MAX_LADO, DECODE_MAX_LADO, SALVAR_ORIGINAL, MEDIA_DIR,
+    SALVAR_INTERMEDIARIOS, MEMORIA_LIMITADA, MEMORIA_PREVIA_MAX_LADO, MEMORIA_MAX_ROSTOS,
+)
+from .utils.age_utils import faixa_etaria, estimar_idades, probabilidades_idade, idades_dos_vetores
+from .utils import (
+    cache_utils, artifact_utils, storage_utils, model_registry, quality_utils, calibration_utils, intermediate_utils,
+)
+from .utils.metrics_utils import Cronometro
+
+# Este módulo não depende do Django: é usado tanto pela view síncrona
+# quanto pelos processos do pool de jobs (detector/jobs.py).
+# As etapas do pipeline são métodos da classe Pipeline; cada uma é
+# cronometrada (parede, CPU, alocações) por imagem e por pessoa.
+
+# --- MODELOS ---
+# YOLO, FaceMesh e a sessão ONNX são carregados no primeiro uso pelo
+# model_registry (ou antes, via `aquecer_modelos`), nunca na importação.
+# O FaceMesh (MediaPipe) é criado por thread em utils/face_utils.py,
+# para que vários rostos possam ser processados em paralelo.
+
+# -----------------------------------------------------------
+
+
+def modelos_carregados():
+    """Garante que o YOLO (obrigatório) está disponível, carregando-o se preciso."""
+    return model_registry.obter("yolo_pose") is not None
+
+
+def aquecer_modelos():
+    """
+    Carrega os modelos do pipeline e roda cada um uma vez em uma imagem vazia,
+    para que a primeira requisição real não pague a inicialização
+    (usado pelos workers e por BIOPIXEL_PRECARREGAR).
+    Retorna {nome: segundos de carga}.
+    """
+    if not modelos_carregados():
+        return model_registry.tempos_carga()
+    dummy = np.zeros((64, 64, 3), dtype=np.uint8)
+    model_registry.obter("yolo_pose")(dummy, verbose=False)
+    estimar_idades([dummy])
+    face_utils.aquecer()
+    face_utils.pontos_iris_lote([dummy])
+    return model_registry.tempos_carga()
+
+
+def decodificar_imagem(dados):
+    """
+    Decodifica os bytes de um upload (JPEG/PNG...) para uma imagem BGR,
+    em memória e respeitando DECODE_MAX_LADO.
+    Retorna None se os bytes não forem uma imagem válida.
+    """
+    return decodificar_upload(dados, DECODE_MAX_LADO)
+
+
+class Pipeline:
+    """
+    Pipeline completo (YOLO -> rostos -> FaceMesh/idade -> altura) com etapas
+    explícitas. `executar` roda todas elas em ordem sobre uma imagem BGR.
+    A geometria (altura em pixels, caixas do rosto, íris, escala) é calculada
+    para todas as pessoas de uma vez (utils/geometry_utils.py).
+    """
+
+    def __init__(self, yolo=None, perfil=None):
+        # Sem um YOLO fixo (ex.: o rastreador do vídeo), cada chamada empresta
+        # uma instância do pool do registro: requisições simultâneas não
+        # compartilham o mesmo predictor.
+        self.yolo = yolo
+        self.fator_pose = 1.0  # redução aplicada à última imagem enviada ao YOLO
+        # Perfil de calibração da câmera (utils/calibration_utils.py), se houver
+        self.perfil = perfil
+        self.iris_mm = perfil.iris_mm if perfil else IRIS_MM
+        self.calibracao = perfil.calibracao if perfil else CALIBRACAO_ESCALA
+        # Saídas brutas da última imagem (utils/intermediate_utils.py), se SALVAR_INTERMEDIARIOS
+        self.intermediarios = None
+
+    @staticmethod
+    def reduzir_para_pose(image, max_lado=POSE_MAX_LADO):
+        """
+        Cópia reduzida (lado maior <= max_lado) para o YOLO e o fator aplicado.
+        O custo da pose fica constante mesmo para fotos de 12MP.
+        """
+        ih, iw = image.shape[:2]
+        lado = max(ih, iw)
+        if not max_lado or lado <= max_lado:
+            return image, 1.0
+        fator = max_lado / lado
+        small = cv2.resize(image, (max(1, round(iw * fator)), max(1, round(ih * fator))), interpolation=cv2.INTER_AREA)
+        return small, fator
+
+    # --- 1. ETAPA YOLO: DETECTAR TODOS OS CORPOS ---
+    def detectar_corpos(self, image):
+        """
+        O YOLO processa a imagem UMA vez e retorna TODAS as pessoas detectadas.
+        Roda na cópia reduzida; keypoints e caixas voltam em pixels da imagem original.
+        Retorna (keypoints (N,17,3), caixas (N,4)) ou None se não houver ninguém.
+        """
+        small, self.fator_pose = self.reduzir_para_pose(image)
+        if self.yolo is not None:
+            pose_results = self.yolo(small)
+        else:
+            with model_registry.emprestar("yolo_pose") as yolo:
+                pose_results = self._yolo_disponivel(yolo)(small)
+
+        # pose_results[0] contém os dados da primeira imagem (nós só enviamos uma)
+        return self.converter_pose(pose_results[0], self.fator_pose)
+
+    @staticmethod
+    def _yolo_disponivel(yolo):
+        # Falha de carga: erro claro em vez de um TypeError ao chamar None
+        if yolo is None:
+            raise RuntimeError("Modelo YOLO de pose indisponível (falha ao carregar).")
+        return yolo
+
+    def detectar_corpos_lote(self, images):
+        """
+        Pose de várias imagens com UMA chamada ao YOLO (lote real).
+        Retorna uma lista de (deteccoes, fator) na ordem de `images`, para
+        passar como `pose=` a `executar`.
+        """
+        reduzidas = [self.reduzir_para_pose(image) for image in images]
+        smalls = [small for small, _ in reduzidas]
+        if self.yolo is not None:
+            pose_results = self.yolo(smalls, verbose=False)
+        else:
+            with model_registry.emprestar("yolo_pose") as yolo:
+                pose_results = self._yolo_disponivel(yolo)(smalls, verbose=False)
+        return [(self.converter_pose(r, fator), fator) for r, (_, fator) in zip(pose_results, reduzidas)]
+
+    @staticmethod
+    def converter_pose(resultado, fator):
+        """Resultado do YOLO de uma imagem -> (keypoints, caixas) em pixels da original, ou None."""
+        if not resultado.keypoints:
+            return None
+
+        # Pega os keypoints (landmarks da pose) e caixas (bounding boxes)
+        keypoints = np.array(resultado.keypoints.cpu().numpy().data, dtype=np.float32)
+        boxes = np.array(resultado.boxes.cpu().numpy().xyxy, dtype=np.float32)
+        if fator != 1.0:
+            keypoints[..., :2] /= fator  # a confiança (coluna 2) não muda
+            boxes /= fator
+        return keypoints, boxes
+
+    # --- 2A. CALCULAR ALTURA EM PIXELS (da Pose), todas as pessoas ---
+    def medir_alturas(self, keypoints):
+        """(altura_px, y_min, y_max, valido) com shape (N,); ver geometry_utils.alturas_pixels."""
+        return alturas_pixels(keypoints)
+
+    @staticmethod
+    def previa(image):
+        """
+        Imagem onde as alturas são desenhadas e o fator aplicado às coordenadas:
+        uma cópia inteira ou, com MEMORIA_LIMITADA, uma versão reduzida para
+        MEMORIA_PREVIA_MAX_LADO (o resize já aloca só a prévia).
+        """
+        lado = max(image.shape[:2])
+        if not MEMORIA_LIMITADA or lado <= MEMORIA_PREVIA_MAX_LADO:
+            return image.copy(), 1.0
+        f = MEMORIA_PREVIA_MAX_LADO / lado
+        tamanho = (max(1, round(image.shape[1] * f)), max(1, round(image.shape[0] * f)))
+        return cv2.resize(image, tamanho, interpolation=cv2.INTER_AREA), f
+
+    def desenhar_altura(self, image_copy, person_kpts, y_min, y_max):
+        # Desenha a linha da altura na imagem de cópia
+        cx = int(person_kpts[0][0]) # Centraliza a linha no nariz da pessoa
+        cv2.line(image_copy, (cx, int(y_min)), (cx, int(y_max)), (0, 255, 255), 2)
+
+    # --- 2B. CAIXAS DO ROSTO (da Pose), todas as pessoas ---
+    def caixas_rosto(self, image, keypoints):
+        """
+        (caixas (N,4) [x1, y1, x2, y2], valido (N,)) a partir dos keypoints da cabeça.
+        As margens valem na resolução da pose e são ampliadas junto com a imagem,
+        para que o recorte (feito na imagem original) tenha o mesmo enquadramento.
+        """
+        ih, iw = image.shape[:2]
+        margem = tuple(int(round(m / self.fator_pose)) for m in MARGEM_ROSTO)
+        return caixas_rosto(keypoints, iw, ih, margem=margem)
+
+    # --- 3A. DIÂMETRO DA ÍRIS E ESCALA (mm/px), todas as pessoas com FaceMesh ---
+    def medir_iris(self, iris_d, iris_e, alturas_px):
+        """
+        iris_d / iris_e: (M, 4, 2); alturas_px: (M,).
+        Retorna (diam_d, diam_e, escala, diff, altura_cm), arrays (M,) com NaN onde não há medida.
+        """
+        diam_d = diametros_iris(iris_d)
+        diam_e = diametros_iris(iris_e)
+        escala, diff, altura_cm = escalas(diam_d, diam_e, alturas_px, self.iris_mm, self.calibracao)
+        return diam_d, diam_e, escala, diff, altura_cm
+
+    def escalas_perfil(self, candidatos, cron):
+        """
+        Medidas pelo perfil de calibração da câmera, sem FaceMesh: o diâmetro
+        da íris vem do ajuste pela posição do pé. Só para quem tem o pé dentro
+        da faixa aprendida e com o perfil confiável. Retorna {i: medida}.
+        """
+        if self.perfil is None or not CALIBRACAO_PULAR_FACEMESH or not self.perfil.confiavel:
+            return {}
+        medidas = {}
+        with cron.etapa("escala_perfil"):
+            for i, c in enumerate(candidatos):
+                d = self.perfil.diametro_iris(c["y_pe"])
+                if d is None:
+                    continue
+                d_px = c["diam_perfil"] = d * c["altura_img"]
+                escala, _, altura_cm = escalas(d_px, d_px, c["altura_pixels"], self.iris_mm, self.calibracao)
+                medidas[i] = [None, None, float(escala), None, None if np.isnan(altura_cm) else float(altura_cm)]
+        return medidas
+
+    def aprender_perfil(self, candidatos, medidas, cron):
+        """Acrescenta ao perfil as pessoas medidas pela íris (posição do pé, diâmetro médio)."""
+        if self.perfil is None:
+            return
+        amostras = [(candidatos[i]["y_pe"], (m[0] + m[1]) / 2 / candidatos[i]["altura_img"])
+                    for i, m in medidas.items() if m[0] and m[1] and m[2]]
+        with cron.etapa("calibracao"):
+            calibration_utils.registrar_amostras(self.perfil.chave, amostras)
+
+    def montar_pessoa(self, idx, diam_d, diam_e, escala, diff, altura_cm, idade_estimativa,
+                      cor_olhos, cor_cabelo, face_url, eye_right_url, eye_left_url, altura_pixels=None):
+        return {
+            "id": idx + 1,
+            "iris_direita": f"{diam_d:.2f}px" if diam_d else "Falha",
+            "iris_esquerda": f"{diam_e:.2f}px" if diam_e else "Falha",
+            "media_iris": f"{(diam_d+diam_e)/2:.2f}px" if diam_d and diam_e else "N/A",
+            "escala": f"{escala:.3f} mm/px" if escala else "N/A",
+            "diff_iris": f"{diff:.1f}%" if diff else "N/A",
+            "cor_olhos": cor_olhos,
+            "cor_cabelo": cor_cabelo,
+            "altura": f"{altura_cm:.1f} cm" if altura_cm else "N/A",
+            "idade_estimativa": f"{idade_estimativa} anos",
+            "faixa_etaria": faixa_etaria(idade_estimativa),
+            "face_url": face_url,
+            "eye_right_url": eye_right_url,
+            "eye_left_url": eye_left_url,
+            # Valores numéricos (sem formatação) para persistência e análise
+            "medidas": {
+                "altura_pixels": altura_pixels,
+                "iris_direita_px": diam_d,
+                "iris_esquerda_px": diam_e,
+                "escala_mm_px": escala,
+                "diff_iris_pct": diff,
+                "altura_cm": altura_cm,
+                "idade": idade_estimativa,
+            },
+        }
+
+    def preparar(self, image, image_name, media_dir, cron, pose=None):
+        """
+        Etapas de corpo: pose, altura em pixels, caixa do rosto, desenho das
+        alturas e filtro de qualidade. Retorna (candidatos, descartados, body_url)
+        ou None se o YOLO não encontrou ninguém.
+        `pose` = (deteccoes, fator) já calculados em lote (`detectar_corpos_lote`).
+        """
+        if pose is None:
+            with cron.etapa("pose"):
+                deteccoes = self.detectar_corpos(image)
+        else:
+            deteccoes, self.fator_pose = pose
+        if deteccoes is None:
+            return None
+        keypoints, boxes = deteccoes
+
+        # --- 2. "CORPOS PRIMEIRO" ---
+        # Altura em pixels e caixa do rosto de todas as pessoas que o YOLO
+        # encontrou, em operações de array. A análise facial (FaceMesh,
+        # idade) é feita depois, em lote.
+        with cron.etapa("altura_pixels"):
+            alturas, y_mins, y_maxs, com_altura = self.medir_alturas(keypoints)
+        with cron.etapa("recorte_rosto"):
+            caixas, com_rosto = self.caixas_rosto(image, keypoints)
+
+        with cron.etapa("desenho"):
+            image_copy, f = self.previa(image)  # Cópia (ou prévia reduzida) para desenhar
+            for idx in np.flatnonzero(com_altura):
+                self.desenhar_altura(image_copy, keypoints[idx][:, :2] * f, y_mins[idx] * f, y_maxs[idx] * f)
+
+        # Salva a imagem final com todas as linhas de altura (em segundo plano)
+        with cron.etapa("salvar"):
+            body_url = artifact_utils.gravar(image_copy, media_dir, f'body_all_{image_name}')
+
+        # Ignora quem não tem cabeça/calcanhar visível ou recorte de rosto válido
+        # e, entre os demais, quem não passa no filtro de qualidade (rosto
+        # pequeno ou borrado, keypoints pouco confiáveis, excesso de pessoas)
+        with cron.etapa("qualidade"):
+            aprovados, descartados = quality_utils.filtrar(image, keypoints, caixas, alturas,
+                                                           np.flatnonzero(com_altura & com_rosto))
+        candidatos = []
+        for idx in aprovados:
+            x1, y1, x2, y2 = caixas[idx]
+            candidatos.append({"idx": int(idx), "altura_pixels": float(alturas[idx]),
+                               "face_crop": image[y1:y2, x1:x2], "kpts": keypoints[idx], "caixa": caixas[idx],
+                               # posição do pé (normalizada) para o perfil de calibração
+                               "y_pe": float(y_maxs[idx]) / image.shape[0], "altura_img": image.shape[0]})
+        descartados = [{"id": idx + 1, "motivo": motivo} for idx, motivo in sorted(descartados.items())]
+        return candidatos, descartados, body_url
+
+    @staticmethod
+    def cores(candidatos, iris_lote, medidas, cron):
+        """
+        Cor dos olhos (só de quem tem medida da íris) e do cabelo de todos os
+        candidatos, com uma única conversão HSV (utils/color_utils.py).
+        """
+        with cron.etapa("cores"):
+            return analisar_cores([c["face_crop"] for c in candidatos],
+                                  [iris[0] if medidas.get(i) is not None else None
+                                   for i, iris in enumerate(iris_lote)],
+                                  guardar_hsv=SALVAR_INTERMEDIARIOS)
+
+    def guardar_intermediarios(self, image, candidatos, iris_lote, probs, cores, pessoas):
+        """Monta o registro das saídas brutas da imagem (gravado por quem conhece o SHA-256)."""
+        if SALVAR_INTERMEDIARIOS:
+            self.intermediarios = intermediate_utils.montar(image.shape, candidatos, iris_lote, probs, cores, pessoas,
+                                                            self.iris_mm, self.calibracao,
+                                                            self.perfil.chave if self.perfil else None)
+
+    def finalizar_pessoa(self, c, idade_estimativa, iris, medida, cores, image_name, media_dir, cron, fonte=None):
+        """
+        Recortes e o dicionário de resultado de um candidato.
+        `iris` = (iris_d_rel, iris_e_rel); `medida` = (diam_d, diam_e, escala, diff, altura_cm) ou None;
+        `cores` = item de `analisar_cores`; `fonte` = origem da escala ("iris" ou "perfil").
+        """
+        idx = c["idx"]
+        face_crop = c["face_crop"]
+        iris_d_rel, iris_e_rel = iris
+        diam_d, diam_e, escala, diff, altura_cm = medida or [None] * 5
+        cor_olhos = "N/A"
+        eye_right_url = eye_left_url = None
+        com_iris = medida is not None and iris_d_rel is not None
+
+        if com_iris:
+            cor_olhos = cores["olhos"]
+            # Recortes dos olhos
+            with cron.etapa("salvar", idx):
+                eye_right_url = recortar_olho(face_crop, iris_d_rel, f"eye_right_{idx}", media_dir, image_name)
+                eye_left_url = recortar_olho(face_crop, iris_e_rel, f"eye_left_{idx}", media_dir, image_name)
+
+        # --- 3D. SALVAR IMAGENS DE RECORTE (em segundo plano) ---
+        with cron.etapa("salvar", idx):
+            face_url = artifact_utils.gravar(face_crop, media_dir, f'face_{idx}_{image_name}')
+
+        pessoa = self.montar_pessoa(idx, diam_d, diam_e, escala, diff, altura_cm, idade_estimativa,
+                                    cor_olhos, cores["cabelo"], face_url, eye_right_url, eye_left_url,
+                                    c["altura_pixels"])
+        # Fração dos pixels que concordam com a cor escolhida (0 a 1)
+        pessoa["confianca_cor_olhos"] = round(cores["confianca_olhos"], 3) if com_iris else None
+        pessoa["confianca_cor_cabelo"] = round(cores["confianca_cabelo"], 3)
+        pessoa["escala_fonte"] = fonte if medida is not None else None
+        return pessoa
+
+    @staticmethod
+    def _medida(colunas, j):
+        # NaN -> None (o template/JSON tratam como "sem medida")
+        return [None if np.isnan(col[j]) else float(col[j]) for col in colunas]
+
+    def executar(self, image, image_name, media_dir=MEDIA_DIR, cronometro=None, pose=None):
+        """
+        Executa todas as etapas e salva os recortes em `media_dir`.
+        Retorna {"pessoas": [...], "erro": None | str, "tempos": {...}, "descartados": [...]}.
+        `pose`: detecções já calculadas (ver `preparar`).
+        """
+        cron = cronometro or Cronometro()
+        os.makedirs(media_dir, exist_ok=True)
+
+        preparado = self.preparar(image, image_name, media_dir, cron, pose)
+        if preparado is None:
+            return {"pessoas": [], "erro": "Nenhuma pessoa foi detectada na imagem pelo YOLO.", "tempos": cron.resumo()}
+        candidatos, descartados, body_url = preparado
+
+        # Perfil da câmera confiável: escala sem FaceMesh para quem está na faixa aprendida
+        pelo_perfil = self.escalas_perfil(candidatos, cron)
+
+        # Com MEMORIA_LIMITADA as etapas de rosto rodam em blocos de até
+        # MEMORIA_MAX_ROSTOS pessoas (limita o tensor da idade, o buffer HSV e
+        # as entradas do FaceMesh vivos ao mesmo tempo); senão, todas em um único lote.
+        tamanho = max(1, MEMORIA_MAX_ROSTOS if MEMORIA_LIMITADA else len(candidatos))
+        pessoas, iris_lote, probs, cores = [], [], [], []
+        for inicio in range(0, len(candidatos), tamanho):
+            bloco = candidatos[inicio:inicio + tamanho]
+            perfil_bloco = {i - inicio: m for i, m in pelo_perfil.items() if inicio <= i < inicio + tamanho}
+            partes = self.analisar_rostos(bloco, perfil_bloco, image_name, media_dir, cron)
+            for lista, parte in zip((pessoas, iris_lote, probs, cores), partes):
+                lista.extend(parte)
+        self.guardar_intermediarios(image, candidatos, iris_lote, probs, cores, pessoas)
+
+        # Adiciona a imagem com as marcações à primeira pessoa (para exibição no template)
+        if pessoas:
+            pessoas[0]['body_url'] = body_url
+
+        return {"pessoas": pessoas, "erro": None, "tempos": cron.resumo(), "descartados": descartados}
+
+    def analisar_rostos(self, candidatos, pelo_perfil, image_name, media_dir, cron):
+        """
+        Etapas de rosto de um lote de candidatos; `pelo_perfil` = {i: medida}
+        (índices do lote). Retorna (pessoas, iris_lote, probs, cores), na ordem do lote.
+        """
+        # --- 3. ANÁLISE FACIAL EM LOTE ---
+        # Idade: UMA chamada ONNX com tensor (N, 3, 224, 224)
+        # FaceMesh: distribuído entre as threads do pool (só para quem não tem escala pelo perfil)
+        face_crops = [c["face_crop"] for c in candidatos]
+        with cron.etapa("idade"):
+            probs = probabilidades_idade(face_crops)
+            idades = idades_dos_vetores(probs)
+        restantes = [i for i in range(len(candidatos)) if i not in pelo_perfil]
+        iris_lote = [(None, None)] * len(candidatos)
+        with cron.etapa("facemesh"):
+            for i, iris in zip(restantes, pontos_iris_lote([face_crops[i] for i in restantes])):
+                iris_lote[i] = iris
+
+        # Diâmetros da íris, escala e altura de todas as pessoas com FaceMesh de uma vez
+        com_iris = [i for i, (iris_d, iris_e) in enumerate(iris_lote) if iris_d is not None and iris_e is not None]
+        medidas = {}
+        if com_iris:
+            with cron.etapa("escala"):
+                colunas = self.medir_iris(
+                    np.stack([iris_lote[i][0] for i in com_iris]),
+                    np.stack([iris_lote[i][1] for i in com_iris]),
+                    np.array([candidatos[i]["altura_pixels"] for i in com_iris]),
+                )
+                for j, i in enumerate(com_iris):
+                    medidas[i] = self._medida(colunas, j)
+        self.aprender_perfil(candidatos, medidas, cron)
+        fontes = {**{i: "iris" for i in medidas}, **{i: "perfil" for i in pelo_perfil}}
+        medidas.update(pelo_perfil)
+
+        cores = self.cores(candidatos, iris_lote, medidas, cron)
+        pessoas = [self.finalizar_pessoa(c, idade, iris, medidas.get(i), cor, image_name, media_dir, cron, fontes.get(i))
+                   for i, (c, idade, iris, cor) in enumerate(zip(candidatos, idades, iris_lote, cores))]
+        return pessoas, iris_lote, probs, cores
+
+    def executar_streaming(self, image, image_name, media_dir=MEDIA_DIR, cronometro=None):
+        """
+        Mesmas etapas de `executar`, como um gerador de eventos:
+          {"evento": "deteccao", "pessoas": n, "descartados": [...], "body_url": ...}
+          {"evento": "pessoa", "pessoa": {...}}   (uma por pessoa, na ordem em que ficam prontas)
+          {"evento": "fim", "resultado": {...}}   (o mesmo dicionário de `executar`)
+        A idade continua em lote (uma chamada ONNX); o FaceMesh de cada rosto
+        roda no pool e a pessoa é finalizada assim que o dela termina.
+        """
+        cron = cronometro or Cronometro()
+        os.makedirs(media_dir, exist_ok=True)
+
+        preparado = self.preparar(image, image_name, media_dir, cron)
+        if preparado is None:
+            resultado = {"pessoas": [], "erro": "Nenhuma pessoa foi detectada na imagem pelo YOLO.", "tempos": cron.resumo()}
+            yield {"evento": "fim", "resultado": resultado}
+            return
+        candidatos, descartados, body_url = preparado
+        yield {"evento": "deteccao", "pessoas": len(candidatos), "descartados": descartados, "body_url": body_url}
+
+        face_crops = [c["face_crop"] for c in candidatos]
+        with cron.etapa("idade"):
+            probs = probabilidades_idade(face_crops)
+            idades = idades_dos_vetores(probs)
+
+        # Quem tem escala pelo perfil da câmera sai primeiro, sem FaceMesh
+        pessoas, iris_lote, cores_lote = {}, [(None, None)] * len(candidatos), [None] * len(candidatos)
+        pelo_perfil = self.escalas_perfil(candidatos, cron)
+        for i, medida in pelo_perfil.items():
+            cores = cores_lote[i] = self.cores([candidatos[i]], [(None, None)], {0: medida}, cron)[0]
+            pessoas[i] = self.finalizar_pessoa(candidatos[i], idades[i], (None, None), medida, cores,
+                                               image_name, media_dir, cron, "perfil")
+            yield {"evento": "pessoa", "pessoa": pessoas[i]}
+
+        restantes = [i for i in range(len(candidatos)) if i not in pelo_perfil]
+        prontos = face_utils.pontos_iris_conforme_prontos([face_crops[i] for i in restantes])
+        while True:
+            # Só o tempo esperando o próximo FaceMesh (os outros seguem rodando no pool)
+            with cron.etapa("facemesh"):
+                item = next(prontos, None)
+            if item is None:
+                break
+            j, (iris_d, iris_e) = item
+            i = restantes[j]
+            c = candidatos[i]
+            medida = None
+            if iris_d is not None and iris_e is not None:
+                with cron.etapa("escala", c["idx"]):
+                    medida = self._medida(self.medir_iris(iris_d[None], iris_e[None], np.array([c["altura_pixels"]])), 0)
+                self.aprender_perfil([c], {0: medida}, cron)
+            iris_lote[i] = iris_d, iris_e
+            cores = cores_lote[i] = self.cores([c], [(iris_d, iris_e)], {0: medida}, cron)[0]
+            pessoas[i] = self.finalizar_pessoa(c, idades[i], (iris_d, iris_e), medida, cores, image_name, media_dir, cron,
+                                               "iris")
+            yield {"evento": "pessoa", "pessoa": pessoas[i]}
+
+        # No resultado final as pessoas voltam para a ordem do YOLO, como em `executar`
+        pessoas = [pessoas[i] for i in sorted(pessoas)]
+        self.guardar_intermediarios(image, candidatos, iris_lote, probs, cores_lote, pessoas)
+        if pessoas:
+            pessoas[0]['body_url'] = body_url
+        yield {"evento": "fim",
+               "resultado": {"pessoas": pessoas, "erro": None, "tempos": cron.resumo(), "descartados": descartados}}
+
+
+def processar_imagem(image, image_name, media_dir=MEDIA_DIR, cronometro=None, pose=None, perfil=None):
+    """
+    Executa o pipeline completo sobre uma imagem BGR já decodificada.
+    `perfil`: perfil de calibração da câmera (calibration_utils.Perfil), opcional.
+    Retorna {"pessoas": [...], "erro": None | str, "tempos": {...}}.
+    """
+    return Pipeline(perfil=perfil).executar(image, image_name, media_dir, cronometro, pose)
+
+
+def processar_bytes(dados, image_name, media_dir=MEDIA_DIR, camera=None):
+    """
+    Variante de `processar_imagem` que recebe os bytes do upload.
+    Se o mesmo conteúdo já foi processado (cache por SHA-256), devolve o
+    resultado guardado sem rodar nenhum modelo nem regravar arquivos.
+    Caso contrário decodifica em memória e processa; o original e os
+    recortes vão para o diretório do conteúdo (media/conteudo/<sha>/) e o
+    original é gravado em segundo plano (SALVAR_ORIGINAL).
+    `camera` identifica o perfil de calibração (sem ele, usa o EXIF).
+    """
+    cron = Cronometro()
+    with cron.etapa("hash"):
+        sha256 = cache_utils.hash_conteudo(dados)
+    with cron.etapa("calibracao"):
+        chave_perfil = calibration_utils.chave_perfil(dados, camera)
+        perfil = calibration_utils.obter(chave_perfil)
+    chave = cache_utils.chave_cache(sha256, perfil)
+    with cron.etapa("cache"):
+        resultado = cache_utils.obter(chave, media_dir)
+    if resultado is not None:
+        storage_utils.tocar(storage_utils.diretorio_conteudo(sha256, media_dir))
+        return {**resultado, "sha256": sha256, "cache": True, "tempos": cron.resumo()}
+
+    image = preparar_upload(dados, sha256, image_name, media_dir, cron)
+    if image is None:
+        return {"pessoas": [], "erro": "Não foi possível decodificar a imagem enviada.",
+                "sha256": sha256, "tempos": cron.resumo()}
+    return processar_decodificada(image, sha256, image_name, media_dir, cron, perfil=perfil)
+
+
+def preparar_upload(dados, sha256, image_name, media_dir=MEDIA_DIR, cronometro=None):
+    """
+    Agenda a gravação do original no diretório do conteúdo e decodifica os
+    bytes. Retorna a imagem BGR (ou None se não for uma imagem válida).
+    """
+    cron = cronometro or Cronometro()
+    if SALVAR_ORIGINAL:
+        salvar_original(dados, storage_utils.diretorio_conteudo(sha256, media_dir),
+                        storage_utils.nome_original(image_name))
+    with cron.etapa("decodificacao"):
+        return decodificar_imagem(dados)
+
+
+def processar_decodificada(image, sha256, image_name, media_dir=MEDIA_DIR, cronometro=None, pose=None, perfil=None):
+    """
+    Segunda metade de `processar_bytes`: roda o pipeline sobre a imagem já
+    decodificada (ex.: recebida do processo web por memória compartilhada,
+    ou com a pose já calculada em lote) e guarda o resultado no cache do
+    conteúdo `sha256`. `perfil`: Perfil ou a chave dele (ex.: vinda de outro processo).
+    """
+    cron = cronometro or Cronometro()
+    if isinstance(perfil, str):
+        perfil = calibration_utils.obter(perfil)
+    # A chave do cache é a do perfil ANTES desta imagem ensinar novas amostras a ele
+    chave = cache_utils.chave_cache(sha256, perfil)
+    conteudo_dir = storage_utils.diretorio_conteudo(sha256, media_dir)
+    pipe = Pipeline(perfil=perfil)
+    resultado = pipe.executar(image, storage_utils.nome_original(image_name), conteudo_dir, cron, pose)
+    # Os tempos são da execução, não do resultado: não vão para o cache
+    cache_utils.salvar(chave, {k: v for k, v in resultado.items() if k != "tempos"})
+    salvar_intermediarios(sha256, pipe, cron)
+    resultado["tempos"] = cron.resumo()
+    return {**resultado, "sha256": sha256, "cache": False}
+
+
+def salvar_intermediarios(sha256, pipe, cron):
+    """Grava as saídas brutas da última execução de `pipe` (ver utils/intermediate_utils.py)."""
+    if pipe.intermediarios is not None:
+        with cron.etapa("intermediarios"):
+            intermediate_utils.salvar(sha256, pipe.intermediarios)
+
+
+def processar_bytes_streaming(dados, image_name, media_dir=MEDIA_DIR, camera=None):
+    """
+    Gerador de eventos equivalente a `processar_bytes` (ver
+    `Pipeline.executar_streaming`). Em um acerto de cache, todas as pessoas
+    saem de uma vez; o evento "fim" traz o mesmo resultado de `processar_bytes`.
+    """
+    cron = Cronometro()
+    with cron.etapa("hash"):
+        sha256 = cache_utils.hash_conteudo(dados)
+    with cron.etapa("calibracao"):
+        perfil = calibration_utils.obter(calibration_utils.chave_perfil(dados, camera))
+    chave = cache_utils.chave_cache(sha256, perfil)
+    with cron.etapa("cache"):
+        resultado = cache_utils.obter(chave, media_dir)
+    if resultado is not None:
+        storage_utils.tocar(storage_utils.diretorio_conteudo(sha256, media_dir))
+        pessoas = resultado["pessoas"]
+        yield {"evento": "deteccao", "pessoas": len(pessoas), "descartados": resultado.get("descartados", []),
+               "body_url": pessoas[0].get("body_url") if pessoas else None}
+        for pessoa in pessoas:
+            yield {"evento": "pessoa", "pessoa": pessoa}
+        yield {"evento": "fim", "resultado": {**resultado, "sha256": sha256, "cache": True, "tempos": cron.resumo()}}
+        return
+
+    image = preparar_upload(dados, sha256, image_name, media_dir, cron)
+    if image is None:
+        yield {"evento": "fim", "resultado": {"pessoas": [], "erro": "Não foi possível decodificar a imagem enviada.",
+                                              "sha256": sha256, "tempos": cron.resumo()}}
+        return
+
+    conteudo_dir = storage_utils.diretorio_conteudo(sha256, media_dir)
+    pipe = Pipeline(perfil=perfil)
+    for evento in pipe.executar_streaming(image, storage_utils.nome_original(image_name), conteudo_dir, cron):
+        if evento["evento"] == "fim":
+            resultado = evento["resultado"]
+            cache_utils.salvar(chave, {k: v for k, v in resultado.items() if k != "tempos"})
+            salvar_intermediarios(sha256, pipe, cron)
+            resultado["tempos"] = cron.resumo()
+            evento = {"evento": "fim", "resultado": {**resultado, "sha256": sha256, "cache": False}}
+        yield evento
+
@@ -1,3 +1,491 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from . import jobs, lote
+from .utils import calibration_utils, color_utils, geometry_utils, storage_utils
+from .utils.iris_utils import diametro_iris_4p, diametro_iris_3p
+
+# As versões vetorizadas (geometry_utils, color_utils) têm de dar o mesmo
+# resultado do código antigo, pessoa a pessoa. As referências abaixo são o
+# código de antes da vetorização, copiado sem mudanças de regra.
+
+CONF_MIN = geometry_utils.CONF_MIN_KPT
+CABECA = geometry_utils.KPTS_CABECA
+CALCANHAR = geometry_utils.KPTS_CALCANHAR
+
+
+def _altura_antiga(person_kpts):
+    head_points_y = [person_kpts[j][1] for j in CABECA if person_kpts[j][2] > CONF_MIN]
+    heel_points_y = [person_kpts[j][1] for j in CALCANHAR if person_kpts[j][2] > CONF_MIN]
+    if not head_points_y or not heel_points_y:
+        return None
+    y_min = min(head_points_y)
+    y_max = max(heel_points_y)
+    return abs(y_max - y_min), y_min, y_max
+
+
+def _caixa_rosto_antiga(image, person_kpts):
+    ih, iw = image.shape[:2]
+    face_x = [person_kpts[j][0] for j in CABECA if person_kpts[j][2] > CONF_MIN]
+    face_y = [person_kpts[j][1] for j in CABECA if person_kpts[j][2] > CONF_MIN]
+    if not face_x or not face_y:
+        return None
+    x1, x2 = max(0, int(min(face_x)) - 20), min(iw, int(max(face_x)) + 20)
+    y1, y2 = max(0, int(min(face_y)) - 20), min(ih, int(max(face_y)) + 40)
+    return (x1, y1, x2, y2) if image[y1:y2, x1:x2].size else None
+
+
+def _diametro_antigo(iris_rel):
+    d4, ok = diametro_iris_4p(iris_rel)
+    return d4 if ok else diametro_iris_3p([iris_rel[0], iris_rel[2], iris_rel[3]])
+
+
+def _escala_antiga(diam_d, diam_e, altura_pixels, iris_mm, calibracao):
+    escala = diff = altura_cm = None
+    if diam_d and diam_e:
+        d_medio = (diam_d + diam_e) / 2
+        escala = (iris_mm / d_medio) * calibracao
+        diff = abs(diam_d - diam_e) / d_medio * 100
+    if escala and altura_pixels:
+        altura_cm = altura_pixels * escala / 10.0
+    return escala, diff, altura_cm
+
+
+def _cor_olhos_antiga(face_crop, iris_points):
+    if not iris_points or len(iris_points) < 2:
+        return "Não detectado"
+    mask = np.zeros(face_crop.shape[:2], dtype=np.uint8)
+    centro = np.mean(iris_points, axis=0).astype(int)
+    raio = int(np.linalg.norm(np.array(iris_points[0]) - np.array(iris_points[1]))/2)
+    raio = int(raio * 0.6)
+    cv2.circle(mask, (int(centro[0]), int(centro[1])), raio, 255, -1)
+    if np.count_nonzero(mask) < 25:
+        return "Não detectado"
+    iris_pixels = cv2.bitwise_and(face_crop, face_crop, mask=mask)
+    hsv = cv2.cvtColor(iris_pixels, cv2.COLOR_BGR2HSV)
+    h, s, v = cv2.split(hsv)
+    vals_h = h[mask == 255]; vals_s = s[mask == 255]; vals_v = v[mask == 255]
+    valid = (vals_v > 30) & (vals_v < 230)
+    if np.count_nonzero(valid) == 0:
+        return "Não detectado"
+    h_m = float(np.median(vals_h[valid])); s_m = float(np.median(vals_s[valid]))
+    if 180 <= h_m <= 240 and s_m > 40: return "Azuis"
+    elif 60 <= h_m <= 120 and s_m > 40: return "Verdes"
+    elif 20 <= h_m <= 50 and s_m > 60: return "Mel/Âmbar"
+    else: return "Castanhos/Preto"
+
+
+def _cor_cabelo_antiga(face_crop):
+    h, w = face_crop.shape[:2]
+    hair_region = face_crop[0:int(h*0.2), :]
+    hsv = cv2.cvtColor(hair_region, cv2.COLOR_BGR2HSV)
+    h_m = np.mean(hsv[:,:,0]); s_m = np.mean(hsv[:,:,1]); v_m = np.mean(hsv[:,:,2])
+    if v_m < 60: return "Preto"
+    elif 10 <= h_m <= 30 and s_m > 90: return "Ruivo"
+    elif v_m > 180 and s_m < 80: return "Loiro"
+    else: return "Castanho"
+
+
+def _kpts_aleatorios(rng, n, largura, altura):
+    """Keypoints (n, 17, 3) float32 como os do YOLO, alguns fora da imagem e com confiança baixa."""
+    kpts = np.empty((n, 17, 3), dtype=np.float32)
+    kpts[..., 0] = rng.uniform(-30, largura + 30, (n, 17))
+    kpts[..., 1] = rng.uniform(-30, altura + 30, (n, 17))
+    kpts[..., 2] = rng.uniform(0, 0.3, (n, 17))
+    return kpts
+
+
+def _iris_aleatorias(rng, m):
+    """(m, 4, 2) int: quatro pontos em volta de um círculo, com ruído (cai nos métodos de 4 e 3 pontos)."""
+    centros = rng.uniform(20, 200, (m, 1, 2))
+    raios = rng.uniform(3, 25, (m, 1, 1))
+    angulos = np.array([0, np.pi / 2, np.pi, 3 * np.pi / 2]) + rng.normal(0, 0.2, (m, 4))
+    pontos = centros + raios * np.stack([np.cos(angulos), np.sin(angulos)], axis=2)
+    return (pontos + rng.normal(0, rng.uniform(0, 4, (m, 1, 1)), (m, 4, 2))).astype(np.int64)
+
+
+class GeometriaVetorizadaTests(SimpleTestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(11)
+
+    def test_alturas_pixels_igual_ao_calculo_por_pessoa(self):
+        kpts = _kpts_aleatorios(self.rng, 500, 640, 480)
+        altura, y_min, y_max, valido = geometry_utils.alturas_pixels(kpts)
+        for i, person_kpts in enumerate(kpts):
+            antiga = _altura_antiga(person_kpts)
+            self.assertEqual(valido[i], antiga is not None)
+            if antiga is not None:
+                self.assertEqual((altura[i], y_min[i], y_max[i]), antiga)
+        self.assertTrue(valido.any() and not valido.all())
+
+    def test_caixas_rosto_igual_ao_recorte_por_pessoa(self):
+        image = np.zeros((480, 640, 3), dtype=np.uint8)
+        kpts = _kpts_aleatorios(self.rng, 500, 640, 480)
+        caixas, valido = geometry_utils.caixas_rosto(kpts, 640, 480)
+        for i, person_kpts in enumerate(kpts):
+            antiga = _caixa_rosto_antiga(image, person_kpts)
+            self.assertEqual(valido[i], antiga is not None)
+            if antiga is not None:
+                self.assertEqual(tuple(int(v) for v in caixas[i]), antiga)
+
+    def test_diametros_iris_igual_a_iris_utils(self):
+        pontos = _iris_aleatorias(self.rng, 500)
+        diametros = geometry_utils.diametros_iris(pontos)
+        usou_4p = [diametro_iris_4p(p)[1] for p in pontos]
+        self.assertTrue(any(usou_4p) and not all(usou_4p))
+        for p, d in zip(pontos, diametros):
+            self.assertAlmostEqual(d, _diametro_antigo(p), places=9)
+
+    def test_escalas_igual_ao_calculo_por_pessoa(self):
+        diam_d = self.rng.uniform(5, 40, 300)
+        diam_e = self.rng.uniform(5, 40, 300)
+        diam_d[::7] = 0
+        alturas = self.rng.uniform(100, 900, 300)
+        alturas[::5] = 0
+        escala, diff, altura_cm = geometry_utils.escalas(diam_d, diam_e, alturas, 11.7, 1.1)
+        for i in range(300):
+            antiga = _escala_antiga(diam_d[i], diam_e[i], alturas[i], 11.7, 1.1)
+            for novo, velho in zip((escala[i], diff[i], altura_cm[i]), antiga):
+                if velho is None:
+                    self.assertTrue(np.isnan(novo))
+                else:
+                    self.assertAlmostEqual(novo, velho, places=9)
+
+
+class CoresHsvTests(SimpleTestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(20)
+
+    def _rosto(self):
+        # Cor de fundo aleatória com ruído, para que as classes variem entre os rostos
+        h, w = self.rng.integers(40, 120, 2)
+        base = self.rng.integers(0, 256, 3)
+        ruido = self.rng.integers(-40, 41, (h, w, 3))
+        return np.clip(base + ruido, 0, 255).astype(np.uint8)
+
+    def test_analisar_cores_igual_ao_codigo_antigo(self):
+        rostos, iris = [], []
+        for _ in range(200):
+            rosto = self._rosto()
+            h, w = rosto.shape[:2]
+            # Centros perto da borda também (o disco da íris sai do recorte)
+            pontos = [(int(x), int(y)) for x, y in zip(self.rng.integers(-5, w + 5, 4), self.rng.integers(-5, h + 5, 4))]
+            rostos.append(rosto)
+            iris.append(pontos if self.rng.random() > 0.1 else None)
+
+        resultados = color_utils.analisar_cores(rostos, iris)
+        for rosto, pontos, r in zip(rostos, iris, resultados):
+            self.assertEqual(r["olhos"], _cor_olhos_antiga(rosto, pontos))
+            self.assertEqual(r["cabelo"], _cor_cabelo_antiga(rosto))
+        self.assertGreater(len({r["olhos"] for r in resultados}), 2)
+        self.assertGreater(len({r["cabelo"] for r in resultados}), 2)
+
+    def test_cabelo_de_rosto_grande_igual_ao_codigo_antigo(self):
+        # Faixa do cabelo bem maior que a dos rostos acima (400x400 -> 80x400 pixels)
+        rostos = []
+        for _ in range(40):
+            base = self.rng.integers(0, 256, 3)
+            # Gradiente + ruído: a média depende de todos os pixels, não só de uma grade
+            gradiente = np.linspace(-60, 60, 400)[None, :, None] * self.rng.uniform(-1, 1, 3)
+            ruido = self.rng.integers(-50, 51, (400, 400, 3))
+            rostos.append(np.clip(base + gradiente + ruido, 0, 255).astype(np.uint8))
+        # Textura periódica (ex.: fios de cabelo): uma grade regular de pixels escuros
+        # sobre fundo claro; uma amostragem com passo fixo veria só a grade
+        for passo in (2, 3, 4):
+            textura = np.full((400, 400, 3), 200, np.uint8)
+            textura[::passo, ::passo] = 0
+            rostos.append(textura)
+        for rosto, r in zip(rostos, color_utils.analisar_cores(rostos, [None] * len(rostos))):
+            self.assertEqual(r["cabelo"], _cor_cabelo_antiga(rosto))
+            hsv = cv2.cvtColor(rosto[:80], cv2.COLOR_BGR2HSV).reshape(-1, 3).astype(np.float32)
+            self.assertEqual(r["cabelo"], str(color_utils._classe_cabelo(*hsv.mean(axis=0))))
+
+    def test_classificar_cores_igual_a_analisar_cores(self):
+        rostos = [self._rosto() for _ in range(50)]
+        iris = [[(30, 20), (40, 20), (35, 25), (35, 15)] for _ in rostos]
+        for r in color_utils.analisar_cores(rostos, iris, guardar_hsv=True):
+            classificado = color_utils.classificar_cores(r["hsv_olhos"], r["hsv_cabelo"])
+            self.assertEqual({k: r[k] for k in classificado}, classificado)
+
+
+class _PoolQuebrado:
+    """Executor cujo worker morreu: submit() levanta BrokenProcessPool, como o ProcessPoolExecutor."""
+
+    def __init__(self):
+        self.desligado = False
+
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("worker morreu")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.desligado = True
+
+
+def _job_de_video(dados, image_name):
+    # Resultado com "tracks": não passa pela gravação no banco
+    return {"tracks": [], "tempos": None}
+
+
+class PoolQuebradoTests(SimpleTestCase):
+    def setUp(self):
+        self.quebrado = _PoolQuebrado()
+        self.novos = []
+        executor_antes = jobs._executor
+        jobs._executor = self.quebrado
+        self.addCleanup(setattr, jobs, "_executor", executor_antes)
+
+    def _novo_pool(self, fabrica):
+        def novo_pool():
+            executor = fabrica()
+            self.novos.append(executor)
+            return executor
+        return mock.patch.object(jobs, "novo_pool", novo_pool)
+
+    def test_submeter_recria_o_pool_quebrado(self):
+        with self._novo_pool(lambda: ThreadPoolExecutor(1)):
+            job_id = jobs.submeter(b"dados", "video.mp4", funcao=_job_de_video)
+        # Espera o job e o callback que finaliza o status
+        self.novos[0].shutdown(wait=True)
+        self.assertTrue(self.quebrado.desligado)
+        self.assertIs(jobs._executor, self.novos[0])
+        self.assertEqual(jobs.consultar(job_id)["status"], jobs.CONCLUIDO)
+
+    def test_segundo_pool_quebrado_vira_pool_indisponivel_e_libera_a_vaga(self):
+        vagas = jobs._vagas._value
+        with self._novo_pool(_PoolQuebrado), self.assertRaises(jobs.PoolIndisponivel):
+            jobs.submeter(b"dados", "video.mp4", funcao=_job_de_video)
+        self.assertEqual(jobs._vagas._value, vagas)
+        self.assertEqual(len(self.novos), 1)
+        self.assertFalse(any(job["imagem"] == "video.mp4" and job["status"] == jobs.PENDENTE
+                             for job in jobs._jobs.values()))
+
+    def test_view_responde_503_com_o_pool_indisponivel(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        frame = SimpleUploadedFile("f.jpg", b"jpeg", content_type="image/jpeg")
+        with self._novo_pool(_PoolQuebrado):
+            resposta = self.client.post("/api/videos/", {"frames": [frame]})
+        self.assertEqual(resposta.status_code, 503)
+        self.assertIn("erro", resposta.json())
+
+
+class ColetaDeLixoTests(SimpleTestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.agora = time.time()
+
+    def _arquivo(self, relativo, tamanho=100, dias=0):
+        path = os.path.join(self.media, relativo)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * tamanho)
+        mtime = self.agora - dias * 86400
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def _conteudo(self, sha, dias):
+        diretorio = storage_utils.diretorio_conteudo(sha, self.media)
+        self._arquivo(os.path.join(diretorio, "original.jpg"), dias=dias)
+        os.utime(diretorio, (self.agora - dias * 86400,) * 2)
+        return diretorio
+
+    def test_legado_nao_remove_as_fotos_de_referencia(self):
+        referencias = [self._arquivo(nome, dias=400) for nome in ("pessoa.jpg", "grupo_01.png", "original.jpg")]
+        derivados = [self._arquivo(nome, dias=400) for nome in ("face_0_pessoa.jpg", "body_all_pessoa.jpg",
+                                                                "eye_left_0_pessoa.jpg", "marcada_pessoa.jpg")]
+        # Cota zero: mesmo a remoção por cota só pode escolher arquivos derivados
+        stats = storage_utils.coletar_lixo(self.media, max_bytes=0, incluir_legado=True)
+        self.assertTrue(all(os.path.exists(p) for p in referencias))
+        self.assertFalse(any(os.path.exists(p) for p in derivados))
+        self.assertEqual(stats["removidos"], len(derivados))
+
+    def test_sem_legado_a_raiz_fica_intacta(self):
+        path = self._arquivo("face_0_pessoa.jpg", dias=400)
+        storage_utils.coletar_lixo(self.media, max_bytes=0)
+        self.assertTrue(os.path.exists(path))
+
+    def test_ttl_por_tipo_dentro_do_conteudo(self):
+        diretorio = storage_utils.diretorio_conteudo("ab" * 32, self.media)
+        original = self._arquivo(os.path.join(diretorio, "original.jpg"), dias=10)
+        face = self._arquivo(os.path.join(diretorio, "face_0_original.jpg"), dias=10)
+        with mock.patch.dict(storage_utils.MEDIA_TTL_DIAS, {"original": 30, "face": 7}):
+            storage_utils.coletar_lixo(self.media, max_bytes=None)
+        self.assertTrue(os.path.exists(original))
+        self.assertFalse(os.path.exists(face))
+
+    def test_cota_remove_primeiro_o_conteudo_menos_usado(self):
+        antigo = self._conteudo("aa" * 32, dias=3)
+        medio = self._conteudo("bb" * 32, dias=2)
+        recente = self._conteudo("cc" * 32, dias=1)
+        stats = storage_utils.coletar_lixo(self.media, max_bytes=250)
+        self.assertFalse(os.path.exists(antigo))
+        self.assertTrue(os.path.exists(medio) and os.path.exists(recente))
+        self.assertEqual(stats["bytes_total"], 200)
+
+    def test_dry_run_nao_remove_nada(self):
+        path = self._arquivo("face_0_pessoa.jpg", dias=400)
+        stats = storage_utils.coletar_lixo(self.media, max_bytes=0, incluir_legado=True, dry_run=True)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(stats["removidos"], 1)
+
+
+class _PipelineFalso:
+    """Pose em lote que falha quando o lote contém a imagem marcada como ruim."""
+
+    def detectar_corpos_lote(self, images):
+        if any(image[0] == 255 for image in images):
+            raise RuntimeError("pose falhou")
+        return [("pose", 1.0)] * len(images)
+
+
+def _decodificar_falso(dados, sha256, nome, media_dir, cron):
+    return np.frombuffer(dados[:1], dtype=np.uint8).copy()
+
+
+def _processar_falso(image, sha256, nome, media_dir, cron, pose, perfil):
+    return {"pessoas": [{"id": 1}], "erro": None, "sha256": sha256}
+
+
+class LoteTests(SimpleTestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(lote.pipeline, "Pipeline", _PipelineFalso),
+            mock.patch.object(lote.pipeline, "preparar_upload", _decodificar_falso),
+            mock.patch.object(lote.pipeline, "processar_decodificada", _processar_falso),
+            mock.patch.object(lote.cache_utils, "obter", lambda chave, media_dir=None: None),
+            mock.patch.object(lote.calibration_utils, "chave_perfil", lambda dados, camera=None: None),
+            # Uma imagem por lote de YOLO: a falha fica restrita a um lote conhecido
+            mock.patch.object(lote, "LOTE_YOLO", 1),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_falha_na_pose_afeta_so_o_lote_dela(self):
+        itens = [("a.jpg", b"\x01a"), ("ruim.jpg", b"\xffb"), ("c.jpg", b"\x02c")]
+        relatorio = lote.processar_lote(iter(itens))
+        resultados = {i["nome"]: i["resultado"] for i in relatorio["itens"]}
+        self.assertEqual(list(resultados), ["a.jpg", "ruim.jpg", "c.jpg"])
+        self.assertEqual(resultados["ruim.jpg"]["erro"], "pose falhou")
+        self.assertIsNone(resultados["a.jpg"]["erro"])
+        self.assertIsNone(resultados["c.jpg"]["erro"])
+        self.assertIsNone(relatorio["erro"])
+
+    def test_entrada_grande_do_zip_nao_e_lida(self):
+        buffer = tempfile.SpooledTemporaryFile()
+        with zipfile.ZipFile(buffer, "w") as z:
+            z.writestr("fotos/a.jpg", b"\x01" * 10)
+            z.writestr("fotos/grande.jpg", b"\x01" * 1000)
+            z.writestr("leia-me.txt", b"texto")
+        buffer.seek(0)
+        lidos = []
+        ler = zipfile.ZipFile.read
+
+        def ler_registrando(z, nome, *args):
+            lidos.append(getattr(nome, "filename", nome))
+            return ler(z, nome, *args)
+
+        with mock.patch.object(zipfile.ZipFile, "read", ler_registrando):
+            itens = list(lote.itens_zip(buffer, max_bytes=100))
+        self.assertEqual(itens, [("a.jpg", b"\x01" * 10), ("grande.jpg", None)])
+        self.assertEqual(lidos, ["fotos/a.jpg"])
+
+    def test_entrada_grande_vira_erro_e_o_lote_continua(self):
+        relatorio = lote.processar_lote(iter([("grande.jpg", None), ("a.jpg", b"\x01a")]))
+        grande, a = (i["resultado"] for i in relatorio["itens"])
+        self.assertIn("Arquivo maior", grande["erro"])
+        self.assertIsNone(a["erro"])
+
+    def test_limite_de_imagens_trunca_o_lote(self):
+        relatorio = lote.processar_lote(iter([(f"{k}.jpg", b"\x01") for k in range(5)]), max_imagens=3)
+        self.assertEqual(len(relatorio["itens"]), 3)
+        self.assertTrue(relatorio["truncado"])
+
+    def test_falha_do_consumidor_libera_a_thread_produtora(self):
+        def pipeline_quebrado():
+            raise RuntimeError("sem modelos")
+        infinitos = ((f"{k}.jpg", b"\x01") for k in iter(int, 1))
+        with mock.patch.object(lote.pipeline, "Pipeline", pipeline_quebrado):
+            relatorio = lote.processar_lote(infinitos)
+        self.assertEqual(relatorio["erro"], "sem modelos")
+        produtoras = lambda: [t for t in threading.enumerate() if t.name == "lote-decodificacao"]  # noqa: E731
+        limite = time.time() + 5
+        while produtoras() and time.time() < limite:
+            time.sleep(0.05)
+        self.assertEqual(produtoras(), [])
+
+
+class PerfilCalibracaoTests(SimpleTestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(22)
+
+    def _amostras(self, n, a=0.02, b=0.01, ruido=0.0, y=None):
+        y = self.rng.uniform(0.5, 0.9, n) if y is None else np.full(n, y)
+        d = a + b * y
+        return np.column_stack([y, d * (1 + self.rng.normal(0, ruido, n))])
+
+    def test_ajuste_linear_confiavel(self):
+        perfil = calibration_utils.Perfil("camera", amostras=self._amostras(200, ruido=0.01))
+        self.assertTrue(perfil.confiavel)
+        self.assertAlmostEqual(perfil.coef[0], 0.02, places=3)
+        self.assertAlmostEqual(perfil.coef[1], 0.01, places=3)
+        self.assertAlmostEqual(perfil.diametro_iris(0.7), 0.027, places=3)
+        # Fora da faixa observada (com a margem), não há previsão
+        self.assertIsNone(perfil.diametro_iris(0.2))
+
+    def test_poucas_amostras_nao_e_confiavel(self):
+        n = calibration_utils.CALIBRACAO_MIN_AMOSTRAS - 1
+        perfil = calibration_utils.Perfil("camera", amostras=self._amostras(n))
+        self.assertIsNotNone(perfil.coef)
+        self.assertFalse(perfil.confiavel)
+        self.assertIsNone(perfil.diametro_iris(0.7))
+
+    def test_uma_amostra_nao_ajusta(self):
+        perfil = calibration_utils.Perfil("camera", amostras=self._amostras(1))
+        self.assertEqual(perfil.n, 1)
+        self.assertIsNone(perfil.coef)
+        self.assertFalse(perfil.confiavel)
+
+    def test_todos_no_mesmo_ponto_usa_a_media(self):
+        # Sem variação em y a inclinação não é confiável: só a média dos diâmetros
+        perfil = calibration_utils.Perfil("camera", amostras=self._amostras(100, y=0.8, ruido=0.01))
+        self.assertEqual(perfil.coef[1], 0.0)
+        self.assertAlmostEqual(perfil.coef[0], 0.028, places=3)
+
+    def test_ajuste_com_diametro_negativo_e_descartado(self):
+        # Reta que cruza o zero dentro da faixa: o ajuste é recusado
+        y = np.linspace(0.1, 0.9, 100)
+        perfil = calibration_utils.Perfil("camera", amostras=np.column_stack([y, 0.5 - y]))
+        self.assertIsNone(perfil.coef)
+        self.assertFalse(perfil.confiavel)
+
+    def test_erro_alto_nao_e_confiavel(self):
+        perfil = calibration_utils.Perfil("camera", amostras=self._amostras(200, ruido=0.3))
+        self.assertGreater(perfil.erro_rel, calibration_utils.CALIBRACAO_ERRO_MAX)
+        self.assertFalse(perfil.confiavel)
+
+    def test_assinatura_muda_com_o_ajuste(self):
+        aprendendo = calibration_utils.Perfil("camera", amostras=self._amostras(5))
+        vazio = calibration_utils.Perfil("camera")
+        confiavel = calibration_utils.Perfil("camera", amostras=self._amostras(200, ruido=0.01))
+        self.assertEqual(aprendendo.assinatura(), vazio.assinatura())
+        self.assertNotEqual(confiavel.assinatura(), vazio.assinatura())
+
+    def test_linhas_truncadas_sao_ignoradas(self):
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio)
+        path = os.path.join(diretorio, "amostras.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("0.5,0.01\n0.6,abc\n0.7\n0.80.9,0.02\nnan,0.1\n0.6,0.02\n0.9,0.0")
+        np.testing.assert_array_equal(calibration_utils._ler_amostras(path), [[0.5, 0.01], [0.6, 0.02]])
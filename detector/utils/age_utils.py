@@ -1,19 +1,11 @@
 # detector/utils/age_utils.py
 
-import os
 import cv2
 import numpy as np
-import onnxruntime as ort
 
-# Resolve caminho absoluto para o diretório raiz do projeto (onde está manage.py)
-# __file__ -> detector/utils/age_utils.py
-# BASE_DIR -> bio-pixel-ia/
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-MODEL_PATH = os.path.join(BASE_DIR, "models", "age_googlenet.onnx")
+from . import model_registry
 
-# Inicializa a sessão ONNX uma única vez
-# Se precisar rodar em GPU com onnxruntime-gpu, ajuste providers.
-_session = ort.InferenceSession(MODEL_PATH, providers=["CPUExecutionProvider"])
+# A sessão ONNX é criada no primeiro uso e emprestada do pool do model_registry
 
 # Buckets de idade do modelo age_googlenet.onnx
 AGE_BUCKETS = ["(0-2)", "(4-6)", "(8-12)", "(15-20)", "(25-32)", "(38-43)", "(48-53)", "(60-100)"]
@@ -31,15 +23,78 @@ AGE_BUCKET_MEAN = {
 }
 
 
-def _preprocess_face(face_bgr: np.ndarray) -> np.ndarray:
+def _preprocess_face(face_bgr: np.ndarray, out: np.ndarray = None) -> np.ndarray:
     """
     Converte BGR -> RGB, redimensiona para 224x224 e normaliza para o modelo ONNX.
     Retorna tensor com shape (1, 3, 224, 224), float32, normalizado em [0,1].
+    Se `out` (3, 224, 224) for passado, escreve nele (sem alocar o tensor).
     """
     img = cv2.resize(face_bgr, (224, 224), interpolation=cv2.INTER_LINEAR)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB).astype(np.float32)
-    blob = img.transpose(2, 0, 1)[None, ...] / 255.0  # (1, 3, 224, 224)
-    return blob
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    if out is None:
+        out = np.empty((3, 224, 224), dtype=np.float32)
+    np.multiply(img.transpose(2, 0, 1), np.float32(1.0 / 255.0), out=out, casting="unsafe")
+    return out[None, ...]
+
+
+def _idade_do_vetor(probs: np.ndarray) -> int:
+    """
+    Converte o vetor de 8 classes do modelo na idade média do bucket predito.
+    """
+    idx = int(np.argmax(probs))
+    faixa = AGE_BUCKETS[idx]
+    idade = AGE_BUCKET_MEAN.get(faixa, 30)
+
+    # Proteções simples contra outliers
+    return int(max(0, min(100, idade)))
+
+
+def probabilidades_idade(face_crops: list) -> np.ndarray:
+    """
+    Saída do modelo (N, 8) para vários rostos (BGR) com UMA chamada ao ONNX.
+    Monta um tensor (N, 3, 224, 224) com todos os recortes válidos, escrito
+    direto no buffer pré-alocado da sessão; se o modelo tiver batch fixo
+    em 1, cai para uma chamada por rosto.
+    Linhas de recortes inválidos (ou de uma falha na inferência) ficam com NaN.
+    """
+    probs = np.full((len(face_crops), len(AGE_BUCKETS)), np.nan, dtype=np.float32)
+    validos = [i for i, f in enumerate(face_crops) if f is not None and f.size > 0]
+    if not validos:
+        return probs
+
+    try:
+        with model_registry.emprestar("idade") as session:
+            if session is None:
+                return probs
+
+            if session.aceita_lote:
+                batch = session.buffer(len(validos))  # (N, 3, 224, 224)
+                for j, i in enumerate(validos):
+                    _preprocess_face(face_crops[i], out=batch[j])
+                probs[validos] = session.run(batch)
+            else:
+                buf = session.buffer(1)
+                for i in validos:
+                    _preprocess_face(face_crops[i], out=buf[0])
+                    probs[i] = session.run(buf)[0]
+    except Exception as e:
+        # Em caso de erro na inferência, mantém o valor conservador
+        print(f"Erro na estimativa de idade em lote: {e}")
+
+    return probs
+
+
+def idades_dos_vetores(probs: np.ndarray) -> list:
+    """Idade de cada linha de `probabilidades_idade` (12, conservador, onde não há vetor)."""
+    return [12 if np.isnan(p).any() else _idade_do_vetor(p) for p in probs]
+
+
+def estimar_idades(face_crops: list) -> list:
+    """
+    Estima a idade de vários rostos (BGR) com UMA chamada ao ONNX.
+    Retorna uma lista de inteiros na mesma ordem de `face_crops`.
+    """
+    return idades_dos_vetores(probabilidades_idade(face_crops))
 
 
 def estimar_idade(face_crop: np.ndarray) -> int:
@@ -47,26 +102,7 @@ def estimar_idade(face_crop: np.ndarray) -> int:
     Estima idade aproximada a partir de um recorte de rosto (BGR).
     Retorna um inteiro (idade média do bucket predito).
     """
-    try:
-        # Valida entrada
-        if face_crop is None or face_crop.size == 0:
-            return 12  # fallback
-
-        blob = _preprocess_face(face_crop)
-        inputs = {_session.get_inputs()[0].name: blob}
-        outputs = _session.run(None, inputs)
-        probs = outputs[0][0]  # vetor de 8 classes
-
-        idx = int(np.argmax(probs))
-        faixa = AGE_BUCKETS[idx]
-        idade = AGE_BUCKET_MEAN.get(faixa, 30)
-
-        # Proteções simples contra outliers
-        idade = int(max(0, min(100, idade)))
-        return idade
-    except Exception:
-        # Em caso de erro na inferência, devolve um valor conservador
-        return 12
+    return estimar_idades([face_crop])[0]
 
 
 def faixa_etaria(idade_estimativa: int) -> str:
@@ -0,0 +1,102 @@
+# detector/utils/artifact_utils.py
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import cv2
+
+from .config import ARTEFATOS_WORKERS, ARTEFATOS_FORMATO, ARTEFATOS_QUALIDADE, ARTEFATOS_MAX_PENDENTES, MEDIA_DIR
+
+# Os recortes e a imagem anotada são codificados (JPEG/WebP) e gravados em um
+# pool de threads, fora do caminho da requisição. A URL é devolvida na hora;
+# quem precisar do arquivo antes da gravação terminar usa `aguardar`.
+# A fila é limitada (ARTEFATOS_MAX_PENDENTES): cheia, a gravação acontece na
+# thread de quem chamou, o que segura o ritmo de quem produz mais rápido que o
+# disco. Recortes são copiados, para não manter a imagem inteira na memória.
+
+_executor = ThreadPoolExecutor(max_workers=ARTEFATOS_WORKERS, thread_name_prefix="artefatos")
+_lock = threading.Lock()
+_pendentes = {}  # caminho relativo ao MEDIA_DIR -> {Future, ...} (gravações em andamento desse caminho)
+_vagas = threading.BoundedSemaphore(max(1, ARTEFATOS_MAX_PENDENTES))
+
+
+def _params(ext):
+    if ext in ('.jpg', '.jpeg'):
+        return [cv2.IMWRITE_JPEG_QUALITY, ARTEFATOS_QUALIDADE]
+    if ext == '.webp':
+        return [cv2.IMWRITE_WEBP_QUALITY, ARTEFATOS_QUALIDADE]
+    return []
+
+
+def nome_artefato(nome):
+    """Aplica ARTEFATOS_FORMATO à extensão do nome (ou mantém a original)."""
+    if not ARTEFATOS_FORMATO:
+        return nome
+    return f"{os.path.splitext(nome)[0]}.{ARTEFATOS_FORMATO}"
+
+
+def url_media(path):
+    """URL pública (/media/...) de um arquivo dentro de MEDIA_DIR."""
+    rel = os.path.relpath(os.path.abspath(path), MEDIA_DIR)
+    return '/media/' + rel.replace(os.sep, '/')
+
+
+def _gravar(imagem, path, vaga=False):
+    try:
+        if not cv2.imwrite(path, imagem, _params(os.path.splitext(path)[1].lower())):
+            print(f"Erro ao gravar artefato {path}")
+    except Exception as e:
+        print(f"Erro ao gravar artefato {path}: {e}")
+    finally:
+        if vaga:
+            _vagas.release()
+
+
+def _concluido(nome, future):
+    # Só remove a própria gravação: outra do mesmo caminho pode ainda estar em andamento
+    with _lock:
+        futures = _pendentes.get(nome)
+        if futures is not None:
+            futures.discard(future)
+            if not futures:
+                del _pendentes[nome]
+
+
+def gravar(imagem, media_dir, nome):
+    """
+    Agenda a gravação de `imagem` em `media_dir` e retorna a URL (/media/...).
+    A imagem não deve ser modificada depois de enviada.
+    """
+    path = os.path.join(media_dir, nome_artefato(nome))
+    url = url_media(path)
+    chave = url[len('/media/'):]
+    os.makedirs(media_dir, exist_ok=True)
+    if not _vagas.acquire(blocking=False):
+        _gravar(imagem, path)
+        return url
+    if imagem.base is not None:
+        # Recorte (view): a cópia libera a imagem original
+        imagem = imagem.copy()
+    with _lock:
+        future = _executor.submit(_gravar, imagem, path, True)
+        _pendentes.setdefault(chave, set()).add(future)
+    future.add_done_callback(functools.partial(_concluido, chave))
+    return url
+
+
+def pendente(nome):
+    """`nome` é o caminho relativo ao MEDIA_DIR (o que vem depois de /media/ na URL)."""
+    with _lock:
+        return nome in _pendentes
+
+
+def aguardar(nome=None, timeout=None):
+    """Espera a gravação de um artefato (ou de todos, se `nome` for None)."""
+    with _lock:
+        if nome is None:
+            futures = [f for fs in _pendentes.values() for f in fs]
+        else:
+            futures = list(_pendentes.get(nome, ()))
+    if futures:
+        wait(futures, timeout=timeout)
@@ -0,0 +1,157 @@
+# detector/utils/cache_utils.py
+import functools
+import hashlib
+import json
+import os
+import threading
+
+from . import artifact_utils, config, model_registry
+from .config import CACHE_DIR, CACHE_MAX_ENTRADAS, CACHE_MAX_BYTES, MEDIA_DIR
+
+# Cache em disco dos resultados do pipeline.
+# Chave = SHA-256 dos bytes enviados + versão (config + hash dos arquivos de modelo).
+# Cada entrada é um JSON com a lista de pessoas (incluindo as URLs dos recortes).
+# A ordem de uso (LRU) é o mtime do arquivo, atualizado a cada acerto.
+
+_lock = threading.Lock()
+
+# Parâmetros de config.py que mudam o resultado (quem é analisado, medidas,
+# rótulos, URLs dos recortes). Todos entram na versão da chave: ao criar um
+# parâmetro desse tipo, acrescente-o aqui.
+PARAMETROS_RESULTADO = (
+    "IRIS_MM", "CALIBRACAO_ESCALA",
+    "CALIBRACAO_MARGEM_Y", "CALIBRACAO_PULAR_FACEMESH",
+    "QUALIDADE_CONF_KPT_MIN", "QUALIDADE_ROSTO_MIN_LADO", "QUALIDADE_NITIDEZ_MIN",
+    "QUALIDADE_NITIDEZ_LADO", "QUALIDADE_MAX_PESSOAS",
+    "ARTEFATOS_FORMATO",
+    "POSE_MAX_LADO", "FACEMESH_MAX_LADO",
+    "DECODE_MAX_LADO",
+    "MEMORIA_LIMITADA", "MEMORIA_PREVIA_MAX_LADO",
+)
+
+
+def hash_conteudo(chunks):
+    """SHA-256 (hex) de um bytes ou de um iterável de chunks (ex.: UploadedFile.chunks())."""
+    h = hashlib.sha256()
+    if isinstance(chunks, (bytes, bytearray, memoryview)):
+        chunks = [chunks]
+    for chunk in chunks:
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def _hash_arquivo(path):
+    if not os.path.exists(path):
+        return "ausente"
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=1)
+def versao_modelos():
+    """
+    Identifica a combinação de modelos e parâmetros que gerou um resultado.
+    Qualquer mudança em PARAMETROS_RESULTADO, no backend ou nos arquivos de
+    modelo ativos invalida as entradas antigas (a chave muda).
+    """
+    partes = [f"{nome}={getattr(config, nome)!r}" for nome in PARAMETROS_RESULTADO] + [
+        f"yolo={_hash_arquivo(model_registry.arquivo_pose())}",
+        f"idade={_hash_arquivo(model_registry.arquivo_idade())}",
+    ]
+    return hashlib.sha256("|".join(partes).encode()).hexdigest()[:16]
+
+
+def chave_cache(sha256, perfil=None):
+    """Chave do resultado; com perfil de calibração, inclui o estado dele (calibration_utils)."""
+    if perfil is None:
+        return f"{sha256}-{versao_modelos()}"
+    return f"{sha256}-{versao_modelos()}-{perfil.assinatura()}"
+
+
+def _caminho(chave):
+    return os.path.join(CACHE_DIR, f"{chave}.json")
+
+
+def _arquivos_existem(resultado, media_dir):
+    for pessoa in resultado.get("pessoas", []):
+        for campo, url in pessoa.items():
+            if campo.endswith("_url") and url and url.startswith("/media/"):
+                nome = url[len("/media/"):]
+                if not artifact_utils.pendente(nome) and not os.path.exists(os.path.join(media_dir, nome)):
+                    return False
+    return True
+
+
+def obter(chave, media_dir=MEDIA_DIR):
+    """
+    Retorna o resultado em cache para a chave, ou None.
+    Entradas cujos recortes já não existem em `media_dir` são descartadas.
+    """
+    path = _caminho(chave)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            resultado = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not _arquivos_existem(resultado, media_dir):
+        remover(chave)
+        return None
+
+    try:
+        os.utime(path)  # marca como usado recentemente (LRU)
+    except OSError:
+        pass
+    return resultado
+
+
+def salvar(chave, resultado):
+    """Grava o resultado (escrita atômica) e aplica os limites do cache."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _caminho(chave)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Erro ao gravar cache {chave}: {e}")
+        return
+    _evict()
+
+
+def remover(chave):
+    try:
+        os.remove(_caminho(chave))
+    except OSError:
+        pass
+
+
+def _evict():
+    """Remove as entradas menos usadas até respeitar CACHE_MAX_ENTRADAS e CACHE_MAX_BYTES."""
+    with _lock:
+        try:
+            nomes = [n for n in os.listdir(CACHE_DIR) if n.endswith(".json")]
+        except OSError:
+            return
+
+        entradas = []
+        for nome in nomes:
+            try:
+                st = os.stat(os.path.join(CACHE_DIR, nome))
+            except OSError:
+                continue
+            entradas.append((st.st_mtime, st.st_size, nome))
+
+        entradas.sort()  # mais antigas primeiro
+        total = sum(e[1] for e in entradas)
+        while entradas and (len(entradas) > CACHE_MAX_ENTRADAS or total > CACHE_MAX_BYTES):
+            _, tamanho, nome = entradas.pop(0)
+            try:
+                os.remove(os.path.join(CACHE_DIR, nome))
+            except OSError:
+                pass
+            total -= tamanho
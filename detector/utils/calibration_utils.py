@@ -0,0 +1,243 @@
+# detector/utils/calibration_utils.py
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from .config import (
+    IRIS_MM, CALIBRACAO_ESCALA, CALIBRACAO_DIR, CALIBRACAO_MIN_AMOSTRAS, CALIBRACAO_MAX_AMOSTRAS,
+    CALIBRACAO_ERRO_MAX, CALIBRACAO_MARGEM_Y,
+)
+
+# Perfis de calibração por câmera, em CALIBRACAO_DIR/<chave>/:
+#   perfil.json   -> ajustes manuais (iris_mm, calibracao)
+#   amostras.csv  -> uma linha "y_pe,diametro" por pessoa medida pela íris,
+#                    as duas normalizadas pela altura da imagem
+# O arquivo de amostras só recebe appends (uma única escrita O_APPEND por
+# chamada, segura entre os processos de jobs); o ajuste é refeito quando ele
+# muda. Linhas truncadas (escrita interrompida) são ignoradas na leitura.
+#
+# Com a câmera fixa e o chão plano, o tamanho da íris em pixels cresce de
+# forma linear com a posição vertical do pé (quanto mais baixo na imagem,
+# mais perto da câmera): diametro = a + b * y_pe.
+
+_lock = threading.Lock()
+_cache = {}  # chave -> (assinatura dos arquivos, Perfil)
+
+
+class Perfil:
+    def __init__(self, chave, iris_mm=IRIS_MM, calibracao=CALIBRACAO_ESCALA, amostras=None):
+        self.chave = chave
+        self.iris_mm = iris_mm
+        self.calibracao = calibracao
+        self.n = 0
+        self.coef = None        # (a, b)
+        self.erro_rel = None
+        self.faixa_y = None     # (min, max) de y_pe observado
+        if amostras is not None and len(amostras):
+            self._ajustar(amostras)
+
+    def _ajustar(self, amostras):
+        y, d = amostras[:, 0], amostras[:, 1]
+        self.n = len(amostras)
+        self.faixa_y = (float(y.min()), float(y.max()))
+        if self.n < 2:
+            return
+        # Todos no mesmo ponto: sem inclinação confiável, só a média
+        b, a = np.polyfit(y, d, 1) if y.std() > 0.01 else (0.0, float(d.mean()))
+        previsto = a + b * y
+        if np.any(previsto <= 0):
+            return
+        self.coef = (float(a), float(b))
+        self.erro_rel = float(np.sqrt(np.mean(((previsto - d) / d) ** 2)))
+
+    @property
+    def confiavel(self):
+        return (self.coef is not None and self.n >= CALIBRACAO_MIN_AMOSTRAS
+                and self.erro_rel <= CALIBRACAO_ERRO_MAX)
+
+    def diametro_iris(self, y_pe):
+        """
+        Diâmetro médio da íris previsto (normalizado pela altura da imagem)
+        para quem tem o pé em `y_pe`, ou None fora da faixa observada/sem ajuste.
+        """
+        if not self.confiavel:
+            return None
+        y_min, y_max = self.faixa_y
+        if not (y_min - CALIBRACAO_MARGEM_Y <= y_pe <= y_max + CALIBRACAO_MARGEM_Y):
+            return None
+        a, b = self.coef
+        d = a + b * y_pe
+        return d if d > 0 else None
+
+    def assinatura(self):
+        """Parte da chave do cache: muda quando muda o que o perfil altera no resultado."""
+        partes = [self.chave, self.iris_mm, self.calibracao]
+        if self.confiavel:
+            partes += [round(c, 5) for c in self.coef] + [self.faixa_y]
+        return hashlib.sha256(repr(partes).encode()).hexdigest()[:12]
+
+    def como_dict(self):
+        return {
+            "chave": self.chave,
+            "iris_mm": self.iris_mm,
+            "calibracao": self.calibracao,
+            "amostras": self.n,
+            "coeficientes": self.coef,
+            "erro_relativo": self.erro_rel,
+            "faixa_y": self.faixa_y,
+            "confiavel": self.confiavel,
+        }
+
+
+def _nome_seguro(chave):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", chave).strip("._")[:80] or "camera"
+
+
+def _diretorio(chave):
+    return os.path.join(CALIBRACAO_DIR, _nome_seguro(chave))
+
+
+def _camera_exif(dados):
+    """'Fabricante Modelo Série' do EXIF, ou None."""
+    try:
+        from PIL import Image
+        exif = Image.open(io.BytesIO(dados)).getexif()
+        serie = exif.get_ifd(0x8769).get(0xA431)  # BodySerialNumber, no IFD Exif
+        partes = [exif.get(0x010F), exif.get(0x0110), serie]  # Make, Model
+    except Exception as e:
+        print(f"Erro ao ler o EXIF: {e}")
+        return None
+    partes = [str(p).strip("\x00 ") for p in partes if p]
+    return " ".join(partes) or None
+
+
+def chave_perfil(dados, camera=None):
+    """Chave do perfil: o identificador da câmera informado ou, sem ele, o EXIF."""
+    if camera:
+        return f"camera-{camera}"
+    exif = _camera_exif(dados)
+    return f"exif-{exif}" if exif else None
+
+
+def _amostra(linha):
+    """(y, d) de uma linha "y,d\n", ou None se ela estiver truncada ou inválida."""
+    if not linha.endswith("\n"):
+        return None
+    partes = linha.split(",")
+    if len(partes) != 2:
+        return None
+    try:
+        y, d = float(partes[0]), float(partes[1])
+    except ValueError:
+        return None
+    return (y, d) if np.isfinite(y) and np.isfinite(d) else None
+
+
+def _ler_amostras(path):
+    if not os.path.exists(path):
+        return np.empty((0, 2))
+    with open(path, encoding="utf-8", errors="replace") as f:
+        linhas = f.readlines()
+    if len(linhas) > 2 * CALIBRACAO_MAX_AMOSTRAS:
+        # Compacta: mantém só as recentes (appends concorrentes durante a troca podem se perder)
+        linhas = [linha for linha in linhas if _amostra(linha) is not None][-CALIBRACAO_MAX_AMOSTRAS:]
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(linhas)
+        os.replace(tmp, path)
+    amostras = [a for a in map(_amostra, linhas) if a is not None]
+    return np.array(amostras[-CALIBRACAO_MAX_AMOSTRAS:], dtype=np.float64).reshape(-1, 2)
+
+
+def _assinatura_arquivos(diretorio):
+    estado = []
+    for nome in ("perfil.json", "amostras.csv"):
+        try:
+            st = os.stat(os.path.join(diretorio, nome))
+            estado.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            estado.append(None)
+    return tuple(estado)
+
+
+def obter(chave):
+    """Perfil da chave (um perfil vazio, com os valores globais, se ainda não existe), ou None sem chave."""
+    if not chave:
+        return None
+    diretorio = _diretorio(chave)
+    assinatura = _assinatura_arquivos(diretorio)
+    with _lock:
+        guardado = _cache.get(chave)
+    if guardado is not None and guardado[0] == assinatura:
+        return guardado[1]
+
+    ajustes = {}
+    if assinatura[0] is not None:
+        with open(os.path.join(diretorio, "perfil.json"), encoding="utf-8") as f:
+            ajustes = json.load(f)
+    perfil = Perfil(chave, ajustes.get("iris_mm", IRIS_MM), ajustes.get("calibracao", CALIBRACAO_ESCALA),
+                    _ler_amostras(os.path.join(diretorio, "amostras.csv")))
+    with _lock:
+        _cache[chave] = (_assinatura_arquivos(diretorio), perfil)
+    return perfil
+
+
+def registrar_amostras(chave, amostras):
+    """Acrescenta (y_pe, diametro) normalizados ao perfil `chave`."""
+    if not chave or not amostras:
+        return
+    diretorio = _diretorio(chave)
+    if not os.path.exists(os.path.join(diretorio, "perfil.json")):
+        configurar(chave)  # guarda a chave original (o nome do diretório é sanitizado)
+    # Uma única chamada write() com O_APPEND: as linhas de outros processos não se intercalam
+    dados = "".join(f"{y:.6f},{d:.6f}\n" for y, d in amostras).encode("utf-8")
+    fd = os.open(os.path.join(diretorio, "amostras.csv"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, dados)
+    finally:
+        os.close(fd)
+
+
+def configurar(chave, **ajustes):
+    """Grava ajustes manuais do perfil (iris_mm, calibracao); None remove o ajuste."""
+    diretorio = _diretorio(chave)
+    os.makedirs(diretorio, exist_ok=True)
+    path = os.path.join(diretorio, "perfil.json")
+    atuais = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            atuais = json.load(f)
+    atuais.update(ajustes)
+    atuais = {k: v for k, v in atuais.items() if v is not None}
+    atuais["chave"] = chave
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(atuais, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def reiniciar(chave):
+    """Descarta as amostras aprendidas (ex.: a câmera mudou de posição)."""
+    path = os.path.join(_diretorio(chave), "amostras.csv")
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def listar():
+    """Chaves dos perfis existentes."""
+    if not os.path.isdir(CALIBRACAO_DIR):
+        return []
+    chaves = []
+    for nome in sorted(os.listdir(CALIBRACAO_DIR)):
+        path = os.path.join(CALIBRACAO_DIR, nome, "perfil.json")
+        chave = nome
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                chave = json.load(f).get("chave", nome)
+        chaves.append(chave)
+    return chaves
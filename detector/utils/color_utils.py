@@ -1,35 +1,151 @@
+import threading
+
 import cv2
 import numpy as np
 
-def detectar_cor_olhos(face_crop, iris_points):
-    if not iris_points or len(iris_points) < 2:
-        return "Não detectado"
-    mask = np.zeros(face_crop.shape[:2], dtype=np.uint8)
+# Cor dos olhos e do cabelo de todas as pessoas de uma imagem.
+# Só os pixels que interessam são convertidos para HSV: o disco da íris
+# (recortado do quadrado em volta dele, sem máscara do rosto inteiro) e a
+# faixa superior do rosto (cabelo, inteira, sem amostragem: a média tem de ser
+# a mesma do código antigo). Os pixels de todas as pessoas são copiados para
+# um buffer reutilizado por thread e convertidos com UMA chamada ao cvtColor;
+# depois cada pessoa é classificada sobre a sua fatia.
+# As regras de classificação são as mesmas de antes (limiares iguais).
+
+NAO_DETECTADO = "Não detectado"
+MIN_PIXELS_IRIS = 25
+FAIXA_CABELO = 0.2          # 20% superiores do recorte do rosto
+
+_local = threading.local()
+
+
+def _buffers(n):
+    """Buffers (n, 1, 3) uint8 (BGR e HSV) desta thread; só realocam quando precisam crescer."""
+    bufs = getattr(_local, "bufs", None)
+    if bufs is None or bufs[0].shape[0] < n:
+        capacidade = max(n, 1 << 14)
+        bufs = _local.bufs = (np.empty((capacidade, 1, 3), np.uint8), np.empty((capacidade, 1, 3), np.uint8))
+    return bufs[0][:n], bufs[1][:n]
+
+
+def _pixels_iris(face_crop, iris_points):
+    """Pixels BGR (K, 3) do disco central da íris (60% do raio), ou None."""
+    if face_crop is None or iris_points is None or len(iris_points) < 2:
+        return None
     centro = np.mean(iris_points, axis=0).astype(int)
     raio = int(np.linalg.norm(np.array(iris_points[0]) - np.array(iris_points[1]))/2)
     raio = int(raio * 0.6)
-    cv2.circle(mask, tuple(centro), raio, 255, -1)
-    if np.count_nonzero(mask) < 25:
-        return "Não detectado"
-    iris_pixels = cv2.bitwise_and(face_crop, face_crop, mask=mask)
-    hsv = cv2.cvtColor(iris_pixels, cv2.COLOR_BGR2HSV)
-    h, s, v = cv2.split(hsv)
-    vals_h = h[mask == 255]; vals_s = s[mask == 255]; vals_v = v[mask == 255]
-    valid = (vals_v > 30) & (vals_v < 230)
+    h, w = face_crop.shape[:2]
+    x0, y0 = max(centro[0] - raio, 0), max(centro[1] - raio, 0)
+    x1, y1 = min(centro[0] + raio + 1, w), min(centro[1] + raio + 1, h)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    # Máscara só do quadrado em volta do disco
+    mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+    cv2.circle(mask, (int(centro[0] - x0), int(centro[1] - y0)), raio, 255, -1)
+    if np.count_nonzero(mask) < MIN_PIXELS_IRIS:
+        return None
+    return face_crop[y0:y1, x0:x1][mask == 255]
+
+
+def _pixels_cabelo(face_crop):
+    """Pixels BGR (K, 3) da faixa do cabelo."""
+    h = face_crop.shape[0]
+    return face_crop[0:int(h * FAIXA_CABELO), :].reshape(-1, 3)
+
+
+def _classe_olhos(h, s):
+    # Aceita escalares (mediana) ou arrays (cada pixel, para a confiança)
+    return np.select(
+        [(180 <= h) & (h <= 240) & (s > 40), (60 <= h) & (h <= 120) & (s > 40), (20 <= h) & (h <= 50) & (s > 60)],
+        ["Azuis", "Verdes", "Mel/Âmbar"], "Castanhos/Preto")
+
+
+def _classe_cabelo(h, s, v):
+    return np.select(
+        [v < 60, (10 <= h) & (h <= 30) & (s > 90), (v > 180) & (s < 80)],
+        ["Preto", "Ruivo", "Loiro"], "Castanho")
+
+
+def _olhos(hsv):
+    h, s, v = hsv[:, 0], hsv[:, 1], hsv[:, 2]
+    valid = (v > 30) & (v < 230)
     if np.count_nonzero(valid) == 0:
-        return "Não detectado"
-    h_m = float(np.median(vals_h[valid])); s_m = float(np.median(vals_s[valid]))
-    if 180 <= h_m <= 240 and s_m > 40: return "Azuis"
-    elif 60 <= h_m <= 120 and s_m > 40: return "Verdes"
-    elif 20 <= h_m <= 50 and s_m > 60: return "Mel/Âmbar"
-    else: return "Castanhos/Preto"
+        return NAO_DETECTADO, 0.0
+    h, s = h[valid], s[valid]
+    cor = str(_classe_olhos(float(np.median(h)), float(np.median(s))))
+    # Confiança: fração dos pixels válidos que, sozinhos, teriam a mesma cor
+    return cor, float(np.mean(_classe_olhos(h, s) == cor))
+
+
+def _cabelo(hsv):
+    if hsv.size == 0:
+        return "Castanho", 0.0
+    h_m, s_m, v_m = hsv.mean(axis=0)
+    cor = str(_classe_cabelo(h_m, s_m, v_m))
+    return cor, float(np.mean(_classe_cabelo(hsv[:, 0], hsv[:, 1], hsv[:, 2]) == cor))
+
+
+def analisar_cores(face_crops, iris_pontos, guardar_hsv=False):
+    """
+    Cor dos olhos e do cabelo de várias pessoas de uma vez.
+    `iris_pontos[i]`: pontos da íris direita (4, 2) do rosto i, ou None.
+    Retorna, na mesma ordem, dicts {"olhos", "confianca_olhos", "cabelo", "confianca_cabelo"}
+    (confianças entre 0 e 1: fração dos pixels que concordam com a cor escolhida).
+    Com `guardar_hsv`, cada dict também traz "hsv_olhos" (ou None) e "hsv_cabelo":
+    cópias (K, 3) uint8 dos pixels classificados (ver `classificar_cores`).
+    """
+    blocos = []  # (pessoa, "olhos" | "cabelo", pixels BGR)
+    for i, (face_crop, iris) in enumerate(zip(face_crops, iris_pontos)):
+        olho = _pixels_iris(face_crop, iris)
+        if olho is not None:
+            blocos.append((i, "olhos", olho))
+        blocos.append((i, "cabelo", _pixels_cabelo(face_crop)))
+
+    # Uma conversão BGR -> HSV para os pixels de todas as pessoas
+    total = sum(len(p) for _, _, p in blocos)
+    bgr, hsv = _buffers(total)
+    inicio = 0
+    for _, _, pixels in blocos:
+        bgr[inicio:inicio + len(pixels), 0] = pixels
+        inicio += len(pixels)
+    if total:
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV, dst=hsv)
+    hsv = hsv.reshape(-1, 3)
+
+    resultados = [{"olhos": NAO_DETECTADO, "confianca_olhos": 0.0} for _ in face_crops]
+    if guardar_hsv:
+        for r in resultados:
+            r["hsv_olhos"] = None
+    inicio = 0
+    for i, tipo, pixels in blocos:
+        fatia = hsv[inicio:inicio + len(pixels)]
+        inicio += len(pixels)
+        if tipo == "olhos":
+            resultados[i]["olhos"], resultados[i]["confianca_olhos"] = _olhos(fatia)
+        else:
+            resultados[i]["cabelo"], resultados[i]["confianca_cabelo"] = _cabelo(fatia.astype(np.float32))
+        if guardar_hsv:
+            # O buffer é reutilizado pela thread: a fatia precisa ser copiada
+            resultados[i][f"hsv_{tipo}"] = fatia.copy()
+    return resultados
+
+
+def classificar_cores(hsv_olhos, hsv_cabelo):
+    """
+    Classifica pixels HSV já extraídos (os guardados por `analisar_cores`),
+    sem os recortes: mesmo resultado de `analisar_cores` com as regras atuais.
+    """
+    olhos, conf_olhos = (NAO_DETECTADO, 0.0) if hsv_olhos is None else _olhos(hsv_olhos)
+    cabelo, conf_cabelo = _cabelo(np.asarray(hsv_cabelo, dtype=np.float32))
+    return {"olhos": olhos, "confianca_olhos": conf_olhos, "cabelo": cabelo, "confianca_cabelo": conf_cabelo}
+
+
+def detectar_cor_olhos(face_crop, iris_points):
+    if iris_points is None or len(iris_points) < 2:
+        return NAO_DETECTADO
+    return analisar_cores([face_crop], [iris_points])[0]["olhos"]
+
 
 def detectar_cor_cabelo(face_crop):
-    h, w = face_crop.shape[:2]
-    hair_region = face_crop[0:int(h*0.2), :]
-    hsv = cv2.cvtColor(hair_region, cv2.COLOR_BGR2HSV)
-    h_m = np.mean(hsv[:,:,0]); s_m = np.mean(hsv[:,:,1]); v_m = np.mean(hsv[:,:,2])
-    if v_m < 60: return "Preto"
-    elif 10 <= h_m <= 30 and s_m > 90: return "Ruivo"
-    elif v_m > 180 and s_m < 80: return "Loiro"
-    else: return "Castanho"
+    return analisar_cores([face_crop], [None])[0]["cabelo"]
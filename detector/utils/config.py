@@ -1,6 +1,194 @@
+import os
+
+# Resolve caminho absoluto para o diretório raiz do projeto (onde está manage.py)
+# __file__ -> detector/utils/config.py
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Arquivos dos modelos
+YOLO_POSE_MODEL = 'yolov8n-pose.pt'  # baixado automaticamente pelo ultralytics na primeira vez
+AGE_MODEL_PATH = os.path.join(BASE_DIR, "models", "age_googlenet.onnx")
+
+# Variantes geradas por `manage.py otimizar_modelos`
+YOLO_POSE_ONNX = os.path.join(BASE_DIR, "models", "yolov8n-pose.onnx")
+AGE_MODEL_OTIMIZADO_PATH = os.path.join(BASE_DIR, "models", "age_googlenet.opt.onnx")
+AGE_MODEL_INT8_PATH = os.path.join(BASE_DIR, "models", "age_googlenet.int8.onnx")
+
+# Backend de inferência (escolhido por deploy, via variável de ambiente)
+# Pose: "pytorch" (yolov8n-pose.pt) ou "onnx" (YOLO_POSE_ONNX, via onnxruntime)
+POSE_BACKEND = os.environ.get("BIOPIXEL_POSE_BACKEND", "pytorch")
+# Idade: "float" (original), "otimizado" (grafo otimizado) ou "int8" (quantizado)
+IDADE_BACKEND = os.environ.get("BIOPIXEL_IDADE_BACKEND", "float")
+# Threads do onnxruntime por sessão (0 = padrão do onnxruntime, todos os núcleos).
+# Com vários workers de jobs por máquina, use ~ núcleos / JOBS_WORKERS.
+ONNX_INTRA_OP_THREADS = int(os.environ.get("BIOPIXEL_ONNX_INTRA_OP", "0"))
+ONNX_INTER_OP_THREADS = int(os.environ.get("BIOPIXEL_ONNX_INTER_OP", "0"))
+# Tamanho inicial do buffer de entrada pré-alocado (cresce se chegar um lote maior)
+ONNX_LOTE_INICIAL = 8
+
+# Diretório servido em /media/ (mesmo que settings.MEDIA_ROOT)
+MEDIA_DIR = os.path.join(BASE_DIR, "media")
+
 # Valor médio da íris em milímetros
 IRIS_MM = 12.0  
 
 # Fator de calibração (1.0 = sem ajuste)
 # Exemplo: se está dando 20 cm a menos, pode aumentar para ~1.05 ou 1.1
 CALIBRACAO_ESCALA = 1.12
+
+# Perfis de calibração por câmera (câmeras fixas)
+# Chave: campo "camera" da requisição ou, sem ele, fabricante/modelo/série do EXIF.
+# Cada perfil pode sobrescrever IRIS_MM / CALIBRACAO_ESCALA e aprende, a partir
+# das medidas pela íris, o tamanho da íris em pixels em função da posição do pé
+# na imagem (plano do chão). Com o ajuste confiável, a escala de quem está
+# dentro da faixa observada vem do perfil e o FaceMesh não roda.
+CALIBRACAO_DIR = os.path.join(BASE_DIR, "calibracao")
+CALIBRACAO_MIN_AMOSTRAS = 30      # medidas pela íris antes de confiar no ajuste
+CALIBRACAO_MAX_AMOSTRAS = 1000    # só as mais recentes entram no ajuste
+CALIBRACAO_ERRO_MAX = 0.05        # erro relativo (RMS) máximo do ajuste
+CALIBRACAO_MARGEM_Y = 0.05        # extrapolação aceita além da faixa de pés observada (fração da altura)
+CALIBRACAO_PULAR_FACEMESH = True
+
+# Número de threads usadas para rodar o FaceMesh em paralelo (uma instância por thread)
+FACEMESH_WORKERS = min(4, os.cpu_count() or 1)
+
+# Pool de instâncias por modelo no processo web (servidor com várias threads).
+# O YOLO guarda estado no predictor e não pode rodar em duas threads ao mesmo
+# tempo: cada requisição empresta uma instância do pool e devolve ao final;
+# as instâncias extras só são criadas quando há requisições simultâneas.
+# A sessão ONNX já é segura entre threads; mais de uma instância só compensa
+# com ONNX_INTRA_OP_THREADS baixo. O FaceMesh é sempre uma instância por thread.
+MODELOS_POOL = {
+    "yolo_pose": int(os.environ.get("BIOPIXEL_POOL_YOLO", min(4, max(1, (os.cpu_count() or 1) // 2)))),
+    "idade": int(os.environ.get("BIOPIXEL_POOL_IDADE", "1")),
+}
+# Espera máxima (s) por uma instância livre antes de desistir (None = sem limite)
+MODELOS_POOL_TIMEOUT = 60
+
+# Fila de jobs assíncronos (API JSON)
+# Processos do pool: cada um carrega os seus próprios modelos (YOLO, FaceMesh, ONNX)
+JOBS_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+# Máximo de jobs aguardando/executando; acima disso a API responde 429
+JOBS_MAX_PENDENTES = JOBS_WORKERS * 4
+# Tempo (s) que um job finalizado fica disponível para consulta
+JOBS_TTL_SEGUNDOS = 15 * 60
+
+# Cache de resultados por conteúdo (SHA-256 do upload + versão de modelos/config)
+CACHE_DIR = os.path.join(BASE_DIR, "cache", "resultados")
+CACHE_MAX_ENTRADAS = 5000
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+# Saídas brutas dos modelos por conteúdo (keypoints, íris, vetores de idade,
+# pixels HSV das cores), para recalcular alturas e rótulos com
+# `manage.py recalcular` sem rodar YOLO, FaceMesh nem ONNX de novo
+SALVAR_INTERMEDIARIOS = os.environ.get("BIOPIXEL_INTERMEDIARIOS", "1") == "1"
+INTERMEDIARIOS_DIR = os.path.join(BASE_DIR, "cache", "intermediarios")
+
+# Decodificação do upload
+# Se > 0, JPEGs cujo lado maior passe deste valor são decodificados já reduzidos
+# (1/2, 1/4 ou 1/8 via libjpeg), sem alocar a imagem em resolução cheia.
+# 0 = sempre decodificar em resolução original.
+DECODE_MAX_LADO = 0
+# Grava o arquivo original em media/ (em segundo plano, fora do caminho da requisição)
+SALVAR_ORIGINAL = True
+
+# Gravação dos artefatos (body_all_*, face_*, eye_*) em segundo plano
+ARTEFATOS_WORKERS = 2
+# None = mantém a extensão do arquivo enviado; ou "jpg", "webp", "png"
+ARTEFATOS_FORMATO = None
+# Qualidade (0-100) para JPEG/WebP
+ARTEFATOS_QUALIDADE = 90
+# Máximo de gravações na fila; acima disso a gravação é feita na própria thread
+ARTEFATOS_MAX_PENDENTES = 64
+
+# Armazenamento em media/conteudo/<sha[:2]>/<sha256>/ (um diretório por conteúdo enviado)
+# Tempo de vida (dias) de cada tipo de arquivo; None = não expira por idade
+MEDIA_TTL_DIAS = {
+    "original": 30,
+    "body": 7,
+    "face": 7,
+    "eye": 7,
+}
+# Cota total do media/; acima dela `manage.py limpar_media` remove os conteúdos menos usados
+MEDIA_MAX_BYTES = 1024 * 1024 * 1024
+
+# Métricas por etapa do pipeline
+# Mede também as alocações (tracemalloc) de cada etapa; tem custo, deixe desligado em produção
+METRICAS_ALOCACOES = False
+# Limites (segundos) dos buckets do histograma exportado em /metrics
+METRICAS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Pico de memória (RSS do processo, amostrado a cada METRICAS_MEMORIA_INTERVALO s)
+# durante cada requisição, em "tempos" -> "memoria". Com várias requisições
+# simultâneas no mesmo processo o pico é compartilhado; nos workers de jobs
+# (uma imagem por processo) é o da própria imagem. A thread de amostragem tem
+# custo em toda requisição: ligue só para investigar (BIOPIXEL_METRICAS_MEMORIA=1).
+METRICAS_MEMORIA = os.environ.get("BIOPIXEL_METRICAS_MEMORIA") == "1"
+METRICAS_MEMORIA_INTERVALO = 0.05
+
+# Carregamento dos modelos
+# Por padrão cada modelo é carregado só no primeiro uso (manage.py, migrations e
+# testes não pagam esse custo). Com BIOPIXEL_PRECARREGAR=1 o processo web carrega
+# e aquece os modelos na inicialização (os workers de jobs sempre aquecem).
+MODELOS_PRECARREGAR = os.environ.get("BIOPIXEL_PRECARREGAR") == "1"
+
+# Modo vídeo / sequência de frames (rastreamento de pessoas entre frames)
+VIDEO_TRACKER = "bytetrack.yaml"  # rastreador do ultralytics
+VIDEO_PASSO_FRAMES = 1            # processa 1 a cada N frames
+VIDEO_MAX_FRAMES = 300            # limite de frames analisados por vídeo
+# Uma track é "estável" com pelo menos VIDEO_MIN_AMOSTRAS escalas medidas e
+# coeficiente de variação <= VIDEO_CV_ESTAVEL; a partir daí FaceMesh e idade
+# deixam de rodar para ela e os próximos frames só medem a altura em pixels.
+VIDEO_MIN_AMOSTRAS = 5
+VIDEO_CV_ESTAVEL = 0.05
+
+# Multi-resolução
+# O YOLO recebe uma cópia reduzida (lado maior <= POSE_MAX_LADO) e os keypoints
+# voltam para a escala original; os rostos são recortados da imagem original.
+# 0 = YOLO na resolução original.
+POSE_MAX_LADO = 1280
+# O recorte do rosto é reduzido para este lado maior antes do FaceMesh (a rede
+# trabalha em 192x192); os landmarks são convertidos para pixels do recorte
+# ORIGINAL, então a precisão da íris (que define a escala) é preservada.
+# 0 = sem redução.
+FACEMESH_MAX_LADO = 384
+
+# Histórico no banco (detector.models): uploads, pessoas e medições
+PERSISTIR_RESULTADOS = os.environ.get("BIOPIXEL_PERSISTIR", "1") == "1"
+# Paginação de GET /api/medicoes/
+MEDICOES_POR_PAGINA = 50
+MEDICOES_MAX_POR_PAGINA = 500
+
+# Filtro de qualidade (antes de FaceMesh, idade, cores e gravação dos recortes)
+# Pessoas reprovadas não passam pelas etapas caras e aparecem em "descartados"
+# com o motivo. 0 desativa cada critério.
+QUALIDADE_CONF_KPT_MIN = 0.25     # confiança do pior extremo (cabeça ou calcanhar) usado na altura
+QUALIDADE_ROSTO_MIN_LADO = 40     # px: abaixo disso o FaceMesh não encontra a íris
+QUALIDADE_NITIDEZ_MIN = 10.0      # variância do Laplaciano do rosto (em QUALIDADE_NITIDEZ_LADO px)
+QUALIDADE_NITIDEZ_LADO = 128
+QUALIDADE_MAX_PESSOAS = 12        # fotos de multidão: só as N maiores (mais próximas) são analisadas
+
+# Jobs de imagem: o processo web decodifica o upload e entrega a imagem BGR ao
+# worker por memória compartilhada (só o nome do bloco atravessa o processo).
+# Cada job pendente ocupa largura x altura x 3 bytes até terminar (limitado por
+# JOBS_MAX_PENDENTES). False = envia os bytes do upload e o worker decodifica.
+JOBS_MEMORIA_COMPARTILHADA = True
+
+# Upload em lote (POST /api/lote/: vários arquivos ou um .zip)
+# Uma thread decodifica (fila de até LOTE_FILA imagens), o YOLO roda em lotes
+# de até LOTE_YOLO imagens e as etapas de rosto da imagem k rodam em
+# LOTE_ROSTO_WORKERS threads enquanto o YOLO processa as seguintes.
+LOTE_YOLO = 8
+LOTE_FILA = 16
+LOTE_ROSTO_WORKERS = 2
+LOTE_MAX_IMAGENS = 200
+# Tamanho máximo (descompactado) de cada imagem de um .zip; entradas maiores viram erro sem serem lidas
+LOTE_MAX_BYTES_ARQUIVO = 50 * 1024 * 1024
+
+# Modo de memória limitada (fotos de 12MP+ e de multidões; mais workers por máquina)
+# - a imagem anotada (body_all) é desenhada sobre uma prévia com lado maior
+#   MEMORIA_PREVIA_MAX_LADO, em vez de uma cópia da imagem inteira;
+# - as etapas de rosto (idade, FaceMesh, cores, recortes) rodam em blocos de
+#   até MEMORIA_MAX_ROSTOS pessoas, o que limita o tensor da idade, o buffer
+#   HSV e as entradas do FaceMesh vivos ao mesmo tempo. (Os recortes de rosto
+#   são views da imagem decodificada, que fica viva até o fim de qualquer forma.)
+MEMORIA_LIMITADA = os.environ.get("BIOPIXEL_MEMORIA_LIMITADA") == "1"
+MEMORIA_PREVIA_MAX_LADO = 1600
+MEMORIA_MAX_ROSTOS = 4
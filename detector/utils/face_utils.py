@@ -0,0 +1,97 @@
+# detector/utils/face_utils.py
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from . import model_registry
+from .geometry_utils import landmarks_para_pixels
+from .config import FACEMESH_WORKERS, FACEMESH_MAX_LADO
+
+# Índices dos landmarks da íris no FaceMesh (refine_landmarks=True)
+IRIS_DIREITA = [474, 475, 476, 477]
+IRIS_ESQUERDA = [469, 470, 471, 472]
+
+# O FaceMesh não é seguro para uso concorrente: cada thread do pool
+# cria (uma única vez, no primeiro uso) a sua própria instância. Ele só
+# roda nessas threads (mesmo com um único rosto), para que as threads das
+# requisições não criem cada uma o seu FaceMesh.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FACEMESH_WORKERS, thread_name_prefix="facemesh")
+        return _executor
+
+
+def pontos_iris(face_crop):
+    """
+    Roda o FaceMesh em um recorte de rosto (BGR) e retorna os pontos da íris
+    direita e esquerda relativos ao recorte (arrays (4, 2) int), ou
+    (None, None) se não houver rosto.
+    """
+    if face_crop is None or face_crop.size == 0:
+        return None, None
+
+    fm = model_registry.obter("face_mesh")
+    if fm is None:
+        return None, None
+
+    crop_h, crop_w = face_crop.shape[:2]
+    entrada = face_crop
+    lado = max(crop_h, crop_w)
+    if FACEMESH_MAX_LADO and lado > FACEMESH_MAX_LADO:
+        # Landmarks são normalizados (0-1): reduzir a entrada não muda a conversão abaixo
+        f = FACEMESH_MAX_LADO / lado
+        entrada = cv2.resize(face_crop, (max(1, round(crop_w * f)), max(1, round(crop_h * f))), interpolation=cv2.INTER_AREA)
+
+    face_rgb = cv2.cvtColor(entrada, cv2.COLOR_BGR2RGB)
+    fr = fm.process(face_rgb)
+    if not fr.multi_face_landmarks:
+        return None, None
+
+    lm_face = fr.multi_face_landmarks[0].landmark
+    # As 8 coordenadas normalizadas de uma vez -> pixels relativos ao recorte, (2, 4, 2) int
+    norm = np.array([(lm_face[i].x, lm_face[i].y) for i in IRIS_DIREITA + IRIS_ESQUERDA], dtype=np.float64)
+    iris = landmarks_para_pixels(norm, crop_w, crop_h).reshape(2, 4, 2)
+    return iris[0], iris[1]
+
+
+def aquecer():
+    """Cria o FaceMesh em cada thread do pool."""
+    executor = _get_executor()
+    barreira = threading.Barrier(FACEMESH_WORKERS)
+
+    def _aquecer_thread():
+        # A barreira garante que cada tarefa rode em uma thread diferente
+        try:
+            barreira.wait(timeout=60)
+        except threading.BrokenBarrierError:
+            pass
+        return model_registry.obter("face_mesh") is not None
+
+    return all(executor.map(lambda _: _aquecer_thread(), range(FACEMESH_WORKERS)))
+
+
+def pontos_iris_lote(face_crops):
+    """
+    Distribui o FaceMesh de vários rostos entre as threads do pool.
+    Retorna uma lista de (iris_d_rel, iris_e_rel) na mesma ordem dos recortes.
+    """
+    return list(_get_executor().map(pontos_iris, face_crops))
+
+
+def pontos_iris_conforme_prontos(face_crops):
+    """
+    Como `pontos_iris_lote`, mas gera (índice, (iris_d_rel, iris_e_rel)) na
+    ordem em que cada FaceMesh termina (usado no modo streaming).
+    """
+    futuros = {_get_executor().submit(pontos_iris, f): i for i, f in enumerate(face_crops)}
+    for futuro in as_completed(futuros):
+        yield futuros[futuro], futuro.result()
+
@@ -0,0 +1,120 @@
+# detector/utils/geometry_utils.py
+import numpy as np
+
+# Geometria do pipeline vetorizada: cada função recebe os dados de TODAS as
+# pessoas empilhados e calcula o resultado com operações de array, sem loop
+# Python por pessoa. Os resultados batem com iris_utils / o cálculo antigo
+# pessoa a pessoa (mesmos limiares, mesmos truncamentos com int()).
+
+# Índices dos keypoints do YOLOv8-Pose (COCO)
+# 0=nariz, 1=olho_esq, 2=olho_dir, 3=orelha_esq, 4=orelha_dir
+# 15=calcanhar_esq, 16=calcanhar_dir
+KPTS_CABECA = [0, 1, 2, 3, 4]
+KPTS_CALCANHAR = [15, 16]
+CONF_MIN_KPT = 0.1
+
+# Margens (px) do recorte do rosto em volta dos keypoints da cabeça
+MARGEM_ROSTO = (20, 20, 20, 40)  # esquerda, cima, direita, baixo (mais espaço para baixo)
+
+
+def alturas_pixels(kpts, conf_min=CONF_MIN_KPT):
+    """
+    kpts: (N, 17, 3) com (x, y, confiança).
+    Retorna (altura_px, y_min, y_max, valido), todos com shape (N,).
+    `valido` é False para quem não tem cabeça ou calcanhar visível.
+    """
+    kpts = np.asarray(kpts, dtype=np.float32).reshape(-1, 17, 3)
+    cabeca = kpts[:, KPTS_CABECA]
+    calcanhar = kpts[:, KPTS_CALCANHAR]
+
+    cab_ok = cabeca[..., 2] > conf_min
+    cal_ok = calcanhar[..., 2] > conf_min
+    y_min = np.where(cab_ok, cabeca[..., 1], np.inf).min(axis=1)     # ponto mais alto da cabeça
+    y_max = np.where(cal_ok, calcanhar[..., 1], -np.inf).max(axis=1)  # ponto mais baixo do calcanhar
+
+    valido = cab_ok.any(axis=1) & cal_ok.any(axis=1)
+    altura = np.where(valido, np.abs(y_max - y_min), 0.0)
+    return altura, y_min, y_max, valido
+
+
+def confianca_altura(kpts):
+    """
+    Confiança da medida de altura de cada pessoa: a menor entre o keypoint
+    mais confiável da cabeça e o do calcanhar (os dois extremos usados).
+    Retorna shape (N,).
+    """
+    kpts = np.asarray(kpts, dtype=np.float32).reshape(-1, 17, 3)
+    return np.minimum(kpts[:, KPTS_CABECA, 2].max(axis=1), kpts[:, KPTS_CALCANHAR, 2].max(axis=1))
+
+
+def caixas_rosto(kpts, largura, altura, conf_min=CONF_MIN_KPT, margem=MARGEM_ROSTO):
+    """
+    Caixa do rosto de cada pessoa a partir dos keypoints da cabeça.
+    Retorna (caixas (N, 4) int [x1, y1, x2, y2] já limitadas à imagem, valido (N,)).
+    """
+    kpts = np.asarray(kpts, dtype=np.float32).reshape(-1, 17, 3)
+    cabeca = kpts[:, KPTS_CABECA]
+    ok = cabeca[..., 2] > conf_min
+    valido = ok.any(axis=1)
+
+    xs, ys = cabeca[..., 0], cabeca[..., 1]
+    # int() do Python trunca em direção a zero; astype faz o mesmo
+    x_min = np.where(ok, xs, np.inf).min(axis=1)
+    x_max = np.where(ok, xs, -np.inf).max(axis=1)
+    y_min = np.where(ok, ys, np.inf).min(axis=1)
+    y_max = np.where(ok, ys, -np.inf).max(axis=1)
+    lims = np.stack([x_min, y_min, x_max, y_max], axis=1)
+    lims = np.where(valido[:, None], lims, 0).astype(np.int64)
+
+    esq, cima, dir_, baixo = margem
+    caixas = lims + np.array([-esq, -cima, dir_, baixo], dtype=np.int64)
+    caixas[:, [0, 2]] = np.clip(caixas[:, [0, 2]], 0, largura)
+    caixas[:, [1, 3]] = np.clip(caixas[:, [1, 3]], 0, altura)
+
+    valido &= (caixas[:, 2] > caixas[:, 0]) & (caixas[:, 3] > caixas[:, 1])
+    return caixas, valido
+
+
+def landmarks_para_pixels(landmarks, largura, altura):
+    """
+    landmarks: (..., 2) normalizados (0-1) do FaceMesh -> pixels int (truncados),
+    relativos a um recorte de `largura` x `altura`.
+    """
+    return (np.asarray(landmarks, dtype=np.float64) * (largura, altura)).astype(np.int64)
+
+
+def diametros_iris(pontos):
+    """
+    pontos: (M, 4, 2) com os 4 pontos de cada íris.
+    Usa o método de 4 pontos (distância média ao centro * 2) quando o desvio
+    das distâncias é < 2 px; senão cai para o de 3 pontos (pontos 0, 2 e 3),
+    como `diametro_iris_4p` / `diametro_iris_3p`. Retorna (M,) float.
+    """
+    p = np.asarray(pontos, dtype=np.float64).reshape(-1, 4, 2)
+    centro = p.mean(axis=1, keepdims=True)
+    dist = np.linalg.norm(p - centro, axis=2)
+    d4 = dist.mean(axis=1) * 2
+    ok4 = dist.std(axis=1) < 2
+
+    a, b, c = p[:, 0], p[:, 2], p[:, 3]
+    d_h = np.linalg.norm(a - b, axis=1)
+    d_v = np.linalg.norm((a + b) / 2 - c, axis=1) * 2
+    d3 = (d_h + d_v) / 2
+    return np.where(ok4, d4, d3)
+
+
+def escalas(diam_d, diam_e, alturas_px, iris_mm, calibracao):
+    """
+    Escala (mm/px), diferença entre os olhos (%) e altura (cm) para M pessoas.
+    Onde não há medida válida (diâmetro 0/NaN ou altura 0) o resultado é NaN.
+    """
+    diam_d = np.asarray(diam_d, dtype=np.float64)
+    diam_e = np.asarray(diam_e, dtype=np.float64)
+    alturas_px = np.asarray(alturas_px, dtype=np.float64)
+
+    ok = (diam_d > 0) & (diam_e > 0)
+    d_medio = np.where(ok, (diam_d + diam_e) / 2, np.nan)
+    escala = (iris_mm / d_medio) * calibracao
+    diff = np.abs(diam_d - diam_e) / d_medio * 100
+    altura_cm = np.where(alturas_px > 0, alturas_px * escala / 10.0, np.nan)
+    return escala, diff, altura_cm
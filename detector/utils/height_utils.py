@@ -1,11 +1,11 @@
 # detector/utils/height_utils.py
 import cv2
-import mediapipe as mp
 import numpy as np
 
-# Inicialize a solução Pose fora da função para ser mais eficiente
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(static_image_mode=True, model_complexity=2)
+from . import model_registry
+
+# A solução Pose (model_complexity=2) é carregada só se esta função for usada;
+# o pipeline atual mede a altura com o YOLOv8-Pose.
 
 def medir_altura_pixels(image_bgr: np.ndarray):
     """
@@ -15,6 +15,10 @@ def medir_altura_pixels(image_bgr: np.ndarray):
     h, w, _ = image_bgr.shape
     image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
     
+    pose = model_registry.obter("pose_mediapipe")
+    if pose is None:
+        return None
+
     results = pose.process(image_rgb)
 
     if not results.pose_landmarks:
@@ -1,5 +1,16 @@
 import cv2
 import os
+import struct
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from . import artifact_utils
+
+# Gravação do upload original em segundo plano (não bloqueia a requisição)
+_persistencia = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistencia")
+
+# Flags do OpenCV para decodificar o JPEG já reduzido (o libjpeg faz o downscale no IDCT)
+_REDUCED_FLAGS = [(8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)]
 
 def recortar_olho(face_crop, pontos, nome, media_dir, image_name):
     x_min = max(0, min([p[0] for p in pontos]) - 5)
@@ -9,6 +20,65 @@ def recortar_olho(face_crop, pontos, nome, media_dir, image_name):
     eye_crop = face_crop[y_min:y_max, x_min:x_max].copy()
     for p in pontos:
         cv2.circle(eye_crop, (p[0]-x_min, p[1]-y_min), 2, (0,0,255), -1)
-    eye_name = f'{nome}_{image_name}'
-    cv2.imwrite(os.path.join(media_dir, eye_name), eye_crop)
-    return f'/media/{eye_name}'
+    return artifact_utils.gravar(eye_crop, media_dir, f'{nome}_{image_name}')
+
+def dimensoes_jpeg(dados):
+    """
+    Lê (largura, altura) do cabeçalho SOF de um JPEG sem decodificar os pixels.
+    Retorna None se os bytes não forem um JPEG reconhecível.
+    """
+    if len(dados) < 4 or dados[0:2] != b'\xff\xd8':
+        return None
+    i = 2
+    while i + 9 < len(dados):
+        if dados[i] != 0xFF:
+            i += 1
+            continue
+        marker = dados[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        seg_len = struct.unpack('>H', dados[i + 2:i + 4])[0]
+        # SOF0..SOF15, exceto DHT (C4), JPG (C8) e DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            altura, largura = struct.unpack('>HH', dados[i + 5:i + 9])
+            return largura, altura
+        i += 2 + seg_len
+    return None
+
+def decodificar_upload(dados, max_lado=0):
+    """
+    Decodifica os bytes do upload direto da memória (sem gravar e reler do disco).
+    Com `max_lado` > 0, JPEGs grandes são decodificados em 1/2, 1/4 ou 1/8 da
+    resolução, escolhendo o maior fator que ainda mantém o lado maior >= max_lado.
+    Retorna a imagem BGR ou None.
+    """
+    buf = np.frombuffer(dados, dtype=np.uint8)
+    flag = cv2.IMREAD_COLOR
+    if max_lado:
+        dims = dimensoes_jpeg(dados)
+        if dims:
+            lado = max(dims)
+            for fator, reduced_flag in _REDUCED_FLAGS:
+                if lado // fator >= max_lado:
+                    flag = reduced_flag
+                    break
+    return cv2.imdecode(buf, flag)
+
+def _gravar_bytes(dados, path):
+    try:
+        with open(path, 'wb') as f:
+            f.write(dados)
+    except OSError as e:
+        print(f"Erro ao salvar {path}: {e}")
+
+def salvar_original(dados, media_dir, image_name):
+    """
+    Agenda a gravação do upload original em `media_dir` em segundo plano.
+    Se o arquivo já existe (mesmo conteúdo, layout por hash), não grava de novo.
+    """
+    path = os.path.join(media_dir, image_name)
+    if os.path.exists(path):
+        return None
+    os.makedirs(media_dir, exist_ok=True)
+    return _persistencia.submit(_gravar_bytes, dados, path)
@@ -0,0 +1,175 @@
+# detector/utils/intermediate_utils.py
+import os
+
+import numpy as np
+
+from .age_utils import AGE_BUCKETS, idades_dos_vetores, faixa_etaria
+from .color_utils import classificar_cores
+from .config import INTERMEDIARIOS_DIR, IRIS_MM, CALIBRACAO_ESCALA
+from .geometry_utils import alturas_pixels, diametros_iris, escalas
+
+# Saídas brutas dos modelos de cada conteúdo processado, em
+# INTERMEDIARIOS_DIR/<sha[:2]>/<sha256>.npz, uma linha por pessoa analisada:
+#   kpts (M, 17, 3), caixa (M, 4)         -> YOLO (coordenadas da imagem original)
+#   iris (M, 2, 4, 2)                      -> FaceMesh (direita, esquerda; NaN sem íris)
+#   diam_perfil (M,)                       -> diâmetro previsto pelo perfil da câmera (NaN sem)
+#   idade_probs (M, 8)                     -> ONNX de idade (NaN sem vetor)
+#   hsv_olhos / hsv_cabelo (K, 3) + off_*  -> pixels HSV classificados (colunar, M+1 offsets)
+#   *_antes                                -> valores derivados na hora, para comparar
+#   iris_mm, calibracao, perfil ()         -> constantes efetivas da escala e a chave do perfil
+#                                             de calibração ("" sem perfil)
+# Com isso `recalcular` refaz escala, altura, idade e cores só com numpy.
+
+
+def _caminho(sha256):
+    return os.path.join(INTERMEDIARIOS_DIR, sha256[:2], f"{sha256}.npz")
+
+
+def _colunar(blocos):
+    """Lista de arrays (K_i, 3) (ou None) -> (dados concatenados, offsets (M+1,))."""
+    tamanhos = [0 if b is None else len(b) for b in blocos]
+    offsets = np.concatenate([[0], np.cumsum(tamanhos)]).astype(np.int64)
+    dados = [b for b in blocos if b is not None and len(b)]
+    return (np.concatenate(dados) if dados else np.empty((0, 3), np.uint8)), offsets
+
+
+def montar(forma, candidatos, iris_lote, probs, cores, pessoas, iris_mm=IRIS_MM, calibracao=CALIBRACAO_ESCALA,
+           perfil=None):
+    """
+    Registro de uma imagem a partir das etapas do pipeline (mesma ordem dos
+    candidatos). `cores` vem de `analisar_cores(..., guardar_hsv=True)`.
+    `iris_mm` / `calibracao`: os valores usados na escala (os do perfil, se houver).
+    """
+    m = len(candidatos)
+    iris = np.full((m, 2, 4, 2), np.nan, dtype=np.float32)
+    for i, (iris_d, iris_e) in enumerate(iris_lote):
+        if iris_d is not None and iris_e is not None:
+            iris[i] = iris_d, iris_e
+    hsv_olhos, off_olhos = _colunar([c.get("hsv_olhos") for c in cores])
+    hsv_cabelo, off_cabelo = _colunar([c.get("hsv_cabelo") for c in cores])
+    medidas = [p["medidas"] for p in pessoas]
+    return {
+        "forma": np.asarray(forma[:2], dtype=np.int64),
+        "id": np.array([c["idx"] + 1 for c in candidatos], dtype=np.int64),
+        "kpts": np.array([c["kpts"] for c in candidatos], dtype=np.float32).reshape(m, 17, 3),
+        "caixa": np.array([c["caixa"] for c in candidatos], dtype=np.int64).reshape(m, 4),
+        "iris": iris,
+        "diam_perfil": np.array([c.get("diam_perfil", np.nan) for c in candidatos], dtype=np.float32),
+        "idade_probs": np.asarray(probs, dtype=np.float32).reshape(m, len(AGE_BUCKETS)),
+        "hsv_olhos": hsv_olhos, "off_olhos": off_olhos,
+        "hsv_cabelo": hsv_cabelo, "off_cabelo": off_cabelo,
+        "altura_cm_antes": np.array([np.nan if md["altura_cm"] is None else md["altura_cm"] for md in medidas],
+                                    dtype=np.float64),
+        "idade_antes": np.array([md["idade"] for md in medidas], dtype=np.int64),
+        "cor_olhos_antes": np.array([p["cor_olhos"] for p in pessoas], dtype=str),
+        "cor_cabelo_antes": np.array([p["cor_cabelo"] for p in pessoas], dtype=str),
+        "iris_mm": np.float64(iris_mm),
+        "calibracao": np.float64(calibracao),
+        "perfil": np.array(perfil or ""),
+    }
+
+
+def salvar(sha256, registro):
+    """Grava o registro do conteúdo `sha256` (substitui o anterior)."""
+    path = _caminho(sha256)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **registro)
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"Erro ao gravar os intermediários de {sha256}: {e}")
+
+
+def carregar(sha256_ou_path):
+    """Registro (dict de arrays) de um conteúdo ou de um arquivo .npz."""
+    path = sha256_ou_path if sha256_ou_path.endswith(".npz") else _caminho(sha256_ou_path)
+    with np.load(path, allow_pickle=False) as dados:
+        return dict(dados)
+
+
+def listar(diretorio=INTERMEDIARIOS_DIR):
+    """Caminhos de todos os registros gravados."""
+    for raiz, _, arquivos in os.walk(diretorio):
+        for nome in sorted(arquivos):
+            if nome.endswith(".npz"):
+                yield os.path.join(raiz, nome)
+
+
+def _fatias(dados, offsets):
+    return [dados[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+def _por_pessoa(registros, nome, padrao, valor=None):
+    """Constante `nome` de cada registro repetida por pessoa; `valor` (se dado) substitui todas."""
+    return np.concatenate([np.full(len(r["id"]), valor if valor is not None else r.get(nome, padrao))
+                           for r in registros])
+
+
+def recalcular(registros, iris_mm=None, calibracao=None):
+    """
+    Refaz os valores derivados de todas as pessoas de vários registros com
+    o código atual: altura em pixels, diâmetros da íris (4/3 pontos),
+    escala, altura, idade e cores.
+    `iris_mm` / `calibracao`: None usa os valores gravados em cada registro
+    (os do perfil de calibração da câmera, se havia um); registros antigos,
+    sem eles, usam IRIS_MM / CALIBRACAO_ESCALA.
+    Retorna um dict de colunas (P,), com os valores "_antes" ao lado.
+    """
+    registros = list(registros)
+    if not registros:
+        return {}
+    coluna = lambda nome: np.concatenate([r[nome] for r in registros])  # noqa: E731
+    iris_mm = _por_pessoa(registros, "iris_mm", IRIS_MM, iris_mm).astype(np.float64)
+    calibracao = _por_pessoa(registros, "calibracao", CALIBRACAO_ESCALA, calibracao).astype(np.float64)
+
+    altura_px, _, _, valido = alturas_pixels(coluna("kpts"))
+    altura_px = np.where(valido, altura_px, 0.0)
+
+    # Íris do FaceMesh, ou o diâmetro previsto pelo perfil de quem não passou por ele
+    iris = coluna("iris")
+    tem_iris = ~np.isnan(iris).any(axis=(1, 2, 3))
+    diam_d = np.full(len(iris), np.nan)
+    diam_e = np.full(len(iris), np.nan)
+    if tem_iris.any():
+        diam_d[tem_iris] = diametros_iris(iris[tem_iris, 0])
+        diam_e[tem_iris] = diametros_iris(iris[tem_iris, 1])
+    diam_perfil = coluna("diam_perfil").astype(np.float64)
+    pelo_perfil = ~tem_iris & ~np.isnan(diam_perfil)
+    escala, diff, altura_cm = escalas(np.where(pelo_perfil, diam_perfil, diam_d),
+                                      np.where(pelo_perfil, diam_perfil, diam_e),
+                                      altura_px, iris_mm, calibracao)
+    diff[pelo_perfil] = np.nan
+
+    idades = idades_dos_vetores(coluna("idade_probs"))
+    olhos, cabelo = [], []
+    for r in registros:
+        for hsv_o, hsv_c in zip(_fatias(r["hsv_olhos"], r["off_olhos"]), _fatias(r["hsv_cabelo"], r["off_cabelo"])):
+            cores = classificar_cores(hsv_o, hsv_c)
+            olhos.append(cores["olhos"])
+            cabelo.append(cores["cabelo"])
+    # Sem íris o pipeline não classifica os olhos
+    olhos = np.where(tem_iris, np.array(olhos, dtype=object), "N/A")
+
+    return {
+        "registro": np.concatenate([np.full(len(r["id"]), k) for k, r in enumerate(registros)]),
+        "id": coluna("id"),
+        "perfil": _por_pessoa(registros, "perfil", "").astype(object),
+        "iris_mm": iris_mm,
+        "calibracao": calibracao,
+        "altura_pixels": altura_px,
+        "iris_direita_px": diam_d,
+        "iris_esquerda_px": diam_e,
+        "escala_mm_px": escala,
+        "diff_iris_pct": diff,
+        "altura_cm": altura_cm,
+        "idade": np.array(idades, dtype=np.int64),
+        "faixa_etaria": np.array([faixa_etaria(i) for i in idades], dtype=object),
+        "cor_olhos": olhos,
+        "cor_cabelo": np.array(cabelo, dtype=object),
+        "altura_cm_antes": coluna("altura_cm_antes"),
+        "idade_antes": coluna("idade_antes"),
+        "cor_olhos_antes": coluna("cor_olhos_antes").astype(object),
+        "cor_cabelo_antes": coluna("cor_cabelo_antes").astype(object),
+    }
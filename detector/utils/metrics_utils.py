@@ -0,0 +1,251 @@
+# detector/utils/metrics_utils.py
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+
+from . import model_registry
+from .config import METRICAS_ALOCACOES, METRICAS_BUCKETS, METRICAS_MEMORIA, METRICAS_MEMORIA_INTERVALO
+
+
+def rss_bytes():
+    """Memória residente (RSS) do processo em bytes, ou None se não der para medir."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Uma única thread amostra o RSS e atualiza o pico de todos os cronômetros
+# vivos (um por requisição); sem cronômetros ela fica parada.
+_monitorados = weakref.WeakSet()
+_monitor_lock = threading.Lock()
+_monitor_acordar = threading.Event()
+_monitor = None
+
+
+def _amostrar_memoria():
+    while True:
+        _monitor_acordar.wait()
+        rss = rss_bytes()
+        with _monitor_lock:
+            cronometros = list(_monitorados)
+            if not cronometros:
+                _monitor_acordar.clear()
+        for cron in cronometros:
+            cron._observar_rss(rss)
+        del cronometros
+        time.sleep(METRICAS_MEMORIA_INTERVALO)
+
+
+def _monitorar(cron):
+    global _monitor
+    with _monitor_lock:
+        _monitorados.add(cron)
+        if _monitor is None:
+            _monitor = threading.Thread(target=_amostrar_memoria, name="memoria", daemon=True)
+            _monitor.start()
+    _monitor_acordar.set()
+
+
+class Cronometro:
+    """
+    Registra, para cada etapa do pipeline, o tempo de parede, o tempo de CPU
+    do processo e (se METRICAS_ALOCACOES) o pico de memória alocada.
+    Etapas por pessoa recebem o índice da pessoa; etapas em lote, não.
+    Com `memoria`, também o RSS inicial e o pico de RSS do processo enquanto
+    o cronômetro existir (amostrado em segundo plano).
+    """
+
+    def __init__(self, alocacoes=METRICAS_ALOCACOES, memoria=METRICAS_MEMORIA):
+        self.alocacoes = alocacoes
+        if alocacoes and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.registros = []
+        self._inicio = time.perf_counter()
+        self._lock = threading.Lock()
+        self._rss_inicio = self._rss_pico = rss_bytes() if memoria else None
+        if self._rss_inicio is not None:
+            _monitorar(self)
+
+    def _observar_rss(self, rss):
+        if rss is not None and rss > self._rss_pico:
+            self._rss_pico = rss
+
+    @contextmanager
+    def etapa(self, nome, pessoa=None):
+        alloc_inicio = 0
+        if self.alocacoes:
+            tracemalloc.reset_peak()
+            alloc_inicio = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            extras = {}
+            if self.alocacoes:
+                extras["alloc_kb"] = max(0, tracemalloc.get_traced_memory()[1] - alloc_inicio) / 1024
+            self.registrar(nome, (time.perf_counter() - wall) * 1000, (time.process_time() - cpu) * 1000,
+                           pessoa, **extras)
+
+    def registrar(self, nome, wall_ms, cpu_ms, pessoa=None, **extras):
+        """Registra uma etapa medida fora do `with` (ex.: a parte de um lote que cabe a esta imagem)."""
+        with self._lock:
+            self.registros.append({"etapa": nome, "pessoa": pessoa, "wall_ms": wall_ms, "cpu_ms": cpu_ms, **extras})
+
+    def resumo(self):
+        """
+        {"total_ms", "etapas": {etapa: {wall_ms, cpu_ms, [alloc_kb], chamadas}},
+         "por_pessoa": {id: {etapa: wall_ms}}, ["memoria": {rss_inicio_mb, rss_pico_mb, acrescimo_mb}]}
+        — ids começam em 1, como em "pessoas".
+        """
+        etapas, por_pessoa = {}, {}
+        for r in self.registros:
+            e = etapas.setdefault(r["etapa"], {"wall_ms": 0.0, "cpu_ms": 0.0, "chamadas": 0})
+            e["wall_ms"] += r["wall_ms"]
+            e["cpu_ms"] += r["cpu_ms"]
+            e["chamadas"] += 1
+            if "alloc_kb" in r:
+                e["alloc_kb"] = max(e.get("alloc_kb", 0.0), r["alloc_kb"])
+            if r["pessoa"] is not None:
+                p = por_pessoa.setdefault(str(r["pessoa"] + 1), {})
+                p[r["etapa"]] = round(p.get(r["etapa"], 0.0) + r["wall_ms"], 3)
+
+        for e in etapas.values():
+            for k in ("wall_ms", "cpu_ms", "alloc_kb"):
+                if k in e:
+                    e[k] = round(e[k], 3)
+        resumo = {
+            "total_ms": round((time.perf_counter() - self._inicio) * 1000, 3),
+            "etapas": etapas,
+            "por_pessoa": por_pessoa,
+        }
+        if self._rss_inicio is not None:
+            self._observar_rss(rss_bytes())
+            mb = 1024 * 1024
+            resumo["memoria"] = {
+                "rss_inicio_mb": round(self._rss_inicio / mb, 1),
+                "rss_pico_mb": round(self._rss_pico / mb, 1),
+                "acrescimo_mb": round((self._rss_pico - self._rss_inicio) / mb, 1),
+            }
+        return resumo
+
+
+# --- Agregado do processo, exportado em formato Prometheus (/metrics) ---
+
+_lock = threading.Lock()
+_etapas = {}  # etapa -> {"observacoes", "chamadas", "wall_sum", "cpu_sum", "buckets": [...]}
+_imagens = {"count": 0, "total_sum": 0.0}
+_memoria = {"count": 0, "acrescimo_sum": 0.0, "acrescimo_max": 0.0, "pico_max": 0.0}
+
+
+def registrar(resumo):
+    """Soma o resumo de uma imagem (Cronometro.resumo()) ao agregado do processo."""
+    if not resumo:
+        return
+    with _lock:
+        _imagens["count"] += 1
+        _imagens["total_sum"] += resumo["total_ms"] / 1000
+        memoria = resumo.get("memoria")
+        if memoria:
+            _memoria["count"] += 1
+            _memoria["acrescimo_sum"] += memoria["acrescimo_mb"] * 1024 * 1024
+            _memoria["acrescimo_max"] = max(_memoria["acrescimo_max"], memoria["acrescimo_mb"] * 1024 * 1024)
+            _memoria["pico_max"] = max(_memoria["pico_max"], memoria["rss_pico_mb"] * 1024 * 1024)
+        for nome, e in resumo["etapas"].items():
+            agg = _etapas.setdefault(nome, {"observacoes": 0, "chamadas": 0, "wall_sum": 0.0, "cpu_sum": 0.0,
+                                            "buckets": [0] * len(METRICAS_BUCKETS)})
+            wall = e["wall_ms"] / 1000
+            agg["observacoes"] += 1
+            agg["chamadas"] += e["chamadas"]
+            agg["wall_sum"] += wall
+            agg["cpu_sum"] += e["cpu_ms"] / 1000
+            for i, limite in enumerate(METRICAS_BUCKETS):
+                if wall <= limite:
+                    agg["buckets"][i] += 1
+
+
+def exportar_prometheus():
+    """Texto no formato de exposição do Prometheus (uma família de métrica por bloco)."""
+    with _lock:
+        etapas = sorted((nome, dict(agg, buckets=list(agg["buckets"]))) for nome, agg in _etapas.items())
+        imagens = dict(_imagens)
+        memoria = dict(_memoria)
+
+    linhas = [
+        "# HELP biopixel_imagens_total Imagens processadas pelo pipeline.",
+        "# TYPE biopixel_imagens_total counter",
+        f"biopixel_imagens_total {imagens['count']}",
+        "# HELP biopixel_imagem_segundos_total Soma do tempo total por imagem.",
+        "# TYPE biopixel_imagem_segundos_total counter",
+        f"biopixel_imagem_segundos_total {imagens['total_sum']:.6f}",
+        "# HELP biopixel_imagem_memoria_acrescimo_bytes Acréscimo do pico de RSS sobre o RSS inicial, por imagem.",
+        "# TYPE biopixel_imagem_memoria_acrescimo_bytes summary",
+        f"biopixel_imagem_memoria_acrescimo_bytes_sum {memoria['acrescimo_sum']:.0f}",
+        f"biopixel_imagem_memoria_acrescimo_bytes_count {memoria['count']}",
+        "# HELP biopixel_imagem_memoria_acrescimo_max_bytes Maior acréscimo de RSS de uma imagem neste processo.",
+        "# TYPE biopixel_imagem_memoria_acrescimo_max_bytes gauge",
+        f"biopixel_imagem_memoria_acrescimo_max_bytes {memoria['acrescimo_max']:.0f}",
+        "# HELP biopixel_memoria_pico_bytes Maior pico de RSS observado durante uma imagem neste processo.",
+        "# TYPE biopixel_memoria_pico_bytes gauge",
+        f"biopixel_memoria_pico_bytes {memoria['pico_max']:.0f}",
+        "# HELP biopixel_etapa_segundos Tempo de parede por etapa e imagem.",
+        "# TYPE biopixel_etapa_segundos histogram",
+    ]
+    for nome, agg in etapas:
+        rotulo = f'etapa="{nome}"'
+        for limite, n in zip(METRICAS_BUCKETS, agg["buckets"]):
+            linhas.append(f'biopixel_etapa_segundos_bucket{{{rotulo},le="{limite}"}} {n}')
+        linhas.append(f'biopixel_etapa_segundos_bucket{{{rotulo},le="+Inf"}} {agg["observacoes"]}')
+        linhas.append(f'biopixel_etapa_segundos_sum{{{rotulo}}} {agg["wall_sum"]:.6f}')
+        linhas.append(f'biopixel_etapa_segundos_count{{{rotulo}}} {agg["observacoes"]}')
+
+    linhas += [
+        "# HELP biopixel_etapa_cpu_segundos_total Tempo de CPU acumulado por etapa.",
+        "# TYPE biopixel_etapa_cpu_segundos_total counter",
+    ]
+    linhas += [f'biopixel_etapa_cpu_segundos_total{{etapa="{nome}"}} {agg["cpu_sum"]:.6f}' for nome, agg in etapas]
+
+    linhas += [
+        "# HELP biopixel_etapa_chamadas_total Execuções de cada etapa (etapas por pessoa contam uma vez por pessoa).",
+        "# TYPE biopixel_etapa_chamadas_total counter",
+    ]
+    linhas += [f'biopixel_etapa_chamadas_total{{etapa="{nome}"}} {agg["chamadas"]}' for nome, agg in etapas]
+
+    linhas += [
+        "# HELP biopixel_modelo_carga_segundos Tempo da última carga de cada modelo neste processo.",
+        "# TYPE biopixel_modelo_carga_segundos gauge",
+    ]
+    linhas += [f'biopixel_modelo_carga_segundos{{modelo="{nome}"}} {tempos[-1]:.6f}'
+               for nome, tempos in sorted(model_registry.tempos_carga().items())]
+
+    esperas = sorted(model_registry.esperas().items())
+    linhas += [
+        "# HELP biopixel_modelo_emprestimos_total Instâncias emprestadas do pool de cada modelo.",
+        "# TYPE biopixel_modelo_emprestimos_total counter",
+    ]
+    linhas += [f'biopixel_modelo_emprestimos_total{{modelo="{nome}"}} {e["emprestimos"]}' for nome, e in esperas]
+    linhas += [
+        "# HELP biopixel_modelo_esperas_total Empréstimos que precisaram esperar uma instância livre.",
+        "# TYPE biopixel_modelo_esperas_total counter",
+    ]
+    linhas += [f'biopixel_modelo_esperas_total{{modelo="{nome}"}} {e["esperas"]}' for nome, e in esperas]
+    linhas += [
+        "# HELP biopixel_modelo_espera_segundos_total Tempo total esperando (e criando) instâncias do pool.",
+        "# TYPE biopixel_modelo_espera_segundos_total counter",
+    ]
+    linhas += [f'biopixel_modelo_espera_segundos_total{{modelo="{nome}"}} {e["segundos"]:.6f}' for nome, e in esperas]
+    linhas += [
+        "# HELP biopixel_modelo_pool_instancias Instâncias criadas no pool de cada modelo.",
+        "# TYPE biopixel_modelo_pool_instancias gauge",
+    ]
+    linhas += [f'biopixel_modelo_pool_instancias{{modelo="{nome}"}} {e["instancias"]}' for nome, e in esperas]
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,223 @@
+# detector/utils/model_registry.py
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from .config import (
+    YOLO_POSE_MODEL, YOLO_POSE_ONNX, POSE_BACKEND,
+    AGE_MODEL_PATH, AGE_MODEL_OTIMIZADO_PATH, AGE_MODEL_INT8_PATH, IDADE_BACKEND,
+    MODELOS_POOL, MODELOS_POOL_TIMEOUT,
+)
+
+# Registro central dos modelos. Nenhum modelo (nem a biblioteca dele) é
+# importado/carregado na importação dos módulos: `obter` carrega no primeiro
+# uso e guarda o tempo de carga; `aquecer` permite carregar antes, de forma
+# explícita (ex.: inicialização dos workers). `emprestar` entrega uma
+# instância exclusiva de um pool (MODELOS_POOL) para quem roda inferência
+# em paralelo, e mede o tempo de espera por uma instância livre.
+
+
+def arquivo_pose():
+    """Arquivo do modelo de pose do backend configurado (POSE_BACKEND)."""
+    return YOLO_POSE_ONNX if POSE_BACKEND == "onnx" else YOLO_POSE_MODEL
+
+
+def arquivo_idade():
+    """Arquivo do modelo de idade do backend configurado (IDADE_BACKEND)."""
+    return {"otimizado": AGE_MODEL_OTIMIZADO_PATH, "int8": AGE_MODEL_INT8_PATH}.get(IDADE_BACKEND, AGE_MODEL_PATH)
+
+
+def _carregar_yolo_pose():
+    from ultralytics import YOLO
+    # O .pt é baixado automaticamente na primeira vez; o .onnx é gerado por
+    # `manage.py otimizar_modelos --pose-onnx` e roda via onnxruntime.
+    return YOLO(arquivo_pose(), task="pose")
+
+
+def _carregar_idade():
+    from .onnx_utils import SessaoOnnx
+    # O grafo já otimizado offline não precisa de nova otimização completa
+    return SessaoOnnx(arquivo_idade(), nivel="basic" if IDADE_BACKEND == "otimizado" else "all")
+
+
+def _carregar_face_mesh():
+    import mediapipe as mp
+    return mp.solutions.face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1, refine_landmarks=True)
+
+
+def _carregar_pose_mediapipe():
+    import mediapipe as mp
+    return mp.solutions.pose.Pose(static_image_mode=True, model_complexity=2)
+
+
+# nome -> (função de carga, uma instância por thread?)
+CARREGADORES = {
+    "yolo_pose": (_carregar_yolo_pose, False),
+    "idade": (_carregar_idade, False),
+    "face_mesh": (_carregar_face_mesh, True),   # FaceMesh não é seguro entre threads
+    "pose_mediapipe": (_carregar_pose_mediapipe, True),   # só usado por height_utils; também não é seguro entre threads
+}
+
+# Modelos que podem rodar em várias threads ao mesmo tempo (InferenceSession.run é thread-safe)
+SEGUROS_ENTRE_THREADS = {"idade"}
+
+# Modelos usados pelo pipeline (os que `aquecer()` carrega por padrão)
+MODELOS_PIPELINE = ["yolo_pose", "idade", "face_mesh"]
+
+_lock = threading.Lock()
+_locks_carga = {nome: threading.Lock() for nome in CARREGADORES}
+_modelos = {}       # nome -> instância (ou None se a carga falhou)
+_local = threading.local()
+_tempos_carga = {}  # nome -> lista de segundos (uma entrada por instância carregada)
+_pools = {}         # nome -> {"livres": LifoQueue, "criadas": int}
+_esperas = {}       # nome -> {"emprestimos", "esperas", "segundos", "max_segundos"}
+
+
+def _carregar(nome):
+    carregador, _ = CARREGADORES[nome]
+    inicio = time.perf_counter()
+    try:
+        modelo = carregador()
+    except Exception as e:
+        print(f"Erro ao carregar modelo '{nome}': {e}")
+        return None
+    dt = time.perf_counter() - inicio
+    with _lock:
+        _tempos_carga.setdefault(nome, []).append(dt)
+    print(f"Modelo '{nome}' carregado em {dt:.2f}s")
+    return modelo
+
+
+def obter(nome):
+    """
+    Retorna o modelo `nome`, carregando-o no primeiro uso.
+    Modelos por thread (FaceMesh) têm uma instância para cada thread.
+    Retorna None se a carga falhou (a falha não é repetida a cada chamada).
+    """
+    if CARREGADORES[nome][1]:
+        modelos = getattr(_local, "modelos", None)
+        if modelos is None:
+            modelos = _local.modelos = {}
+        if nome not in modelos:
+            modelos[nome] = _carregar(nome)
+        return modelos[nome]
+
+    if nome in _modelos:
+        return _modelos[nome]
+    with _locks_carga[nome]:
+        if nome not in _modelos:
+            _modelos[nome] = _carregar(nome)
+    return _modelos[nome]
+
+
+def novo(nome):
+    """
+    Carrega uma instância nova e exclusiva de `nome` (fora do cache).
+    Usado quando o modelo guarda estado, ex.: o rastreador do YOLO em um vídeo.
+    """
+    return _carregar(nome)
+
+
+def _esquecer_falha(nome):
+    """Remove uma falha de carga guardada por `obter`, para que a próxima chamada tente de novo."""
+    with _locks_carga[nome]:
+        if nome in _modelos and _modelos[nome] is None:
+            del _modelos[nome]
+
+
+def _pool(nome):
+    with _lock:
+        pool = _pools.get(nome)
+        if pool is None:
+            pool = _pools[nome] = {"livres": queue.LifoQueue(), "criadas": 0}
+        return pool
+
+
+def _registrar_espera(nome, segundos, esperou):
+    with _lock:
+        e = _esperas.setdefault(nome, {"emprestimos": 0, "esperas": 0, "segundos": 0.0, "max_segundos": 0.0})
+        e["emprestimos"] += 1
+        e["esperas"] += int(esperou)
+        e["segundos"] += segundos
+        e["max_segundos"] = max(e["max_segundos"], segundos)
+
+
+@contextmanager
+def emprestar(nome, timeout=MODELOS_POOL_TIMEOUT):
+    """
+    Empresta uma instância de `nome` para uso exclusivo dentro do `with`.
+    A primeira é a mesma de `obter`; outras são criadas sob demanda até
+    MODELOS_POOL[nome]. Com todas ocupadas, espera uma ser devolvida
+    (queue.Empty após `timeout`). Modelos por thread não passam pelo pool.
+    Entrega None se a carga do modelo falhou; uma instância que não carregou
+    não entra no pool (a vaga é liberada para uma nova tentativa).
+    """
+    tamanho = MODELOS_POOL.get(nome, 1)
+    if CARREGADORES[nome][1] or (nome in SEGUROS_ENTRE_THREADS and tamanho <= 1):
+        # Instância por thread, ou única e compartilhável: não há o que esperar
+        _registrar_espera(nome, 0.0, False)
+        yield obter(nome)
+        return
+
+    pool = _pool(nome)
+    inicio = time.perf_counter()
+    esperou = False
+    try:
+        modelo = pool["livres"].get_nowait()
+    except queue.Empty:
+        with _lock:
+            criar = pool["criadas"] < max(1, tamanho)
+            if criar:
+                pool["criadas"] += 1
+                primeira = pool["criadas"] == 1
+        if criar:
+            try:
+                modelo = obter(nome) if primeira else _carregar(nome)
+            except BaseException:
+                modelo = None
+                raise
+            finally:
+                if modelo is None:
+                    with _lock:
+                        pool["criadas"] -= 1
+                    if primeira:
+                        # `obter` guarda a falha; sem isso o próximo empréstimo receberia o mesmo None
+                        _esquecer_falha(nome)
+            if modelo is None:
+                _registrar_espera(nome, time.perf_counter() - inicio, esperou)
+                yield None
+                return
+        else:
+            esperou = True
+            modelo = pool["livres"].get(timeout=timeout)
+    _registrar_espera(nome, time.perf_counter() - inicio, esperou)
+
+    try:
+        yield modelo
+    finally:
+        pool["livres"].put(modelo)
+
+
+def carregado(nome):
+    if CARREGADORES[nome][1]:
+        return getattr(_local, "modelos", {}).get(nome) is not None
+    return _modelos.get(nome) is not None
+
+
+def aquecer(nomes=None):
+    """Carrega explicitamente os modelos (padrão: os do pipeline). Retorna {nome: ok}."""
+    return {nome: obter(nome) is not None for nome in (nomes or MODELOS_PIPELINE)}
+
+
+def esperas():
+    """{nome: {emprestimos, esperas, segundos, max_segundos, instancias, tamanho}} dos pools."""
+    with _lock:
+        return {nome: {**e, "instancias": _pools.get(nome, {}).get("criadas", 0), "tamanho": MODELOS_POOL.get(nome, 1)}
+                for nome, e in _esperas.items()}
+
+
+def tempos_carga():
+    """{nome: [segundos, ...]} de cada carga feita neste processo."""
+    with _lock:
+        return {nome: list(v) for nome, v in _tempos_carga.items()}
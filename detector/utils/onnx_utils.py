@@ -0,0 +1,68 @@
+# detector/utils/onnx_utils.py
+import threading
+
+import numpy as np
+
+from .config import ONNX_INTRA_OP_THREADS, ONNX_INTER_OP_THREADS, ONNX_LOTE_INICIAL
+
+
+def opcoes_sessao(nivel="all", salvar_em=None):
+    """
+    SessionOptions com otimização de grafo e número de threads explícitos.
+    `nivel`: "basic", "extended" ou "all". `salvar_em` grava o grafo otimizado.
+    """
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = {
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }[nivel]
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    if ONNX_INTRA_OP_THREADS:
+        opts.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+    if ONNX_INTER_OP_THREADS:
+        opts.inter_op_num_threads = ONNX_INTER_OP_THREADS
+    if salvar_em:
+        opts.optimized_model_filepath = salvar_em
+    return opts
+
+
+class SessaoOnnx:
+    """
+    Sessão ONNX com IO binding: a entrada é escrita em um buffer float32
+    pré-alocado (um por thread, reutilizado entre chamadas) e ligada à
+    sessão sem cópia extra.
+    """
+
+    def __init__(self, path, nivel="all"):
+        import onnxruntime as ort
+
+        # Se precisar rodar em GPU com onnxruntime-gpu, ajuste providers.
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=opcoes_sessao(nivel), providers=["CPUExecutionProvider"])
+        entrada = self.session.get_inputs()[0]
+        self.input_name = entrada.name
+        self.output_name = self.session.get_outputs()[0].name
+        # Batch dinâmico = dimensão 0 simbólica (str/None) ou > 1
+        dim = entrada.shape[0]
+        self.aceita_lote = not isinstance(dim, int) or dim != 1
+        self.forma = tuple(entrada.shape[1:])
+        self._local = threading.local()
+
+    def buffer(self, n):
+        """Buffer de entrada (n, *forma) desta thread; só realoca se precisar crescer."""
+        buf = getattr(self._local, "buf", None)
+        if buf is None or buf.shape[0] < n:
+            capacidade = max(n, ONNX_LOTE_INICIAL if self.aceita_lote else 1)
+            buf = self._local.buf = np.empty((capacidade, *self.forma), dtype=np.float32)
+        return buf[:n]
+
+    def run(self, entrada):
+        """Roda a sessão com IO binding sobre `entrada` (tipicamente uma fatia de `buffer`)."""
+        io = self.session.io_binding()
+        io.bind_cpu_input(self.input_name, np.ascontiguousarray(entrada))
+        io.bind_output(self.output_name)
+        self.session.run_with_iobinding(io)
+        return io.copy_outputs_to_cpu()[0]
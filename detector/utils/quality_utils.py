@@ -0,0 +1,67 @@
+# detector/utils/quality_utils.py
+import cv2
+import numpy as np
+
+from .config import (
+    QUALIDADE_CONF_KPT_MIN, QUALIDADE_ROSTO_MIN_LADO, QUALIDADE_NITIDEZ_MIN,
+    QUALIDADE_NITIDEZ_LADO, QUALIDADE_MAX_PESSOAS,
+)
+from .geometry_utils import confianca_altura
+
+# Motivos de descarte (vão no resultado, em "descartados")
+CONFIANCA_BAIXA = "confianca_keypoints"
+ROSTO_PEQUENO = "rosto_pequeno"
+LIMITE_PESSOAS = "limite_pessoas"
+ROSTO_BORRADO = "rosto_borrado"
+
+
+def nitidez(img):
+    """
+    Variância do Laplaciano (quanto maior, mais nítido). O recorte é reduzido
+    para QUALIDADE_NITIDEZ_LADO antes, para o valor não depender do tamanho.
+    """
+    if img is None or img.size == 0:
+        return 0.0
+    h, w = img.shape[:2]
+    fator = QUALIDADE_NITIDEZ_LADO / max(h, w)
+    if fator < 1:
+        img = cv2.resize(img, (max(1, int(w * fator)), max(1, int(h * fator))), interpolation=cv2.INTER_AREA)
+    cinza = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return float(cv2.Laplacian(cinza, cv2.CV_64F).var())
+
+
+def filtrar(image, kpts, caixas, alturas, candidatos):
+    """
+    Aplica os critérios de qualidade às pessoas `candidatos` (índices com
+    altura e rosto válidos), do mais barato para o mais caro.
+    Retorna (aprovados em ordem crescente, {idx: motivo} dos descartados).
+    """
+    candidatos = np.asarray(candidatos, dtype=int)
+    descartados = {}
+
+    def descartar(mascara, motivo):
+        for idx in candidatos[mascara]:
+            descartados[int(idx)] = motivo
+        return candidatos[~mascara]
+
+    if QUALIDADE_CONF_KPT_MIN and candidatos.size:
+        candidatos = descartar(confianca_altura(kpts)[candidatos] < QUALIDADE_CONF_KPT_MIN, CONFIANCA_BAIXA)
+
+    if QUALIDADE_ROSTO_MIN_LADO and candidatos.size:
+        c = caixas[candidatos]
+        lado = np.minimum(c[:, 2] - c[:, 0], c[:, 3] - c[:, 1])
+        candidatos = descartar(lado < QUALIDADE_ROSTO_MIN_LADO, ROSTO_PEQUENO)
+
+    if QUALIDADE_MAX_PESSOAS and candidatos.size > QUALIDADE_MAX_PESSOAS:
+        # Mantém as maiores em pixels (mais próximas da câmera, medida mais precisa)
+        ordem = np.argsort(-np.asarray(alturas)[candidatos], kind="stable")
+        excesso = np.zeros(candidatos.size, dtype=bool)
+        excesso[ordem[QUALIDADE_MAX_PESSOAS:]] = True
+        candidatos = descartar(excesso, LIMITE_PESSOAS)
+
+    if QUALIDADE_NITIDEZ_MIN and candidatos.size:
+        borrado = np.array([nitidez(image[y1:y2, x1:x2]) < QUALIDADE_NITIDEZ_MIN
+                            for x1, y1, x2, y2 in caixas[candidatos]])
+        candidatos = descartar(borrado, ROSTO_BORRADO)
+
+    return np.sort(candidatos), descartados
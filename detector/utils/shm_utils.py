@@ -0,0 +1,54 @@
+# detector/utils/shm_utils.py
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Entrega de imagens decodificadas do processo web para os workers de jobs
+# sem serializar os pixels: o web copia a imagem BGR uma vez para um bloco de
+# memória compartilhada e envia só o descritor (nome, forma, dtype); o worker
+# abre o bloco e usa um np.ndarray apontando para ele, sem cópia.
+# Quem cria o bloco (o processo web) é quem o remove, com `liberar`.
+
+
+def publicar(array, **extras):
+    """
+    Copia `array` para um bloco novo de memória compartilhada.
+    Retorna (bloco, descritor); `extras` vão junto no descritor (ex.: sha256).
+    """
+    array = np.ascontiguousarray(array)
+    bloco = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=bloco.buf)[...] = array
+    descritor = {"nome": bloco.name, "forma": array.shape, "dtype": array.dtype.str, **extras}
+    return bloco, descritor
+
+
+def liberar(bloco):
+    """Fecha e remove o bloco (lado de quem publicou)."""
+    try:
+        bloco.close()
+        bloco.unlink()
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def abrir(descritor):
+    """
+    Abre o bloco do descritor e entrega a imagem como view (somente leitura).
+    Tudo o que referencia a view (recortes, gravações pendentes) precisa
+    terminar dentro do `with`.
+    """
+    bloco = shared_memory.SharedMemory(name=descritor["nome"])
+    view = None
+    try:
+        view = np.ndarray(descritor["forma"], dtype=np.dtype(descritor["dtype"]), buffer=bloco.buf)
+        view.flags.writeable = False
+        yield view
+    finally:
+        del view
+        try:
+            bloco.close()
+        except BufferError:
+            # Ainda há views vivas (ex.: em um traceback); o mmap fecha quando forem coletadas
+            pass
@@ -0,0 +1,157 @@
+# detector/utils/storage_utils.py
+import os
+import shutil
+import time
+
+from .config import MEDIA_DIR, MEDIA_TTL_DIAS, MEDIA_MAX_BYTES
+
+# Layout endereçado por conteúdo:
+#   media/conteudo/ab/abcdef.../original.jpg
+#   media/conteudo/ab/abcdef.../face_0_original.jpg, eye_right_0_original.jpg, body_all_original.jpg
+# O nome enviado pelo usuário não entra no caminho: dois uploads diferentes
+# com o mesmo nome não se sobrescrevem, e o mesmo conteúdo é gravado uma vez só.
+
+CONTEUDO = "conteudo"
+
+# Prefixo do arquivo -> tipo (para o TTL). Inclui os prefixos antigos do media/ plano.
+_PREFIXOS = [
+    ("original", "original"),
+    ("body", "body"),
+    ("corpo_", "body"),
+    ("marcada_", "body"),
+    ("face_", "face"),
+    ("eye_", "eye"),
+]
+# Tipos gerados pelo pipeline: só estes são coletados na raiz de media/ (legado).
+# Os demais arquivos soltos ali (ex.: as fotos de referência usadas pelo
+# benchmark e pelo otimizar_modelos) nunca são removidos.
+_DERIVADOS = {"body", "face", "eye"}
+
+
+def diretorio_conteudo(sha256, media_dir=MEDIA_DIR):
+    return os.path.join(media_dir, CONTEUDO, sha256[:2], sha256)
+
+
+def nome_original(image_name):
+    ext = os.path.splitext(image_name)[1].lower() or ".jpg"
+    return f"original{ext}"
+
+
+def tocar(diretorio):
+    """Marca o conteúdo como usado recentemente (usado pela cota, LRU)."""
+    try:
+        os.utime(diretorio)
+    except OSError:
+        pass
+
+
+def tipo_arquivo(nome):
+    """Tipo do arquivo pelo prefixo, ou None se não for um nome conhecido (sem TTL)."""
+    for prefixo, tipo in _PREFIXOS:
+        if nome.startswith(prefixo):
+            return tipo
+    return None
+
+
+def _expirado(path, nome, agora):
+    dias = MEDIA_TTL_DIAS.get(tipo_arquivo(nome))
+    if dias is None:
+        return False
+    try:
+        return agora - os.path.getmtime(path) > dias * 86400
+    except OSError:
+        return False
+
+
+def _remover(path, stats, dry_run):
+    try:
+        tamanho = os.path.getsize(path) if os.path.isfile(path) else _tamanho_dir(path)
+        if not dry_run:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+    except OSError as e:
+        print(f"Erro ao remover {path}: {e}")
+        return 0
+    stats["removidos"] += 1
+    stats["bytes_liberados"] += tamanho
+    return tamanho
+
+
+def _tamanho_dir(path):
+    total = 0
+    for raiz, _, arquivos in os.walk(path):
+        for nome in arquivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nome))
+            except OSError:
+                pass
+    return total
+
+
+def coletar_lixo(media_dir=MEDIA_DIR, max_bytes=MEDIA_MAX_BYTES, incluir_legado=False, dry_run=False):
+    """
+    1) Remove arquivos cujo TTL (MEDIA_TTL_DIAS, por tipo) expirou.
+    2) Se o total ainda passar de `max_bytes`, remove conteúdos inteiros,
+       do menos usado para o mais usado, até caber na cota.
+    Com `incluir_legado`, também trata os arquivos soltos na raiz de media/
+    (layout antigo, indexado pelo nome enviado), mas só os recortes e imagens
+    anotadas (body_/corpo_/marcada_/face_/eye_); os demais ficam intactos.
+    Retorna um dict com o resumo.
+    """
+    agora = time.time()
+    stats = {"removidos": 0, "bytes_liberados": 0, "bytes_total": 0}
+    grupos = []  # (último uso, tamanho, caminho)
+
+    raiz_conteudo = os.path.join(media_dir, CONTEUDO)
+    if os.path.isdir(raiz_conteudo):
+        for prefixo in os.listdir(raiz_conteudo):
+            dir_prefixo = os.path.join(raiz_conteudo, prefixo)
+            if not os.path.isdir(dir_prefixo):
+                continue
+            for sha in os.listdir(dir_prefixo):
+                diretorio = os.path.join(dir_prefixo, sha)
+                if not os.path.isdir(diretorio):
+                    continue
+                tamanho = 0
+                ultimo_uso = os.path.getmtime(diretorio)
+                for nome in os.listdir(diretorio):
+                    path = os.path.join(diretorio, nome)
+                    if _expirado(path, nome, agora):
+                        _remover(path, stats, dry_run)
+                        continue
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    tamanho += st.st_size
+                    ultimo_uso = max(ultimo_uso, st.st_mtime)
+                if not dry_run and not os.listdir(diretorio):
+                    os.rmdir(diretorio)
+                    continue
+                grupos.append((ultimo_uso, tamanho, diretorio))
+            if not dry_run and not os.listdir(dir_prefixo):
+                os.rmdir(dir_prefixo)
+
+    if incluir_legado and os.path.isdir(media_dir):
+        for nome in os.listdir(media_dir):
+            path = os.path.join(media_dir, nome)
+            if not os.path.isfile(path) or tipo_arquivo(nome) not in _DERIVADOS:
+                continue
+            if _expirado(path, nome, agora):
+                _remover(path, stats, dry_run)
+                continue
+            st = os.stat(path)
+            grupos.append((st.st_mtime, st.st_size, path))
+
+    total = sum(g[1] for g in grupos)
+    if max_bytes is not None and total > max_bytes:
+        for _, tamanho, path in sorted(grupos):
+            if total <= max_bytes:
+                break
+            _remover(path, stats, dry_run)
+            total -= tamanho
+
+    stats["bytes_total"] = total
+    return stats
@@ -0,0 +1,224 @@
+# detector/video.py
+import os
+import tempfile
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from .pipeline import Pipeline, decodificar_imagem
+from .utils import model_registry, quality_utils
+from .utils.age_utils import estimar_idades, faixa_etaria
+from .utils.color_utils import analisar_cores
+from .utils.config import (
+    VIDEO_TRACKER, VIDEO_PASSO_FRAMES, VIDEO_MAX_FRAMES, VIDEO_MIN_AMOSTRAS, VIDEO_CV_ESTAVEL,
+)
+from .utils.face_utils import pontos_iris_lote
+from .utils.metrics_utils import Cronometro
+
+# Modo vídeo: os frames são lidos um a um (gerador), o YOLO roda com
+# rastreamento para que cada pessoa mantenha um id entre frames, e as
+# medidas de cada track são agregadas ao longo do tempo.
+# FaceMesh e idade (as etapas caras) só rodam para tracks que ainda não
+# têm uma escala estável; depois disso, cada frame só mede a altura em
+# pixels e usa a escala já aprendida da track (câmera fixa, pessoa parada
+# ou se movendo pouco em profundidade).
+
+
+def frames_video(path, passo=VIDEO_PASSO_FRAMES, max_frames=VIDEO_MAX_FRAMES):
+    """Gera (índice, frame BGR) de um arquivo de vídeo sem carregá-lo inteiro na memória."""
+    cap = cv2.VideoCapture(path)
+    try:
+        idx = lidos = 0
+        while lidos < max_frames:
+            ok = cap.grab()
+            if not ok:
+                break
+            if idx % passo == 0:
+                ok, frame = cap.retrieve()
+                if not ok:
+                    break
+                yield idx, frame
+                lidos += 1
+            idx += 1
+    finally:
+        cap.release()
+
+
+def frames_sequencia(lista_bytes, max_frames=VIDEO_MAX_FRAMES):
+    """Gera (índice, frame BGR) de uma sequência de imagens (burst), decodificando uma por vez."""
+    for idx, dados in enumerate(lista_bytes[:max_frames]):
+        frame = decodificar_imagem(dados)
+        if frame is not None:
+            yield idx, frame
+
+
+class Track:
+    """Medidas acumuladas de uma pessoa ao longo dos frames."""
+
+    def __init__(self, track_id):
+        self.track_id = track_id
+        self.frames = 0
+        self.escalas = []     # mm/px, frames com FaceMesh
+        self.alturas_cm = []  # uma por frame com escala (medida ou aprendida)
+        self.idades = []
+        self.cores_olhos = Counter()
+        self.cores_cabelo = Counter()
+
+    def estavel(self):
+        if len(self.escalas) < VIDEO_MIN_AMOSTRAS:
+            return False
+        arr = np.asarray(self.escalas)
+        return float(arr.std() / arr.mean()) <= VIDEO_CV_ESTAVEL
+
+    def escala(self):
+        return float(np.median(self.escalas)) if self.escalas else None
+
+    def resumo(self):
+        idade = int(np.median(self.idades)) if self.idades else None
+        alturas = np.asarray(self.alturas_cm)
+        escala = self.escala()
+        return {
+            "track_id": self.track_id,
+            "frames": self.frames,
+            "amostras_escala": len(self.escalas),
+            "amostras_altura": int(alturas.size),
+            "estavel": self.estavel(),
+            "altura": f"{np.median(alturas):.1f} cm" if alturas.size else "N/A",
+            "altura_desvio": f"{alturas.std():.1f} cm" if alturas.size > 1 else "N/A",
+            "escala": f"{escala:.3f} mm/px" if escala else "N/A",
+            "idade_estimativa": f"{idade} anos" if idade is not None else "N/A",
+            "faixa_etaria": faixa_etaria(idade) if idade is not None else "N/A",
+            "cor_olhos": self.cores_olhos.most_common(1)[0][0] if self.cores_olhos else "N/A",
+            "cor_cabelo": self.cores_cabelo.most_common(1)[0][0] if self.cores_cabelo else "N/A",
+        }
+
+
+class AnalisadorVideo:
+    """
+    Roda o pipeline em uma sequência de frames com rastreamento.
+    Usa uma instância própria do YOLO: o rastreador guarda estado entre
+    frames e não pode ser compartilhado com outras requisições.
+    """
+
+    def __init__(self, yolo=None):
+        self.yolo = yolo if yolo is not None else model_registry.novo("yolo_pose")
+        self.pipeline = Pipeline(yolo=self.yolo)
+        self.tracks = {}
+        self.cron = Cronometro()
+        self.frames = 0
+        self.facemesh_pulados = 0
+        self.descartados = Counter()  # motivo do filtro de qualidade -> detecções
+
+    def rastrear(self, frame):
+        """Retorna (keypoints (N,17,3), ids (N,)) — pessoas sem id do rastreador são ignoradas."""
+        small, fator = self.pipeline.reduzir_para_pose(frame)
+        self.pipeline.fator_pose = fator
+        res = self.yolo.track(small, persist=True, tracker=VIDEO_TRACKER, verbose=False)[0]
+        if not res.keypoints or res.boxes.id is None:
+            return None, None
+        kpts = np.array(res.keypoints.cpu().numpy().data, dtype=np.float32)
+        kpts[..., :2] /= fator  # keypoints de volta à resolução do frame
+        ids = res.boxes.id.cpu().numpy().astype(int)
+        return kpts, ids
+
+    def processar_frame(self, frame):
+        self.frames += 1
+        with self.cron.etapa("pose"):
+            kpts, ids = self.rastrear(frame)
+        if kpts is None:
+            return
+
+        with self.cron.etapa("altura_pixels"):
+            alturas, _, _, com_altura = self.pipeline.medir_alturas(kpts)
+        with self.cron.etapa("recorte_rosto"):
+            caixas, com_rosto = self.pipeline.caixas_rosto(frame, kpts)
+
+        # Só as tracks ainda instáveis passam pelas etapas de rosto
+        instaveis = []
+        for i in np.flatnonzero(com_altura):
+            track = self.tracks.setdefault(int(ids[i]), Track(int(ids[i])))
+            track.frames += 1
+            if track.estavel():
+                self.facemesh_pulados += 1
+                track.alturas_cm.append(float(alturas[i]) * track.escala() / 10.0)
+            elif com_rosto[i]:
+                instaveis.append(i)
+
+        # Detecções de baixa qualidade neste frame ficam para os próximos
+        with self.cron.etapa("qualidade"):
+            analisar, descartados = quality_utils.filtrar(frame, kpts, caixas, alturas, instaveis)
+        self.descartados.update(descartados.values())
+        analisar = list(analisar)
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in caixas[analisar]]
+
+        if not analisar:
+            return
+
+        with self.cron.etapa("idade"):
+            idades = estimar_idades(crops)
+        with self.cron.etapa("facemesh"):
+            iris_lote = pontos_iris_lote(crops)
+
+        com_iris = [j for j, (d, e) in enumerate(iris_lote) if d is not None and e is not None]
+        escalas_frame = {}
+        if com_iris:
+            with self.cron.etapa("escala"):
+                _, _, escala, _, altura_cm = self.pipeline.medir_iris(
+                    np.stack([iris_lote[j][0] for j in com_iris]),
+                    np.stack([iris_lote[j][1] for j in com_iris]),
+                    alturas[[analisar[j] for j in com_iris]],
+                )
+            escalas_frame = {j: (escala[n], altura_cm[n]) for n, j in enumerate(com_iris)}
+
+        with self.cron.etapa("cores"):
+            cores = analisar_cores(crops, [iris_lote[j][0] if j in escalas_frame else None for j in range(len(crops))])
+
+        with self.cron.etapa("agregacao"):
+            for j, i in enumerate(analisar):
+                track = self.tracks[int(ids[i])]
+                track.idades.append(idades[j])
+                track.cores_cabelo[cores[j]["cabelo"]] += 1
+                if j in escalas_frame:
+                    escala, altura_cm = escalas_frame[j]
+                    if not np.isnan(escala):
+                        track.escalas.append(float(escala))
+                    if not np.isnan(altura_cm):
+                        track.alturas_cm.append(float(altura_cm))
+                    track.cores_olhos[cores[j]["olhos"]] += 1
+
+    def resultado(self):
+        tracks = sorted(self.tracks.values(), key=lambda t: -t.frames)
+        return {
+            "tracks": [t.resumo() for t in tracks],
+            "frames_processados": self.frames,
+            "facemesh_pulados": self.facemesh_pulados,
+            "descartados": dict(self.descartados),
+            "erro": None if tracks else "Nenhuma pessoa foi rastreada nos frames enviados.",
+            "tempos": self.cron.resumo(),
+        }
+
+
+def processar_frames(frames):
+    """Analisa um gerador de (índice, frame) e retorna o resultado agregado por track."""
+    analisador = AnalisadorVideo()
+    if analisador.yolo is None:
+        return {"tracks": [], "frames_processados": 0, "erro": "Modelo YOLO não foi carregado."}
+    for _, frame in frames:
+        analisador.processar_frame(frame)
+    return analisador.resultado()
+
+
+def processar_video_bytes(dados, nome):
+    """
+    Variante para uploads: o OpenCV só lê vídeo a partir de arquivo, então os
+    bytes vão para um arquivo temporário, apagado ao final.
+    """
+    sufixo = os.path.splitext(nome)[1] or ".mp4"
+    fd, path = tempfile.mkstemp(suffix=sufixo)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(dados)
+        return processar_frames(frames_video(path))
+    finally:
+        os.remove(path)
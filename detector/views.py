@@ -1,198 +1,53 @@
 # detector/views.py
+import asyncio
+import json
+import threading
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+
+from django.core.paginator import EmptyPage, Paginator
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from django.views.static import serve
 from .forms import ImageUploadForm
-import cv2, os, mediapipe as mp
-import numpy as np
-from ultralytics import YOLO  # <-- NOVO: Importa o YOLO
-
-# Nossos utils de análise
-from .utils.iris_utils import diametro_iris_4p, diametro_iris_3p
-from .utils.color_utils import detectar_cor_olhos, detectar_cor_cabelo
-from .utils.image_utils import recortar_olho
-from .utils.config import IRIS_MM, CALIBRACAO_ESCALA
-from .utils.age_utils import faixa_etaria, estimar_idade
-
-# --- CARREGA OS MODELOS (Fora da view, para eficiência) ---
-
-# Carrega o modelo de estimativa de pose (YOLOv8 Nano-Pose)
-# Ele será baixado automaticamente na primeira vez
-try:
-    yolo_model = YOLO('yolov8n-pose.pt')
-except Exception as e:
-    print(f"Erro ao carregar modelo YOLO: {e}. Certifique-se de ter 'ultralytics' instalado.")
-    yolo_model = None
-
-# Carrega o modelo de landmarks faciais (MediaPipe)
-try:
-    mp_face_mesh = mp.solutions.face_mesh
-    fm = mp_face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1, refine_landmarks=True)
-except Exception as e:
-    print(f"Erro ao carregar MediaPipe FaceMesh: {e}")
-    fm = None
+
+# Pipeline de análise (YOLO -> FaceMesh/idade -> altura) e fila de jobs
+from . import jobs, lote
+from .models import Upload, persistir
+from .pipeline import processar_bytes, processar_bytes_streaming, preparar_upload, modelos_carregados
+from .utils import cache_utils, artifact_utils, metrics_utils, calibration_utils
+from .utils.config import MEDICOES_POR_PAGINA, MEDICOES_MAX_POR_PAGINA, JOBS_MEMORIA_COMPARTILHADA, LOTE_MAX_IMAGENS
 
 # -----------------------------------------------------------
 
 def detect_height(request):
     pessoas = []
+    descartados = []
     error_message = None
 
     if request.method == 'POST':
         form = ImageUploadForm(request.POST, request.FILES)
-        if form.is_valid() and yolo_model and fm:
+        if form.is_valid() and modelos_carregados():
             image_file = request.FILES['image']
             image_name = image_file.name
-            media_dir = 'media'
-            os.makedirs(media_dir, exist_ok=True)
-            input_path = os.path.join(media_dir, image_name)
-            
-            with open(input_path, 'wb+') as f:
-                for chunk in image_file.chunks(): f.write(chunk)
-
-            image = cv2.imread(input_path)
-            image_copy = image.copy() # Cópia para desenhar
-            ih, iw = image.shape[:2]
-
-            # --- 1. ETAPA YOLO: DETECTAR TODOS OS CORPOS ---
-            # Aqui está a mágica: o YOLO processa a imagem UMA vez
-            # e retorna uma lista de TODAS as pessoas detectadas.
-            pose_results = yolo_model(image)
-
-            # pose_results[0] contém os dados da primeira imagem (nós só enviamos uma)
-            if not pose_results[0].keypoints:
-                error_message = "Nenhuma pessoa foi detectada na imagem pelo YOLO."
-            else:
-                # Pega os keypoints (landmarks da pose) e caixas (bounding boxes)
-                keypoints_list = pose_results[0].keypoints.cpu().numpy()
-                boxes_list = pose_results[0].boxes.cpu().numpy()
-
-                # --- 2. LOOP "CORPOS PRIMEIRO" ---
-                # Agora, fazemos um loop por cada pessoa que o YOLO encontrou
-                for idx, (person_kpts, person_box) in enumerate(zip(keypoints_list.data, boxes_list.xyxy)):
-                    
-                    # --- 2A. CALCULAR ALTURA EM PIXELS (da Pose) ---
-                    # Índices dos keypoints do YOLOv8-Pose (COCO)
-                    # 0=nariz, 1=olho_esq, 2=olho_dir, 3=orelha_esq, 4=orelha_dir
-                    # 15=calcanhar_esq, 16=calcanhar_dir
-                    
-                    try:
-                        # Pega pontos Y da cabeça (se confiança > 0.1)
-                        head_points_y = [person_kpts[j][1] for j in [0, 1, 2, 3, 4] if person_kpts[j][2] > 0.1] 
-                        # Pega pontos Y do calcanhar (se confiança > 0.1)
-                        heel_points_y = [person_kpts[j][1] for j in [15, 16] if person_kpts[j][2] > 0.1]
-                        
-                        if not head_points_y or not heel_points_y:
-                            continue # Ignora pessoa se não tiver cabeça ou calcanhar visível
-
-                        y_min = min(head_points_y) # Ponto mais alto da cabeça
-                        y_max = max(heel_points_y) # Ponto mais baixo do calcanhar
-                        
-                        altura_pixels = abs(y_max - y_min)
-                        
-                        # Desenha a linha da altura na imagem de cópia
-                        cx = int(person_kpts[0][0]) # Centraliza a linha no nariz da pessoa
-                        cv2.line(image_copy, (cx, int(y_min)), (cx, int(y_max)), (0, 255, 255), 2)
-                        
-                    except Exception as e:
-                        print(f"Erro ao calcular altura pixels para pessoa {idx}: {e}")
-                        continue # Pula para a próxima pessoa
-                        
-                    # --- 2B. OBTER RECORTE DO ROSTO (da Pose) ---
-                    # Cria um 'face_crop' usando os keypoints da cabeça
-                    face_x = [person_kpts[j][0] for j in [0, 1, 2, 3, 4] if person_kpts[j][2] > 0.1]
-                    face_y = [person_kpts[j][1] for j in [0, 1, 2, 3, 4] if person_kpts[j][2] > 0.1]
-
-                    if not face_x or not face_y:
-                        continue # Pula se não houver pontos de rosto válidos
-
-                    x1, x2 = max(0, int(min(face_x)) - 20), min(iw, int(max(face_x)) + 20)
-                    y1, y2 = max(0, int(min(face_y)) - 20), min(ih, int(max(face_y)) + 40) # Dá mais espaço para baixo
-                    
-                    face_crop = image[y1:y2, x1:x2]
-                    
-                    if face_crop.size == 0:
-                        continue # Pula se o recorte do rosto falhar
-                        
-                    face_rgb = cv2.cvtColor(face_crop, cv2.COLOR_BGR2RGB)
-                    
-                    # --- 2C. CALCULAR ESCALA (mm/px) (do Rosto) ---
-                    # Roda o FaceMesh APENAS no recorte do rosto
-                    fr = fm.process(face_rgb)
-                    
-                    escala = None
-                    diam_d = diam_e = diff = None
-                    cor_olhos = "N/A"
-                    eye_right_url = eye_left_url = None
-                    
-                    if fr.multi_face_landmarks:
-                        lm_face = fr.multi_face_landmarks[0].landmark
-                        crop_h, crop_w = face_crop.shape[:2]
-                        
-                        # Pontos da íris relativos ao face_crop
-                        iris_d_rel = [(int(lm.x * crop_w), int(lm.y * crop_h)) for lm in [lm_face[i] for i in [474,475,476,477]]]
-                        iris_e_rel = [(int(lm.x * crop_w), int(lm.y * crop_h)) for lm in [lm_face[i] for i in [469,470,471,472]]]
-                        
-                        # Calcula diâmetro da íris
-                        d4_d, ok_d = diametro_iris_4p(iris_d_rel)
-                        diam_d = d4_d if ok_d else diametro_iris_3p([iris_d_rel[0], iris_d_rel[2], iris_d_rel[3]])
-                        
-                        d4_e, ok_e = diametro_iris_4p(iris_e_rel)
-                        diam_e = d4_e if ok_e else diametro_iris_3p([iris_e_rel[0], iris_e_rel[2], iris_e_rel[3]])
-
-                        if diam_d and diam_e:
-                            d_medio = (diam_d + diam_e) / 2
-                            escala = (IRIS_MM / d_medio) * CALIBRACAO_ESCALA
-                            diff = abs(diam_d - diam_e) / d_medio * 100
-                    
-                        # Detectar cor dos olhos (usa o crop e os pontos relativos)
-                        cor_olhos = detectar_cor_olhos(face_crop, iris_d_rel)
-                        
-                        # Recortes dos olhos
-                        eye_right_url = recortar_olho(face_crop, iris_d_rel, f"eye_right_{idx}", media_dir, image_name)
-                        eye_left_url = recortar_olho(face_crop, iris_e_rel, f"eye_left_{idx}", media_dir, image_name)
-
-                    # --- 2D. CALCULAR IDADE E COR (do Rosto) ---
-                    idade_estimativa = estimar_idade(face_crop)
-                    faixa = faixa_etaria(idade_estimativa)
-                    cor_cabelo = detectar_cor_cabelo(face_crop)
-                    
-                    # --- 2E. COMBINAR TUDO ---
-                    altura_cm = None
-                    if escala and altura_pixels:
-                        altura_mm = altura_pixels * escala
-                        altura_cm = altura_mm / 10.0
-                        
-                    # --- 2F. SALVAR IMAGENS DE RECORTE ---
-                    face_name = f'face_{idx}_{image_name}'
-                    cv2.imwrite(os.path.join(media_dir, face_name), face_crop)
-                    face_url = f'/media/{face_name}'
-                    
-                    pessoa = {
-                        "id": idx + 1,
-                        "iris_direita": f"{diam_d:.2f}px" if diam_d else "Falha",
-                        "iris_esquerda": f"{diam_e:.2f}px" if diam_e else "Falha",
-                        "media_iris": f"{(diam_d+diam_e)/2:.2f}px" if diam_d and diam_e else "N/A",
-                        "escala": f"{escala:.3f} mm/px" if escala else "N/A",
-                        "diff_iris": f"{diff:.1f}%" if diff else "N/A",
-                        "cor_olhos": cor_olhos,
-                        "cor_cabelo": cor_cabelo,
-                        "altura": f"{altura_cm:.1f} cm" if altura_cm else "N/A",
-                        "idade_estimativa": f"{idade_estimativa} anos",
-                        "faixa_etaria": faixa,
-                        "face_url": face_url,
-                        "eye_right_url": eye_right_url,
-                        "eye_left_url": eye_left_url
-                    }
-                    pessoas.append(pessoa)
-                
-                # Salva a imagem final com todas as linhas de altura
-                body_name = f'body_all_{image_name}'
-                cv2.imwrite(os.path.join(media_dir, body_name), image_copy)
-                
-                # Adiciona a imagem com as marcações à primeira pessoa (para exibição no template)
-                if pessoas:
-                    pessoas[0]['body_url'] = f'/media/{body_name}'
-
-        elif not (yolo_model and fm):
+
+            # Lê o upload para a memória e decodifica direto do buffer
+            # (cache por conteúdo + gravação do original em segundo plano)
+            dados = b''.join(image_file.chunks())
+            resultado = processar_bytes(dados, image_name, camera=request.POST.get('camera'))
+            metrics_utils.registrar(resultado.get("tempos"))
+            persistir(resultado, image_name)
+
+            pessoas = resultado["pessoas"]
+            # Reprovados pelo filtro de qualidade, com o motivo
+            descartados = resultado.get("descartados", [])
+            error_message = resultado["erro"]
+
+        elif not modelos_carregados():
              error_message = "Erro: Modelos de IA não foram carregados corretamente."
     else:
         form = ImageUploadForm()
@@ -200,5 +55,283 @@ def detect_height(request):
     return render(request, 'detector/upload.html', {
         'form': form,
         'pessoas': pessoas,
+        'descartados': descartados,
         'error_message': error_message
-    })
\ No newline at end of file
+    })
+
+
+# --- API JSON (assíncrona) ---
+# POST /api/jobs/          -> enfileira a imagem e responde 202 com o id do job
+# GET  /api/jobs/<job_id>/ -> status do job e, quando concluído, o resultado por pessoa
+
+@csrf_exempt
+@require_POST
+def api_submeter(request):
+    form = ImageUploadForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return JsonResponse({"erro": "Envie uma imagem válida no campo 'image'.", "detalhes": form.errors}, status=400)
+
+    image_file = request.FILES['image']
+    dados = image_file.read()
+    # Perfil de calibração: campo 'camera' opcional ou, sem ele, o EXIF
+    camera = request.POST.get('camera')
+    chave_perfil = calibration_utils.chave_perfil(dados, camera)
+
+    # Upload repetido: responde com um job já concluído, sem passar pela fila
+    sha256 = cache_utils.hash_conteudo(dados)
+    resultado = cache_utils.obter(cache_utils.chave_cache(sha256, calibration_utils.obter(chave_perfil)))
+    if resultado is not None:
+        resultado = {**resultado, "sha256": sha256, "cache": True}
+        job_id = jobs.registrar_concluido(image_file.name, resultado)
+        persistir(resultado, image_file.name, Upload.ORIGEM_API)
+        return JsonResponse({"job_id": job_id, "status": jobs.CONCLUIDO, "cache": True,
+                             "pessoas": resultado["pessoas"], "erro": resultado["erro"]})
+
+    try:
+        if JOBS_MEMORIA_COMPARTILHADA:
+            # Decodifica aqui e entrega os pixels ao worker por memória compartilhada
+            image = preparar_upload(dados, sha256, image_file.name)
+            if image is None:
+                return JsonResponse({"erro": "Não foi possível decodificar a imagem enviada."}, status=400)
+            job_id = jobs.submeter_imagem(image, sha256, image_file.name, chave_perfil)
+        else:
+            job_id = jobs.submeter(dados, image_file.name, opcoes={"camera": camera})
+    except jobs.FilaCheia:
+        return JsonResponse({"erro": "Fila de processamento cheia. Tente novamente em instantes."}, status=429)
+    except jobs.PoolIndisponivel:
+        return JsonResponse({"erro": "Workers de processamento indisponíveis. Tente novamente em instantes."},
+                            status=503)
+
+    return JsonResponse({"job_id": job_id, "status": jobs.PENDENTE}, status=202)
+
+
+@csrf_exempt
+@require_POST
+def api_submeter_video(request):
+    # Um vídeo curto no campo 'video' ou uma sequência de imagens no campo 'frames' (vários arquivos)
+    video_file = request.FILES.get('video')
+    frames = request.FILES.getlist('frames')
+    if not video_file and not frames:
+        return JsonResponse({"erro": "Envie um vídeo no campo 'video' ou imagens no campo 'frames'."}, status=400)
+
+    try:
+        if video_file:
+            job_id = jobs.submeter_video(video_file.read(), video_file.name)
+        else:
+            job_id = jobs.submeter_sequencia([f.read() for f in frames], f"{len(frames)} frames")
+    except jobs.FilaCheia:
+        return JsonResponse({"erro": "Fila de processamento cheia. Tente novamente em instantes."}, status=429)
+    except jobs.PoolIndisponivel:
+        return JsonResponse({"erro": "Workers de processamento indisponíveis. Tente novamente em instantes."},
+                            status=503)
+
+    return JsonResponse({"job_id": job_id, "status": jobs.PENDENTE}, status=202)
+
+
+# --- Lote ---
+# POST /api/lote/ (vários arquivos no campo 'images' ou um .zip no campo 'zip')
+# -> processa tudo na própria requisição (decodificação, YOLO em lote e
+# etapas de rosto sobrepostas) e responde com um relatório único.
+
+@csrf_exempt
+@require_POST
+def api_lote(request):
+    arquivos = request.FILES.getlist('images')
+    arquivo_zip = request.FILES.get('zip')
+    if not arquivos and not arquivo_zip:
+        return JsonResponse({"erro": "Envie imagens no campo 'images' ou um .zip no campo 'zip'."}, status=400)
+    if len(arquivos) > LOTE_MAX_IMAGENS:
+        return JsonResponse({"erro": f"No máximo {LOTE_MAX_IMAGENS} imagens por lote."}, status=400)
+    if not modelos_carregados():
+        return JsonResponse({"erro": "Modelos de IA não foram carregados corretamente."}, status=503)
+
+    # Os arquivos são lidos pela thread produtora, um de cada vez
+    if arquivo_zip:
+        itens = lote.itens_zip(arquivo_zip)
+    else:
+        itens = ((f.name, f.read()) for f in arquivos)
+    relatorio = lote.processar_lote(itens, camera=request.POST.get('camera'))
+
+    imagens = []
+    for item in relatorio["itens"]:
+        resultado = item["resultado"]
+        metrics_utils.registrar(resultado.get("tempos"))
+        persistir(resultado, item["nome"], Upload.ORIGEM_API)
+        imagens.append({
+            "nome": item["nome"],
+            "sha256": item["sha256"],
+            "cache": resultado.get("cache", False),
+            "erro": resultado["erro"],
+            "pessoas": resultado["pessoas"],
+            "descartados": resultado.get("descartados", []),
+        })
+
+    segundos = relatorio["segundos"]
+    return JsonResponse({
+        "imagens": imagens,
+        "total": len(imagens),
+        "pessoas": sum(len(i["pessoas"]) for i in imagens),
+        "truncado": relatorio["truncado"],
+        "erro": relatorio["erro"],
+        "segundos": round(segundos, 3),
+        "imagens_por_segundo": round(len(imagens) / segundos, 3) if segundos else None,
+    })
+
+
+# --- API em streaming (Server-Sent Events) ---
+# POST /api/stream/ -> text/event-stream com um evento por etapa:
+#   deteccao (quantas pessoas serão analisadas), pessoa (uma por pessoa, assim
+#   que fica pronta) e fim (resultado completo, igual ao de /api/jobs/).
+
+_FIM = object()
+
+
+async def _em_thread(gerador):
+    """
+    Consome um gerador bloqueante em uma thread do executor padrão e
+    entrega os itens ao event loop à medida que são produzidos.
+    Se o consumidor sair antes do fim (cliente desconectou), a thread para
+    no próximo evento do gerador, ou seja, entre uma etapa e outra.
+    """
+    loop = asyncio.get_running_loop()
+    fila = asyncio.Queue()
+    parar = threading.Event()
+
+    def produzir():
+        try:
+            for item in gerador:
+                if parar.is_set():
+                    # Roda os `finally` do pipeline e abandona as etapas restantes
+                    gerador.close()
+                    break
+                loop.call_soon_threadsafe(fila.put_nowait, item)
+        except Exception as e:
+            print(f"Erro no processamento em streaming: {e}")
+            loop.call_soon_threadsafe(fila.put_nowait, {"evento": "erro", "erro": str(e)})
+        finally:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(fila.put_nowait, _FIM)
+
+    tarefa = loop.run_in_executor(None, produzir)
+    try:
+        while (item := await fila.get()) is not _FIM:
+            yield item
+        await tarefa
+    finally:
+        if not tarefa.done():
+            parar.set()
+            tarefa.add_done_callback(_registrar_falha_stream)
+
+
+def _registrar_falha_stream(tarefa):
+    if not tarefa.cancelled() and tarefa.exception() is not None:
+        print(f"Erro no processamento em streaming: {tarefa.exception()}")
+
+
+def _sse(evento):
+    return f"event: {evento['evento']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+
+@csrf_exempt
+@require_POST
+async def api_stream(request):
+    form = ImageUploadForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return JsonResponse({"erro": "Envie uma imagem válida no campo 'image'.", "detalhes": form.errors}, status=400)
+    if not await sync_to_async(modelos_carregados)():
+        return JsonResponse({"erro": "Modelos de IA não foram carregados corretamente."}, status=503)
+
+    image_file = request.FILES['image']
+    dados = image_file.read()
+    camera = request.POST.get('camera')
+
+    async def eventos():
+        async for evento in _em_thread(processar_bytes_streaming(dados, image_file.name, camera=camera)):
+            if evento["evento"] == "fim":
+                metrics_utils.registrar(evento["resultado"].get("tempos"))
+                await sync_to_async(persistir)(evento["resultado"], image_file.name, Upload.ORIGEM_API)
+            yield _sse(evento)
+
+    resposta = StreamingHttpResponse(eventos(), content_type="text/event-stream; charset=utf-8")
+    resposta["Cache-Control"] = "no-cache"
+    resposta["X-Accel-Buffering"] = "no"  # nginx: não acumular os eventos
+    return resposta
+
+
+@require_GET
+def api_status(request, job_id):
+    job = jobs.consultar(job_id)
+    if job is None:
+        return JsonResponse({"erro": "Job não encontrado."}, status=404)
+
+    resposta = {"job_id": job["id"], "status": job["status"], "imagem": job["imagem"]}
+    if job["status"] == jobs.CONCLUIDO and "tracks" in job["resultado"]:
+        # Job de vídeo / sequência de frames: resultado agregado por pessoa rastreada
+        resposta.update(job["resultado"])
+    elif job["status"] == jobs.CONCLUIDO:
+        resposta["pessoas"] = job["resultado"]["pessoas"]
+        resposta["erro"] = job["resultado"]["erro"]
+        resposta["cache"] = job["resultado"].get("cache", False)
+        # Pessoas que o filtro de qualidade tirou das etapas de rosto, com o motivo
+        resposta["descartados"] = job["resultado"].get("descartados", [])
+        # Tempo de parede / CPU / alocações por etapa e por pessoa
+        resposta["tempos"] = job["resultado"].get("tempos")
+    elif job["status"] == jobs.ERRO:
+        resposta["erro"] = job["erro"]
+    return JsonResponse(resposta)
+
+
+def _data(valor):
+    if not valor:
+        return None
+    data = datetime.fromisoformat(valor)
+    return timezone.make_aware(data) if timezone.is_naive(data) else data
+
+
+@require_GET
+def api_medicoes(request):
+    # GET /api/medicoes/?sha256=&desde=&ate=&origem=&pagina=&por_pagina=
+    # Histórico gravado no banco, do mais recente para o mais antigo.
+    try:
+        desde, ate = _data(request.GET.get("desde")), _data(request.GET.get("ate"))
+        pagina = int(request.GET.get("pagina", 1))
+        por_pagina = min(int(request.GET.get("por_pagina", MEDICOES_POR_PAGINA)), MEDICOES_MAX_POR_PAGINA)
+    except ValueError:
+        return JsonResponse({"erro": "Parâmetros inválidos: datas em ISO 8601, pagina/por_pagina inteiros."}, status=400)
+
+    # Os filtros usam os índices de sha256 e criado_em
+    uploads = Upload.objects.prefetch_related("pessoas__medicao")
+    if request.GET.get("sha256"):
+        uploads = uploads.filter(sha256=request.GET["sha256"])
+    if request.GET.get("origem"):
+        uploads = uploads.filter(origem=request.GET["origem"])
+    if desde:
+        uploads = uploads.filter(criado_em__gte=desde)
+    if ate:
+        uploads = uploads.filter(criado_em__lt=ate)
+
+    paginador = Paginator(uploads, max(por_pagina, 1))
+    try:
+        page = paginador.page(pagina)
+    except EmptyPage:
+        return JsonResponse({"erro": "Página inexistente.", "paginas": paginador.num_pages}, status=404)
+
+    return JsonResponse({
+        "pagina": page.number,
+        "paginas": paginador.num_pages,
+        "total": paginador.count,
+        "resultados": [u.como_dict() for u in page.object_list],
+    })
+
+
+@require_GET
+def metricas(request):
+    # Tempos por etapa do pipeline, no formato de exposição do Prometheus
+    return HttpResponse(metrics_utils.exportar_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def servir_media(request, path, document_root=None, show_indexes=False):
+    # Os artefatos são gravados em segundo plano: se o arquivo ainda está
+    # na fila de gravação, espera ele ficar pronto antes de servir.
+    artifact_utils.aguardar(path, timeout=10)
+    return serve(request, path, document_root=document_root, show_indexes=show_indexes)